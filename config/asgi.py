@@ -0,0 +1,16 @@
+"""
+ASGI config for flash sale project.
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+
+django_application = get_asgi_application()
+
+from shop.status_stream import DisconnectWatcher  # noqa: E402  需在 Django 初始化之後匯入
+
+# 偵測即時推送（/stream/）的用戶端離線
+application = DisconnectWatcher(django_application)
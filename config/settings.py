@@ -32,6 +32,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'shop.rate_limit.RateLimitMiddleware',
+    'shop.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -59,6 +61,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'config.wsgi.application'
+ASGI_APPLICATION = 'config.asgi.application'
 
 
 # Database
@@ -73,9 +76,21 @@ DATABASES = {
         'HOST': 'localhost',
         'PORT': '5432',
         'CONN_MAX_AGE': 600,  # optional: keep connections open for reuse
-    }
+    },
+    # 讀取副本（串流複製），並在 FLASH_SALE['DATABASE_REPLICAS'] 中列出別名
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'flash_sale_db',
+    #     'USER': 'flash_sale_user',
+    #     'PASSWORD': 'strongpassword',
+    #     'HOST': 'replica-host',
+    #     'PORT': '5432',
+    #     'CONN_MAX_AGE': 600,
+    # },
 }
 
+DATABASE_ROUTERS = ['shop.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -126,3 +141,113 @@ REST_FRAMEWORK = {
     ],
 }
 
+
+# 搶購相關設定（未列出的項目使用 shop/conf.py 中的預設值）
+FLASH_SALE = {
+    # 庫存閘門：None（關閉）、shop.stock_gate.RedisStockGate（多 worker 共享，需要 Redis 或 run_resp_server）
+    # 或 shop.stock_gate.LocalStockGate（只適合單一程序，多 worker 時各自計數，無法限制總量）；
+    # 令牌用完時每 STOCK_GATE_RESYNC_INTERVAL 秒最多以資料庫校正一次，補回其他程序歸還或中斷遺失的令牌
+    'STOCK_GATE_BACKEND': None,
+    'STOCK_GATE_RESYNC_INTERVAL': 1.0,
+    'REDIS_URL': 'redis://localhost:6379/0',
+    # group commit：同一活動的併發下單最多等待 WINDOW_MS 毫秒，湊滿 MAX_BATCH 筆就立即寫入
+    'GROUP_COMMIT_ENABLED': False,
+    'GROUP_COMMIT_WINDOW_MS': 5,
+    'GROUP_COMMIT_MAX_BATCH': 50,
+    # 收單模式：'sync' 直接下單；'async' 寫入排隊單後立即回應 202，
+    # 由 process_order_tickets 指令處理，用戶以 /api/flash-sale/ticket/<id>/ 查詢結果
+    'ORDER_INTAKE_MODE': 'sync',
+    # 查詢排隊單時回應的順位以隊伍最前面的排隊單 ID 推算，該 ID 每個 worker 每 TICKET_POSITION_TTL 秒查一次
+    'TICKET_POSITION_TTL': 1.0,
+    # 售罄快取：售罄狀態最多落後 SOLD_OUT_LOCAL_TTL 秒；
+    # SOLD_OUT_SHARED 開啟後透過 Redis 協定讓其他 worker 也知道售罄（保留 SOLD_OUT_SHARED_TTL 秒）
+    'SOLD_OUT_LOCAL_TTL': 1.0,
+    'SOLD_OUT_SHARED': False,
+    'SOLD_OUT_SHARED_TTL': 5.0,
+    # 活動中繼資料（售價、商品、時間）快取秒數；本程序內的修改會立即清除快取，
+    # 其他 worker 最晚在 EVENT_META_TTL 秒後讀到新資料
+    'EVENT_META_TTL': 5.0,
+    # 重複下單預先過濾：記住已有進行中訂單的 email，重複點擊不碰資料庫
+    # （待付款的訂單只記住 SEEN_EMAILS_TTL 秒，其他 worker 付款失敗或釋放後最晚這麼久就能重新下單；
+    #   已付款的訂單記住到活動結束）
+    'SEEN_EMAILS_FILTER': False,
+    'SEEN_EMAILS_TTL': 10,
+    # 最多記住幾個 email（超過時移除已過期的記錄，仍然太多時全部清除）
+    'SEEN_EMAILS_MAX_KEYS': 100000,
+    # 訂單編號：SnowflakeOrderNumberGenerator（時間序、不重複）
+    # 或 RandomOrderNumberGenerator（舊格式）；多個 worker 部署時每個程序需要不同的 worker ID (0~1023)，
+    # 以 ORDER_NUMBER_WORKER_ID 或環境變數 FLASH_SALE_WORKER_ID 指定（未指定時隨機選擇，可能與其他程序相同）
+    'ORDER_NUMBER_GENERATOR': 'shop.order_numbers.SnowflakeOrderNumberGenerator',
+    'ORDER_NUMBER_WORKER_ID': None,
+    # 訂單編號撞號（worker ID 相同）時換一個編號重試，最多嘗試次數
+    'ORDER_NUMBER_ATTEMPTS': 3,
+    # 排隊室：shop.waiting_room.LocalWaitingRoom（單一程序）或 RedisWaitingRoom（多 worker 共用隊伍）；
+    # 開啟後需先到 /api/flash-sale/<id>/queue/ 取得入場資格才能下單。
+    # 每秒放行人數從 INITIAL_RATE 開始，依下單耗時是否超過 TARGET_LATENCY_MS 在 MIN_RATE~MAX_RATE 間調整
+    'WAITING_ROOM_BACKEND': None,
+    'WAITING_ROOM_INITIAL_RATE': 50,
+    'WAITING_ROOM_MIN_RATE': 5,
+    'WAITING_ROOM_MAX_RATE': 500,
+    'WAITING_ROOM_TARGET_LATENCY_MS': 100,
+    # 入場資格有效秒數
+    'WAITING_ROOM_ADMISSION_TTL': 30,
+    # 請求頻率限制：None（關閉）、shop.rate_limit.LocalRateLimiter（每個 worker 各自計算）
+    # 或 RedisRateLimiter（多 worker 共用）；部署在負載平衡器後面時需同時設定 RATE_LIMIT_TRUSTED_PROXIES，
+    # 否則所有用戶都以負載平衡器的 IP 計算
+    'RATE_LIMIT_BACKEND': None,
+    # 依 URL 名稱設定，(1, 3) 表示每秒補充 1 次、最多連續 3 次；超過時回應 429
+    # IP 的額度放寬，避免同一個 NAT 後面的用戶或壓測工具被誤擋
+    'RATE_LIMITS': {
+        'create_flash_sale_order': {'email': (1, 3), 'ip': (50, 100)},
+        'join_waiting_room': {'email': (2, 5), 'ip': (100, 200)},
+        'simulate_payment': {'ip': (20, 40)},
+        'check_order_status': {'ip': (20, 40)},
+        'user_orders': {'email': (2, 5), 'ip': (20, 40)},
+    },
+    # REMOTE_ADDR 之前的反向代理／負載平衡器層數：例如只有一層負載平衡器時設為 1，
+    # 用戶端 IP 取 X-Forwarded-For 最右邊的值（左邊的值可由用戶端偽造，不使用）；0 時使用 REMOTE_ADDR
+    'RATE_LIMIT_TRUSTED_PROXIES': 0,
+    # Idempotency-Key：shop.idempotency.DatabaseIdempotencyStore（idempotency_records 資料表，
+    # 需定期執行 purge_idempotency_records）或 CacheIdempotencyStore（Django 快取，跨 worker 時需共用快取）
+    'IDEMPOTENCY_BACKEND': 'shop.idempotency.DatabaseIdempotencyStore',
+    'IDEMPOTENCY_TTL': 86400,
+    # 相同 key 的請求等待第一個請求完成的最長秒數
+    'IDEMPOTENCY_WAIT_TIMEOUT': 10,
+    # 批次付款通知（/api/payment/callback/batch/）每批上限
+    'PAYMENT_BATCH_MAX': 500,
+    # 售罄時回收逾期未釋放的訂單：每個活動每 LAZY_EXPIRY_INTERVAL 秒最多一次，每次最多 LAZY_EXPIRY_BATCH 筆
+    'LAZY_EXPIRY_INTERVAL': 1.0,
+    'LAZY_EXPIRY_BATCH': 100,
+    # 活動狀態回應在每個 worker 內保留的秒數（同一時間只有一個請求重建，回應帶 ETag）
+    'STATUS_CACHE_TTL': 0.25,
+    # 活動狀態即時推送（/stream/，需以 config.asgi 啟動）：每個程序每個活動每 STREAM_TICK 秒最多讀一次狀態，
+    # 連線 STREAM_MAX_SECONDS 秒後關閉讓用戶端重連
+    'STREAM_TICK': 1.0,
+    'STREAM_MAX_SECONDS': 300,
+    # 用戶訂單列表（cursor 分頁）每頁預設與最多筆數
+    'USER_ORDERS_PAGE_SIZE': 20,
+    'USER_ORDERS_MAX_PAGE_SIZE': 100,
+    # 訂單狀態查詢的 read-through 快取（訂單狀態改變時清除）；0 為關閉。
+    # 清除需要對所有 worker 生效，ORDER_STATUS_CACHE_ALIAS 必須是共用的快取後端（例如 Redis），
+    # 程序內的 LocMemCache（未設定 CACHES 時的 default）不會啟用
+    'ORDER_STATUS_CACHE_ALIAS': 'default',
+    'ORDER_STATUS_CACHE_TTL': 0,
+    # 讀取副本（DATABASES 中的別名，例如 ['replica']），查詢類 API 的 GET 改讀副本；
+    # 下單或付款後 DATABASE_REPLICA_STICKY_SECONDS 秒內該用戶端仍讀主資料庫（應大於副本延遲）
+    'DATABASE_REPLICAS': [],
+    'DATABASE_REPLICA_VIEWS': ['check_order_status', 'user_orders', 'flash_sale_status'],
+    'DATABASE_REPLICA_STICKY_SECONDS': 5,
+    # Inventory 預留：'conditional' 以單一帶條件的 UPDATE 預留（可售不足時更新 0 列）；
+    # 'optimistic' 先讀 version 再以 version 為條件更新，衝突時重試 INVENTORY_OPTIMISTIC_RETRIES 次
+    'INVENTORY_RESERVE_MODE': 'conditional',
+    'INVENTORY_OPTIMISTIC_RETRIES': 5,
+    # 庫存異動紀錄模式：預留、售出、釋放只新增 inventory_movements，不更新 inventory 同一列；
+    # 需要常駐執行 compact_inventory_movements --interval 1 把異動彙總進 Inventory
+    'INVENTORY_LEDGER': False,
+    # 'split'：活動記錄的鎖只涵蓋預留（檢查與計數更新），訂單與明細在鎖放開後的另一個交易寫入，
+    # 寫入失敗時以補償交易歸還預留；比較見 python manage.py bench_order_lock_hold
+    'ORDER_RESERVE_MODE': 'single',
+    # 搶購訂單固定一件：商品、數量與單價直接記錄在 sales_orders，下單少寫一列 sales_order_items；
+    # 需要明細列時以 python manage.py backfill_order_items 補建
+    'ORDER_INLINE_ITEMS': False,
+}
@@ -0,0 +1,26 @@
+"""
+在本機驗證讀取副本路由的設定：以兩個 SQLite 資料庫分別當作主資料庫與副本，
+副本的內容由 check_replica_routing 從主資料庫複製（模擬複製延遲）。
+
+    python manage.py migrate --settings=config.settings_replica_local
+    python manage.py check_replica_routing --settings=config.settings_replica_local
+"""
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, FLASH_SALE
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica_check_primary.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'replica_check_replica.sqlite3',
+    },
+}
+
+FLASH_SALE = {
+    **FLASH_SALE,
+    'DATABASE_REPLICAS': ['replica'],
+}
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Product, Inventory, FlashSaleEvent, SalesOrder, SalesOrderItem
+from . import inventory
+from .models import Product, Inventory, InventoryMovement, FlashSaleEvent, FlashSaleStockBucket, SalesOrder, SalesOrderItem, OrderTicket, IdempotencyRecord
 
 
 @admin.register(Product)
@@ -11,24 +12,56 @@ class ProductAdmin(admin.ModelAdmin):
 
 @admin.register(Inventory)
 class InventoryAdmin(admin.ModelAdmin):
-    list_display = ['product', 'quantity_on_hand', 'quantity_reserved', 'quantity_available', 'updated_at']
+    list_display = ['product', 'quantity_on_hand', 'quantity_reserved', 'quantity_available', 'current_available', 'updated_at']
     list_filter = ['updated_at']
     search_fields = ['product__sku', 'product__name']
 
+    @admin.display(description='可售（含未彙總異動）')
+    def current_available(self, obj):
+        return inventory.available(obj.product_id)
+
+
+@admin.register(InventoryMovement)
+class InventoryMovementAdmin(admin.ModelAdmin):
+    list_display = ['product', 'kind', 'reserved_delta', 'on_hand_delta', 'compacted', 'created_at']
+    list_filter = ['kind', 'compacted', 'created_at']
+    search_fields = ['product__sku', 'product__name']
+    readonly_fields = ['product', 'kind', 'reserved_delta', 'on_hand_delta', 'compacted', 'created_at']
+
 
 @admin.register(FlashSaleEvent)
 class FlashSaleEventAdmin(admin.ModelAdmin):
-    list_display = ['product', 'total_quantity', 'reserved_quantity', 'sold_quantity', 'status', 'start_time', 'end_time']
+    list_display = ['product', 'total_quantity', 'reserved_quantity', 'sold_quantity', 'bucket_count', 'status', 'start_time', 'end_time']
     list_filter = ['status', 'start_time']
     search_fields = ['product__name', 'product__sku']
 
 
+@admin.register(FlashSaleStockBucket)
+class FlashSaleStockBucketAdmin(admin.ModelAdmin):
+    list_display = ['flash_sale_event', 'bucket_index', 'quota', 'reserved_quantity', 'sold_quantity']
+    list_filter = ['flash_sale_event']
+
+
+class SalesOrderItemInline(admin.TabularInline):
+    model = SalesOrderItem
+    extra = 0
+    readonly_fields = ['product', 'quantity', 'unit_price', 'subtotal']
+
+
 @admin.register(SalesOrder)
 class SalesOrderAdmin(admin.ModelAdmin):
     list_display = ['order_number', 'user_email', 'status', 'payment_method', 'shipping_priority', 'total_amount', 'created_at', 'paid_at']
     list_filter = ['status', 'payment_method', 'created_at']
     search_fields = ['order_number', 'user_email']
-    readonly_fields = ['order_number', 'created_at', 'updated_at']
+    readonly_fields = ['order_number', 'line_items_summary', 'created_at', 'updated_at']
+    inlines = [SalesOrderItemInline]
+
+    @admin.display(description='訂單明細')
+    def line_items_summary(self, obj):
+        # 單品訂單的明細記錄在訂單上，明細表可能還沒有資料
+        return '、'.join(
+            f'{item.product.sku} x {item.quantity} @ {item.unit_price}' for item in obj.line_items()
+        ) or '-'
 
 
 @admin.register(SalesOrderItem)
@@ -36,3 +69,17 @@ class SalesOrderItemAdmin(admin.ModelAdmin):
     list_display = ['sales_order', 'product', 'quantity', 'unit_price', 'subtotal']
     search_fields = ['sales_order__order_number', 'product__sku']
 
+
+@admin.register(OrderTicket)
+class OrderTicketAdmin(admin.ModelAdmin):
+    list_display = ['ticket_id', 'user_email', 'event_id', 'status', 'message', 'created_at', 'processed_at']
+    list_filter = ['status', 'created_at']
+    search_fields = ['ticket_id', 'user_email']
+    readonly_fields = ['ticket_id', 'created_at', 'processed_at']
+
+
+@admin.register(IdempotencyRecord)
+class IdempotencyRecordAdmin(admin.ModelAdmin):
+    list_display = ['key', 'status_code', 'created_at', 'expires_at']
+    search_fields = ['key']
+    readonly_fields = ['key', 'fingerprint', 'status_code', 'response_body', 'created_at', 'expires_at']
@@ -0,0 +1,93 @@
+"""
+搶購相關設定
+
+所有設定都放在 settings.FLASH_SALE 字典中，未設定的項目使用此處的預設值。
+"""
+from django.conf import settings
+
+
+DEFAULTS = {
+    # 庫存閘門後端（None 為關閉）與令牌用完時以資料庫重新校正的間隔秒數
+    'STOCK_GATE_BACKEND': None,
+    'STOCK_GATE_RESYNC_INTERVAL': 1.0,
+    # Redis 協定服務位址（RedisStockGate 等共享後端使用）
+    'REDIS_URL': 'redis://localhost:6379/0',
+    'REDIS_KEY_PREFIX': 'flash_sale',
+    'REDIS_SOCKET_TIMEOUT': 1.0,
+    # group commit：同一活動的併發下單收集後整批寫入
+    'GROUP_COMMIT_ENABLED': False,
+    'GROUP_COMMIT_WINDOW_MS': 5,
+    'GROUP_COMMIT_MAX_BATCH': 50,
+    # 收單模式：'sync' 直接下單，'async' 寫入排隊單後回應 202
+    'ORDER_INTAKE_MODE': 'sync',
+    # 排隊單順位使用的隊伍最前面 ID 快取秒數
+    'TICKET_POSITION_TTL': 1.0,
+    # 售罄快取：程序內旗標與共享旗標的最長有效秒數
+    'SOLD_OUT_LOCAL_TTL': 1.0,
+    'SOLD_OUT_SHARED': False,
+    'SOLD_OUT_SHARED_TTL': 5.0,
+    # 活動中繼資料（售價、商品、時間）快取秒數
+    'EVENT_META_TTL': 5.0,
+    # 重複下單預先過濾（程序內雜湊表）
+    'SEEN_EMAILS_FILTER': False,
+    'SEEN_EMAILS_TTL': 10,
+    'SEEN_EMAILS_MAX_KEYS': 100000,
+    # 訂單編號產生器與 snowflake worker ID（None 時使用環境變數 FLASH_SALE_WORKER_ID，都沒有時隨機選擇）
+    'ORDER_NUMBER_GENERATOR': 'shop.order_numbers.SnowflakeOrderNumberGenerator',
+    'ORDER_NUMBER_WORKER_ID': None,
+    # 訂單編號撞號時最多嘗試幾次
+    'ORDER_NUMBER_ATTEMPTS': 3,
+    # 排隊室後端（None 為關閉，下單不需要入場資格）
+    'WAITING_ROOM_BACKEND': None,
+    'WAITING_ROOM_INITIAL_RATE': 50,
+    'WAITING_ROOM_MIN_RATE': 5,
+    'WAITING_ROOM_MAX_RATE': 500,
+    'WAITING_ROOM_TARGET_LATENCY_MS': 100,
+    'WAITING_ROOM_ADMISSION_TTL': 30,
+    # 請求頻率限制：後端（None 為關閉）、各 URL 名稱的規則 {'email'/'ip': (每秒補充, 最多累積)}
+    # 與 REMOTE_ADDR 之前的反向代理層數（0 時不讀 X-Forwarded-For）
+    'RATE_LIMIT_BACKEND': None,
+    'RATE_LIMITS': {},
+    'RATE_LIMIT_TRUSTED_PROXIES': 0,
+    'RATE_LIMIT_MAX_KEYS': 100000,
+    # Idempotency-Key：保存後端、回應保存秒數、等待處理中請求與處理中紀錄失效的秒數
+    'IDEMPOTENCY_BACKEND': 'shop.idempotency.DatabaseIdempotencyStore',
+    'IDEMPOTENCY_CACHE_ALIAS': 'default',
+    'IDEMPOTENCY_TTL': 86400,
+    'IDEMPOTENCY_WAIT_TIMEOUT': 10,
+    'IDEMPOTENCY_LOCK_TIMEOUT': 30,
+    # 批次付款通知每批上限
+    'PAYMENT_BATCH_MAX': 500,
+    # 讀取時發現逾期訂單即釋放：售罄時每個活動每 N 秒最多回收一次、每次最多幾筆
+    'LAZY_EXPIRY_INTERVAL': 1.0,
+    'LAZY_EXPIRY_BATCH': 100,
+    # 活動狀態回應的程序內微快取秒數
+    'STATUS_CACHE_TTL': 0.25,
+    # 活動狀態即時推送：發布者讀取狀態的間隔秒數與每條連線的最長秒數
+    'STREAM_TICK': 1.0,
+    'STREAM_MAX_SECONDS': 300,
+    # 用戶訂單列表每頁預設與最多筆數
+    'USER_ORDERS_PAGE_SIZE': 20,
+    'USER_ORDERS_MAX_PAGE_SIZE': 100,
+    # 訂單狀態快取：使用的 Django 快取（需為共用的後端）與保存秒數（0 為關閉）
+    'ORDER_STATUS_CACHE_ALIAS': 'default',
+    'ORDER_STATUS_CACHE_TTL': 0,
+    # 讀取副本：DATABASES 中的副本別名、改讀副本的 URL 名稱、寫入後固定讀主資料庫的秒數
+    'DATABASE_REPLICAS': [],
+    'DATABASE_REPLICA_VIEWS': ['check_order_status', 'user_orders', 'flash_sale_status'],
+    'DATABASE_REPLICA_STICKY_SECONDS': 5,
+    # Inventory 預留方式：'conditional'（帶條件的 UPDATE）或 'optimistic'（version 樂觀鎖）與樂觀鎖的重試次數
+    'INVENTORY_RESERVE_MODE': 'conditional',
+    'INVENTORY_OPTIMISTIC_RETRIES': 5,
+    # 庫存異動紀錄模式：變動只新增 InventoryMovement，由 compact_inventory_movements 彙總
+    'INVENTORY_LEDGER': False,
+    # 單列模式下單：'single' 預留與建立訂單在同一個交易，'split' 預留提交後再建立訂單（失敗時補償）
+    'ORDER_RESERVE_MODE': 'single',
+    # 單品訂單的商品、數量與單價記錄在訂單上，不寫入 SalesOrderItem（由 backfill_order_items 補建）
+    'ORDER_INLINE_ITEMS': False,
+}
+
+
+def get_setting(name):
+    """讀取搶購設定，未設定時回傳預設值"""
+    return getattr(settings, 'FLASH_SALE', {}).get(name, DEFAULTS[name])
@@ -0,0 +1,106 @@
+"""
+讀取副本（read replica）路由
+
+主資料庫忙於下單與付款的鎖定，查詢類 API 可以改讀副本：
+
+- DATABASE_REPLICAS 列出 DATABASES 中副本的別名，空白時所有查詢都在主資料庫
+- 只有 DATABASE_REPLICA_VIEWS 中的 URL 名稱、且為 GET/HEAD 的請求讀副本；
+  其他請求（包含下單交易中的讀取）一律在主資料庫
+- 讀副本的請求中，主資料庫交易內的讀取（例如讀取時釋放逾期訂單）仍在主資料庫；
+  依讀取結果寫入或設定共享狀態的程式以 use_primary() 改讀主資料庫，
+  不會依落後的副本資料修改訂單或設定售罄旗標
+- read-your-writes：請求中寫入過主資料庫時，回應帶上 cookie，
+  之後 DATABASE_REPLICA_STICKY_SECONDS 秒內這個用戶端的查詢都讀主資料庫，
+  不會因為副本延遲而看不到剛建立的訂單或剛完成的付款
+
+寫入一律在主資料庫；副本的資料表由複製而來，不在副本上執行 migrate。
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+
+from django.db import connections
+
+from .conf import get_setting
+
+
+PIN_COOKIE = 'fs_db_primary'
+
+# 目前請求讀取的副本別名（None 為主資料庫）
+_read_alias = ContextVar('read_alias', default=None)
+# 目前請求是否寫入過主資料庫
+_wrote = ContextVar('wrote', default=False)
+
+
+def reading_from_replica():
+    """目前請求是否在讀副本"""
+    return _read_alias.get() is not None
+
+
+@contextmanager
+def use_primary():
+    """區塊內的讀取改回主資料庫"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+class ReplicaRouter:
+    """依請求決定讀取的資料庫，寫入一律在 default"""
+
+    def __init__(self):
+        self.replicas = set(get_setting('DATABASE_REPLICAS'))
+
+    def db_for_read(self, model, **hints):
+        alias = _read_alias.get()
+        # 主資料庫交易中的讀取要看到交易內的寫入與鎖定後的最新資料
+        if alias is not None and connections['default'].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本與主資料庫是同一份資料
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return False if db in self.replicas else None
+
+
+class ReplicaRoutingMiddleware:
+    """讓 DATABASE_REPLICA_VIEWS 中的查詢讀副本，寫入後的用戶端暫時固定讀主資料庫"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.replicas = list(get_setting('DATABASE_REPLICAS'))
+        self.views = set(get_setting('DATABASE_REPLICA_VIEWS'))
+        self.sticky_seconds = get_setting('DATABASE_REPLICA_STICKY_SECONDS')
+
+    def __call__(self, request):
+        if not self.replicas:
+            return self.get_response(request)
+
+        read_token = _read_alias.set(None)
+        wrote_token = _wrote.set(False)
+        try:
+            response = self.get_response(request)
+            if _wrote.get():
+                response.set_cookie(PIN_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+            return response
+        finally:
+            _read_alias.reset(read_token)
+            _wrote.reset(wrote_token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if not self.replicas or request.method not in ('GET', 'HEAD'):
+            return None
+        match = request.resolver_match
+        if match is None or match.url_name not in self.views or PIN_COOKIE in request.COOKIES:
+            return None
+        _read_alias.set(random.choice(self.replicas))
+        return None
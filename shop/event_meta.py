@@ -0,0 +1,71 @@
+"""
+活動與商品的中繼資料快取
+
+下單熱路徑需要的售價、商品 ID、開始/結束時間在活動期間幾乎不會變，
+不需要每筆訂單都從資料庫重新載入活動與商品。
+快取以活動 ID 為 key，FlashSaleEvent 或 Product 儲存（包含後台修改）時清除；
+其他程序的快取最晚在 EVENT_META_TTL 秒後失效。
+會變動的庫存數量不放在這裡，仍然在交易中鎖定讀取。
+"""
+import threading
+import time
+
+from django.utils import timezone
+
+from .conf import get_setting
+from .models import FlashSaleEvent
+
+
+class EventMeta:
+    """活動中繼資料（不含庫存數量）"""
+
+    __slots__ = (
+        'event_id', 'product_id', 'product_name', 'product_sku', 'price',
+        'total_quantity', 'bucket_count', 'status', 'start_time', 'end_time',
+    )
+
+    def __init__(self, event):
+        self.event_id = event.id
+        self.product_id = event.product_id
+        self.product_name = event.product.name
+        self.product_sku = event.product.sku
+        self.price = event.product.price
+        self.total_quantity = event.total_quantity
+        self.bucket_count = event.bucket_count
+        self.status = event.status
+        self.start_time = event.start_time
+        self.end_time = event.end_time
+
+    def is_active(self):
+        """檢查活動是否有效（與 FlashSaleEvent.is_active 相同）"""
+        now = timezone.now()
+        return self.status == 'active' and self.start_time <= now <= self.end_time
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def get_event_meta(event_id):
+    """取得活動中繼資料，活動不存在時拋出 FlashSaleEvent.DoesNotExist"""
+    entry = _cache.get(event_id)
+    if entry is not None and entry[0] > time.monotonic():
+        return entry[1]
+
+    meta = EventMeta(FlashSaleEvent.objects.select_related('product').get(id=event_id))
+    with _cache_lock:
+        _cache[event_id] = (time.monotonic() + get_setting('EVENT_META_TTL'), meta)
+    return meta
+
+
+def invalidate_event(event_id):
+    """清除單一活動的快取"""
+    with _cache_lock:
+        _cache.pop(event_id, None)
+
+
+def invalidate_product(product_id):
+    """清除某商品所有活動的快取"""
+    with _cache_lock:
+        for event_id in [k for k, (_, meta) in _cache.items() if meta.product_id == product_id]:
+            _cache.pop(event_id, None)
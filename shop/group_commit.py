@@ -0,0 +1,87 @@
+"""
+下單 group commit
+
+同一程序內、同一活動的併發下單請求先收集幾毫秒，
+再由第一個到達的請求（leader）用一個交易整批預留：
+只鎖一次活動與庫存、只更新一次計數，訂單與明細用 bulk_create 寫入。
+其他請求（follower）等待 leader 把各自的結果交回。
+"""
+from concurrent.futures import Future
+import threading
+
+from .conf import get_setting
+from .services import create_orders_batch
+
+
+class _Batch:
+    def __init__(self):
+        self.requests = []
+        self.futures = []
+        self.full = threading.Event()
+
+
+class GroupCommitWriter:
+    """依活動收集下單請求並整批寫入"""
+
+    def __init__(self, window_ms=None, max_batch=None):
+        self.window = (window_ms if window_ms is not None else get_setting('GROUP_COMMIT_WINDOW_MS')) / 1000
+        self.max_batch = max_batch or get_setting('GROUP_COMMIT_MAX_BATCH')
+        self._lock = threading.Lock()
+        self._open = {}
+
+    def submit(self, user_email, event_id, payment_method):
+        """
+        送出一筆下單請求並等待結果，回傳 SalesOrder
+        被拒絕時拋出 OrderRejected，與逐筆下單的 create_order 相同
+        """
+        future = Future()
+        with self._lock:
+            batch = self._open.get(event_id)
+            is_leader = batch is None
+            if is_leader:
+                batch = self._open[event_id] = _Batch()
+            batch.requests.append((user_email, payment_method))
+            batch.futures.append(future)
+            if len(batch.requests) >= self.max_batch:
+                # 批次已滿，之後到達的請求開新批次
+                self._open.pop(event_id)
+                batch.full.set()
+
+        if is_leader:
+            batch.full.wait(self.window)
+            with self._lock:
+                if self._open.get(event_id) is batch:
+                    self._open.pop(event_id)
+            self._commit(event_id, batch)
+
+        result = future.result()
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    def _commit(self, event_id, batch):
+        try:
+            results = create_orders_batch(event_id, batch.requests)
+        except Exception as e:
+            # 整批失敗（例如活動不存在或資料庫錯誤），每個請求都收到同一個例外
+            for future in batch.futures:
+                future.set_exception(e)
+            return
+        for future, result in zip(batch.futures, results):
+            future.set_result(result)
+
+
+_writer = None
+_writer_lock = threading.Lock()
+
+
+def get_group_commit_writer():
+    """取得程序內共用的 group commit writer，未開啟時回傳 None"""
+    global _writer
+    if not get_setting('GROUP_COMMIT_ENABLED'):
+        return None
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = GroupCommitWriter()
+    return _writer
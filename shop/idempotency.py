@@ -0,0 +1,249 @@
+"""
+Idempotency-Key 支援
+
+用戶端與金流在搶購期間會大量重送請求。帶有 Idempotency-Key 標頭的請求，
+第一次的回應會被保存 IDEMPOTENCY_TTL 秒，之後同一個 key 的重送直接回傳保存的回應，
+不會再進入下單交易或鎖定訂單。
+
+- 第一個請求處理中時，同一個 key 的其他請求等待它完成（同程序以 Event 等待，
+  跨程序則輪詢），最多等待 IDEMPOTENCY_WAIT_TIMEOUT 秒，逾時回應 409
+- 同一個 key 搭配不同的請求內容時回應 422
+- key 以用戶端區分（請求中的 email，沒有時為用戶端 IP），其他用戶端使用相同的 key 不會取得這份回應
+- 5xx 回應不保存，讓用戶端可以重試
+- 處理中的紀錄在 IDEMPOTENCY_LOCK_TIMEOUT 秒後失效，避免程序中斷後 key 永遠無法使用
+
+保存位置由 IDEMPOTENCY_BACKEND 決定：資料庫（DatabaseIdempotencyStore）
+或 Django 快取（CacheIdempotencyStore）。
+"""
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+import threading
+import time
+
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .conf import get_setting
+from .models import IdempotencyRecord
+from .rate_limit import _client_ip, _user_email
+
+
+# 跨程序等待第一個請求時的輪詢間隔（秒）
+POLL_SECONDS = 0.05
+
+
+class StoredResponse:
+    """保存的回應；status_code 為 None 表示仍在處理中"""
+
+    __slots__ = ('fingerprint', 'status_code', 'body')
+
+    def __init__(self, fingerprint, status_code=None, body=None):
+        self.fingerprint = fingerprint
+        self.status_code = status_code
+        self.body = body
+
+
+class DatabaseIdempotencyStore:
+    """以 idempotency_records 資料表保存回應"""
+
+    def claim(self, key, fingerprint):
+        """
+        嘗試取得 key 的處理權，成功回傳 None；
+        已有紀錄時回傳 StoredResponse（可能仍在處理中）
+        """
+        expires_at = timezone.now() + timedelta(seconds=get_setting('IDEMPOTENCY_LOCK_TIMEOUT'))
+        for _ in range(2):
+            try:
+                # 在外層交易（ATOMIC_REQUESTS、測試）中呼叫時，衝突只回滾這個 savepoint
+                with transaction.atomic():
+                    IdempotencyRecord.objects.create(key=key, fingerprint=fingerprint, expires_at=expires_at)
+                return None
+            except IntegrityError:
+                pass
+            record = self.get(key)
+            if record is not None:
+                return record
+            # 紀錄已失效，刪除後重新取得
+            IdempotencyRecord.objects.filter(key=key, expires_at__lte=timezone.now()).delete()
+        return self.get(key) or StoredResponse(fingerprint)
+
+    def get(self, key):
+        row = IdempotencyRecord.objects.filter(
+            key=key, expires_at__gt=timezone.now()
+        ).values_list('fingerprint', 'status_code', 'response_body').first()
+        return StoredResponse(*row) if row else None
+
+    def complete(self, key, status_code, body):
+        IdempotencyRecord.objects.filter(key=key).update(
+            status_code=status_code,
+            response_body=body,
+            expires_at=timezone.now() + timedelta(seconds=get_setting('IDEMPOTENCY_TTL')),
+        )
+
+    def abandon(self, key):
+        IdempotencyRecord.objects.filter(key=key, status_code__isnull=True).delete()
+
+    def purge(self):
+        """刪除失效的紀錄，回傳刪除筆數"""
+        return IdempotencyRecord.objects.filter(expires_at__lte=timezone.now()).delete()[0]
+
+
+class CacheIdempotencyStore:
+    """以 Django 快取保存回應（IDEMPOTENCY_CACHE_ALIAS），由快取自行逾期淘汰"""
+
+    def __init__(self):
+        self.cache = caches[get_setting('IDEMPOTENCY_CACHE_ALIAS')]
+
+    def _key(self, key):
+        return f'idempotency:{key}'
+
+    def claim(self, key, fingerprint):
+        if self.cache.add(self._key(key), (fingerprint, None, None), get_setting('IDEMPOTENCY_LOCK_TIMEOUT')):
+            return None
+        return self.get(key) or StoredResponse(fingerprint)
+
+    def get(self, key):
+        value = self.cache.get(self._key(key))
+        return StoredResponse(*value) if value is not None else None
+
+    def complete(self, key, status_code, body):
+        self.cache.set(
+            self._key(key), (self.get(key).fingerprint, status_code, body), get_setting('IDEMPOTENCY_TTL')
+        )
+
+    def abandon(self, key):
+        self.cache.delete(self._key(key))
+
+    def purge(self):
+        return 0
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_idempotency_store():
+    """取得設定中的保存後端（每個程序一個實例）"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = import_string(get_setting('IDEMPOTENCY_BACKEND'))()
+    return _store
+
+
+# 本程序內處理中的 key -> Event，讓同程序的重送不必輪詢
+_in_flight = {}
+_in_flight_lock = threading.Lock()
+
+
+def _scoped_key(scope, request, header):
+    """保存用的 key：API、用戶端與標頭的值（以摘要組合，長度固定）"""
+    client = _user_email(request) or _client_ip(request, get_setting('RATE_LIMIT_TRUSTED_PROXIES')) or ''
+    digest = hashlib.sha256(f'{client}\n{header}'.encode()).hexdigest()
+    return f'{scope}:{digest}'
+
+
+def _fingerprint(request):
+    digest = hashlib.sha256(request.get_full_path().encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def _wait_for(store, key, fingerprint):
+    """
+    等待第一個請求完成並回傳保存的回應（逾時時回傳處理中的紀錄）；
+    第一個請求放棄處理而由這個請求接手時回傳 None
+    """
+    deadline = time.monotonic() + get_setting('IDEMPOTENCY_WAIT_TIMEOUT')
+    while True:
+        event = _in_flight.get(key)
+        remaining = deadline - time.monotonic()
+        if event is not None:
+            event.wait(max(remaining, 0))
+        record = store.get(key)
+        if record is None:
+            # 第一個請求失敗而放棄，改由這個請求處理
+            record = store.claim(key, fingerprint)
+            if record is None:
+                return None
+        if record.status_code is not None:
+            return record
+        if time.monotonic() >= deadline:
+            return record
+        if event is None:
+            time.sleep(min(POLL_SECONDS, remaining))
+
+
+def idempotent(scope):
+    """
+    讓 view 支援 Idempotency-Key 標頭（放在 @api_view 之下）
+    scope 用來區分不同 API 的 key
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            header = request.headers.get('Idempotency-Key')
+            if not header:
+                return view_func(request, *args, **kwargs)
+            if len(header) > 200:
+                return Response(
+                    {'error': 'Idempotency-Key 過長'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            store = get_idempotency_store()
+            key = _scoped_key(scope, request, header)
+            fingerprint = _fingerprint(request)
+            # 重送最常見，先查一次已保存的回應
+            record = store.get(key) or store.claim(key, fingerprint)
+            if record is not None and record.status_code is None:
+                record = _wait_for(store, key, fingerprint)
+            if record is not None:
+                return _replay(record, fingerprint)
+            return _run_once(store, key, view_func, request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _replay(record, fingerprint):
+    if record.fingerprint != fingerprint:
+        return Response(
+            {'error': 'Idempotency-Key 已用於不同的請求'},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY
+        )
+    if record.status_code is None:
+        return Response(
+            {'error': '相同的請求正在處理中，請稍後再試'},
+            status=status.HTTP_409_CONFLICT
+        )
+    response = Response(record.body, status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _run_once(store, key, view_func, request, *args, **kwargs):
+    event = threading.Event()
+    with _in_flight_lock:
+        _in_flight[key] = event
+    completed = False
+    try:
+        response = view_func(request, *args, **kwargs)
+        if response.status_code < 500:
+            # 以 API 輸出的 JSON 格式保存（datetime、Decimal 轉成字串）
+            store.complete(key, response.status_code, json.loads(JSONRenderer().render(response.data)))
+            completed = True
+        return response
+    finally:
+        if not completed:
+            store.abandon(key)
+        with _in_flight_lock:
+            _in_flight.pop(key, None)
+        event.set()
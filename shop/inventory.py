@@ -0,0 +1,185 @@
+"""
+Inventory 的數量更新
+
+所有庫存變動都是一個帶條件的 UPDATE，不先 SELECT ... FOR UPDATE 再由 Python 計算後 save()：
+少一次往返，列鎖只在 UPDATE 到交易結束之間持有，中間不會執行 Python 程式。
+
+- 預留：UPDATE ... SET 預留 + n、可售 - n WHERE 可售 >= n，更新 0 列表示庫存不足
+- 售出、釋放：直接以 F() 加減，不需要條件
+
+INVENTORY_RESERVE_MODE 為 'optimistic' 時，預留改為先讀取 version 再以
+WHERE version = 讀到的值 更新（樂觀鎖），衝突時重試最多 INVENTORY_OPTIMISTIC_RETRIES 次。
+每次變動都會遞增 version。
+
+INVENTORY_LEDGER 開啟時改為異動紀錄模式：每次變動新增一筆 InventoryMovement，
+不更新 Inventory，新增之間不會互相等待；compact() 定期把未彙總的異動加總進 Inventory。
+讀取數量時以 current() 取得 Inventory 加上未彙總異動的結果。
+此模式下預留的可售檢查不鎖 Inventory，依賴下單時已鎖定的活動記錄讓同一商品的預留依序執行
+（同一商品同時只有一個進行中的單列模式活動）。
+"""
+from django.db import transaction
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .conf import get_setting
+from .models import Inventory, InventoryMovement
+
+
+class InventoryConflict(Exception):
+    """樂觀鎖模式下重試後仍然衝突"""
+
+
+def _changes(reserved=0, on_hand=0):
+    # 可售數量 = 實際庫存 - 預留，同一個 UPDATE 中 F() 取的是更新前的值
+    changes = {
+        'quantity_available': F('quantity_available') + (on_hand - reserved),
+        'version': F('version') + 1,
+        'updated_at': timezone.now(),
+    }
+    if reserved:
+        changes['quantity_reserved'] = F('quantity_reserved') + reserved
+    if on_hand:
+        changes['quantity_on_hand'] = F('quantity_on_hand') + on_hand
+    return changes
+
+
+def _ledger():
+    return get_setting('INVENTORY_LEDGER')
+
+
+def _record(product_id, movements):
+    """新增異動紀錄，movements 為 [(類型, 預留增減, 實際庫存增減), ...]"""
+    InventoryMovement.objects.bulk_create([
+        InventoryMovement(product_id=product_id, kind=kind, reserved_delta=reserved, on_hand_delta=on_hand)
+        for kind, reserved, on_hand in movements if reserved or on_hand
+    ])
+
+
+def _pending_sum(field):
+    return Coalesce(Subquery(
+        InventoryMovement.objects.filter(
+            product_id=OuterRef('product_id'), compacted=False
+        ).values('product_id').annotate(total=Sum(field)).values('total')
+    ), 0)
+
+
+def current(product_id):
+    """
+    目前的 (實際庫存, 預留, 可售)，包含尚未彙總的異動；商品沒有 Inventory 時回傳 None
+    Inventory 與未彙總異動在同一個查詢中讀取，彙總前後讀到的結果一致
+    """
+    row = Inventory.objects.filter(product_id=product_id).annotate(
+        pending_reserved=_pending_sum('reserved_delta'),
+        pending_on_hand=_pending_sum('on_hand_delta'),
+    ).values_list(
+        'quantity_on_hand', 'quantity_reserved', 'quantity_available', 'pending_reserved', 'pending_on_hand'
+    ).first()
+    if row is None:
+        return None
+    on_hand, reserved, available, pending_reserved, pending_on_hand = row
+    return (
+        on_hand + pending_on_hand,
+        reserved + pending_reserved,
+        available + pending_on_hand - pending_reserved,
+    )
+
+
+def available(product_id):
+    """目前的可售數量（異動紀錄模式下包含未彙總的異動）"""
+    if _ledger():
+        quantities = current(product_id)
+        return quantities[2] if quantities else 0
+    return Inventory.objects.filter(product_id=product_id).values_list(
+        'quantity_available', flat=True
+    ).first() or 0
+
+
+def reserve(product_id, quantity=1):
+    """預留 quantity 件，可售數量不足時不更新並回傳 False"""
+    if _ledger():
+        if available(product_id) < quantity:
+            return False
+        _record(product_id, [('reserve', quantity, 0)])
+        return True
+    if get_setting('INVENTORY_RESERVE_MODE') == 'optimistic':
+        return _reserve_optimistic(product_id, quantity)
+    return bool(Inventory.objects.filter(
+        product_id=product_id, quantity_available__gte=quantity
+    ).update(**_changes(reserved=quantity)))
+
+
+def _reserve_optimistic(product_id, quantity):
+    for _ in range(get_setting('INVENTORY_OPTIMISTIC_RETRIES')):
+        row = Inventory.objects.filter(product_id=product_id).values_list(
+            'quantity_available', 'version'
+        ).first()
+        if row is None or row[0] < quantity:
+            return False
+        if Inventory.objects.filter(product_id=product_id, version=row[1]).update(
+            **_changes(reserved=quantity)
+        ):
+            return True
+    raise InventoryConflict(f'商品 {product_id} 的庫存更新衝突')
+
+
+def reserve_up_to(product_id, quantity):
+    """盡量預留 quantity 件，回傳實際預留的件數（可售數量不足時少於 quantity）"""
+    while quantity > 0:
+        if reserve(product_id, quantity):
+            return quantity
+        quantity = min(quantity, available(product_id))
+    return 0
+
+
+def adjust(product_id, reserved=0, on_hand=0, kind='adjust'):
+    """無條件加減預留與實際庫存，可售數量隨之調整"""
+    if _ledger():
+        _record(product_id, [(kind, reserved, on_hand)])
+    else:
+        Inventory.objects.filter(product_id=product_id).update(**_changes(reserved, on_hand))
+
+
+def sell(product_id, quantity=1):
+    """預留轉為售出：預留與實際庫存各扣 quantity 件，可售數量不變"""
+    adjust(product_id, reserved=-quantity, on_hand=-quantity, kind='sell')
+
+
+def release(product_id, quantity=1):
+    """釋放預留，可售數量加回 quantity 件"""
+    adjust(product_id, reserved=-quantity, kind='release')
+
+
+def settle(product_id, sold=0, released=0):
+    """批次付款與逾期釋放：一次套用售出與釋放的件數"""
+    if _ledger():
+        _record(product_id, [('sell', -sold, -sold), ('release', -released, 0)])
+    else:
+        Inventory.objects.filter(product_id=product_id).update(
+            **_changes(reserved=-(sold + released), on_hand=-sold)
+        )
+
+
+def compact(batch_size=10000):
+    """
+    把一批未彙總的異動加總進 Inventory 並標記為已彙總，回傳處理筆數
+    其他交易尚未提交或正在彙總的異動會被跳過，留給下一次
+    """
+    with transaction.atomic():
+        rows = list(InventoryMovement.objects.select_for_update(skip_locked=True).filter(
+            compacted=False
+        ).order_by('id').values_list('id', 'product_id', 'reserved_delta', 'on_hand_delta')[:batch_size])
+        if not rows:
+            return 0
+
+        totals = {}
+        for _, product_id, reserved, on_hand in rows:
+            total = totals.setdefault(product_id, [0, 0])
+            total[0] += reserved
+            total[1] += on_hand
+        # 依商品 ID 順序更新，與其他更新 Inventory 的交易使用相同的鎖定順序
+        for product_id in sorted(totals):
+            reserved, on_hand = totals[product_id]
+            Inventory.objects.filter(product_id=product_id).update(**_changes(reserved, on_hand))
+        InventoryMovement.objects.filter(id__in=[row[0] for row in rows]).update(compacted=True)
+        return len(rows)
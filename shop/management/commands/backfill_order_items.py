@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from shop.models import SalesOrder, SalesOrderItem
+
+
+class Command(BaseCommand):
+    help = '為明細記錄在訂單上的單品訂單補建 SalesOrderItem（ORDER_INLINE_ITEMS 開啟時於離峰執行，同時只執行一個）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='只處理指定的活動 ID')
+        parser.add_argument('--batch-size', type=int, default=1000, help='每個交易處理的訂單數')
+
+    def handle(self, *args, **options):
+        orders = SalesOrder.objects.filter(product__isnull=False).exclude(
+            Exists(SalesOrderItem.objects.filter(sales_order_id=OuterRef('pk')))
+        )
+        if options['event'] is not None:
+            orders = orders.filter(flash_sale_event_id=options['event'])
+
+        total, last_id = 0, 0
+        while True:
+            rows = list(orders.filter(id__gt=last_id).order_by('id').values_list(
+                'id', 'product_id', 'quantity', 'unit_price'
+            )[:options['batch_size']])
+            if not rows:
+                break
+            with transaction.atomic():
+                SalesOrderItem.objects.bulk_create([
+                    SalesOrderItem(
+                        sales_order_id=order_id,
+                        product_id=product_id,
+                        quantity=quantity,
+                        unit_price=unit_price,
+                        subtotal=unit_price * quantity,
+                    )
+                    for order_id, product_id, quantity, unit_price in rows
+                ])
+            total += len(rows)
+            last_id = rows[-1][0]
+
+        self.stdout.write(self.style.SUCCESS(f'共補建 {total} 筆訂單明細'))
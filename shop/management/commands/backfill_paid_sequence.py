@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Max
+from shop.models import FlashSaleEvent, SalesOrder
+
+# 付款後的狀態都持有出貨順位
+PRIORITY_STATUSES = ['paid', 'shipped', 'completed']
+
+
+class Command(BaseCommand):
+    help = '依既有的已付款（含已出貨、已完成）訂單設定活動的出貨順位序號（升級後執行一次）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, help='只處理指定的活動 ID')
+        parser.add_argument(
+            '--renumber', action='store_true',
+            help='修正舊版重複或缺少的出貨順位：不重複的順位保留，其餘依付款時間接在最大順位之後'
+        )
+
+    def handle(self, *args, **options):
+        events = FlashSaleEvent.objects.order_by('id')
+        if options['event'] is not None:
+            events = events.filter(id=options['event'])
+            if not events.exists():
+                raise CommandError(f"活動不存在: ID={options['event']}")
+
+        for event_id in events.values_list('id', flat=True):
+            with transaction.atomic():
+                # 鎖定活動記錄，期間的付款會等待，序號不會重複
+                event = FlashSaleEvent.objects.select_for_update().only('paid_sequence').get(id=event_id)
+                orders = SalesOrder.objects.filter(flash_sale_event_id=event_id)
+                holding = orders.filter(status__in=PRIORITY_STATUSES)
+
+                if options['renumber']:
+                    changed = self._renumber(holding)
+                    detail = f'重新編排 {len(changed)} 筆'
+                else:
+                    detail = f"已付款 {holding.aggregate(count=Count('id'))['count']} 筆"
+
+                # 任何狀態的訂單曾經取得的順位都不能再發出
+                top = orders.filter(shipping_priority__isnull=False).aggregate(
+                    top=Max('shipping_priority')
+                )['top'] or 0
+                sequence = max(holding.count(), top)
+                FlashSaleEvent.objects.filter(id=event_id).update(paid_sequence=sequence)
+
+            self.stdout.write(self.style.SUCCESS(
+                f'活動 {event_id}: 出貨順位序號 {event.paid_sequence} → {sequence}（{detail}）'
+            ))
+
+    def _renumber(self, holding):
+        """
+        保留不重複的順位（重複時已出貨、已完成的訂單優先，其次先付款的），
+        重複或缺少順位的訂單依付款時間接在最大順位之後，回傳修改的訂單
+        """
+        orders = list(holding.order_by('paid_at', 'id').only('id', 'status', 'shipping_priority'))
+        taken, kept = set(), set()
+        for order in sorted(orders, key=lambda order: order.status == 'paid'):
+            if order.shipping_priority is not None and order.shipping_priority not in taken:
+                taken.add(order.shipping_priority)
+                kept.add(order.id)
+
+        next_priority = max(taken, default=0) + 1
+        changed = []
+        for order in orders:
+            if order.id in kept:
+                continue
+            order.shipping_priority = next_priority
+            next_priority += 1
+            changed.append(order)
+        SalesOrder.objects.bulk_update(changed, ['shipping_priority'], batch_size=1000)
+        return changed
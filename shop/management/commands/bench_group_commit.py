@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.utils import timezone
+from shop.group_commit import GroupCommitWriter
+from shop.models import Product, Inventory, FlashSaleEvent, SalesOrder
+from shop.services import create_order
+
+
+class Command(BaseCommand):
+    help = '壓測：比較逐筆下單與 group commit 的吞吐量（會建立並刪除壓測用的商品、活動與訂單）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='每種模式的下單數')
+        parser.add_argument('--threads', type=int, default=32, help='併發執行緒數')
+        parser.add_argument('--window-ms', type=float, default=5, help='group commit 收集時間')
+        parser.add_argument('--max-batch', type=int, default=50, help='group commit 每批上限')
+
+    def handle(self, *args, **options):
+        writer = GroupCommitWriter(options['window_ms'], options['max_batch'])
+        modes = [
+            ('逐筆下單', create_order),
+            ('group commit', writer.submit),
+        ]
+        for label, submit in modes:
+            event = self._create_event(options['orders'])
+            try:
+                elapsed, latencies = self._run(submit, event.id, options)
+            finally:
+                # 訂單的活動外鍵是 SET_NULL，刪除商品與活動前先刪除壓測訂單
+                SalesOrder.objects.filter(flash_sale_event_id=event.id).delete()
+                event.product.delete()
+
+            self.stdout.write(self.style.SUCCESS(
+                f"{label:>14}: {options['orders'] / elapsed:8.1f} 筆/秒  "
+                f"p50 {statistics.median(latencies) * 1000:6.1f} ms  "
+                f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:6.1f} ms"
+            ))
+
+    def _create_event(self, quantity):
+        product = Product.objects.create(
+            sku=f'BENCH-{uuid.uuid4().hex[:8]}', name='壓測商品', price=100, cost=50
+        )
+        Inventory.objects.create(
+            product=product, quantity_on_hand=quantity, quantity_available=quantity
+        )
+        return FlashSaleEvent.objects.create(
+            product=product,
+            total_quantity=quantity,
+            start_time=timezone.now() - timedelta(minutes=1),
+            end_time=timezone.now() + timedelta(hours=1),
+            status='active',
+        )
+
+    def _run(self, submit, event_id, options):
+        def place(index):
+            started = time.perf_counter()
+            try:
+                submit(f'bench{index}@test.com', event_id, 'credit_card')
+                return time.perf_counter() - started
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            latencies = sorted(pool.map(place, range(options['orders'])))
+        return time.perf_counter() - started, latencies
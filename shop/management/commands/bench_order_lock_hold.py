@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import statistics
+import time
+from unittest import mock
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import override_settings
+from django.utils import timezone
+from shop import services
+from shop.models import Product, Inventory, FlashSaleEvent, SalesOrder
+
+
+class Command(BaseCommand):
+    help = (
+        '壓測：量測單列模式下單時活動記錄鎖的持有時間，比較 single 與 split 兩種 ORDER_RESERVE_MODE'
+        '（會建立並刪除壓測用的商品、活動與訂單）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=2000, help='每種模式的下單數')
+        parser.add_argument('--threads', type=int, default=1, help='併發執行緒數')
+
+    def handle(self, *args, **options):
+        original_lock_event = services._lock_event
+        hold_times = []
+
+        def timed_lock_event(meta):
+            # 取得鎖之後開始計時，交易提交（鎖放開）後停止
+            locked_event = original_lock_event(meta)
+            started = time.perf_counter()
+            transaction.on_commit(lambda: hold_times.append(time.perf_counter() - started))
+            return locked_event
+
+        with mock.patch.object(services, '_lock_event', timed_lock_event):
+            for mode in ('single', 'split'):
+                hold_times.clear()
+                event = self._create_event(options['orders'])
+                try:
+                    with override_settings(FLASH_SALE={**settings.FLASH_SALE, 'ORDER_RESERVE_MODE': mode}):
+                        elapsed = self._run(event.id, options)
+                finally:
+                    # 訂單的活動外鍵是 SET_NULL，刪除商品與活動前先刪除壓測訂單
+                    SalesOrder.objects.filter(flash_sale_event_id=event.id).delete()
+                    event.product.delete()
+
+                hold_times.sort()
+                self.stdout.write(self.style.SUCCESS(
+                    f"{mode:>6}: 鎖持有 平均 {statistics.mean(hold_times) * 1e6:7.0f} µs  "
+                    f"p50 {statistics.median(hold_times) * 1e6:7.0f} µs  "
+                    f"p99 {hold_times[int(len(hold_times) * 0.99) - 1] * 1e6:7.0f} µs  "
+                    f"（{options['orders'] / elapsed:7.1f} 筆/秒）"
+                ))
+
+    def _create_event(self, quantity):
+        product = Product.objects.create(
+            sku=f'BENCH-{uuid.uuid4().hex[:8]}', name='壓測商品', price=100, cost=50
+        )
+        Inventory.objects.create(
+            product=product, quantity_on_hand=quantity, quantity_available=quantity
+        )
+        return FlashSaleEvent.objects.create(
+            product=product,
+            total_quantity=quantity,
+            start_time=timezone.now() - timedelta(minutes=1),
+            end_time=timezone.now() + timedelta(hours=1),
+            status='active',
+        )
+
+    def _run(self, event_id, options):
+        def place(index):
+            try:
+                services.create_order(f'bench{index}@test.com', event_id, 'credit_card')
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as pool:
+            list(pool.map(place, range(options['orders'])))
+        return time.perf_counter() - started
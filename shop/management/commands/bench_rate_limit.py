@@ -0,0 +1,55 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.urls import resolve
+from django.utils.module_loading import import_string
+from shop.rate_limit import RateLimitMiddleware
+
+
+class Command(BaseCommand):
+    help = '壓測：頻率限制本身的耗時（權杖桶與 middleware，不碰資料庫）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hits', type=int, default=200000, help='呼叫次數')
+        parser.add_argument('--keys', type=int, default=10000, help='不同的 key 數量')
+        parser.add_argument(
+            '--backend', default='shop.rate_limit.LocalRateLimiter', help='頻率限制後端'
+        )
+
+    def handle(self, *args, **options):
+        hits, keys = options['hits'], options['keys']
+        limiter = import_string(options['backend'])()
+
+        started = time.perf_counter()
+        for i in range(hits):
+            limiter.hit(f'bench:email:user{i % keys}@test.com', 1000, 1000)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'權杖桶    : {elapsed / hits * 1e6:8.2f} µs/次  ({hits / elapsed:,.0f} 次/秒)'
+        ))
+
+        # 含解析 email、IP 與組 key 的 middleware 完整檢查
+        middleware = RateLimitMiddleware(lambda request: None)
+        middleware.limiter = limiter
+        middleware.rules = {'create_flash_sale_order': {'email': (1000, 1000), 'ip': (1e9, 1e9)}}
+        factory = RequestFactory()
+        match = resolve('/api/flash-sale/order/')
+        requests = []
+        for i in range(min(keys, hits)):
+            request = factory.post(
+                '/api/flash-sale/order/',
+                json.dumps({'user_email': f'user{i}@test.com'}),
+                content_type='application/json',
+            )
+            request.resolver_match = match
+            requests.append(request)
+
+        started = time.perf_counter()
+        for i in range(hits):
+            middleware.process_view(requests[i % len(requests)], None, (), {})
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'middleware: {elapsed / hits * 1e6:8.2f} µs/次  ({hits / elapsed:,.0f} 次/秒)'
+        ))
@@ -0,0 +1,125 @@
+from datetime import timedelta
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+from django.test import Client
+from django.utils import timezone
+from shop.models import Product, Inventory, FlashSaleEvent, SalesOrder
+
+
+class Command(BaseCommand):
+    help = '壓測：付款回調耗時是否隨已付款訂單數增加（會建立並刪除壓測用的商品、活動與訂單）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--paid', type=int, default=100000, help='累積到的已付款訂單數')
+        parser.add_argument('--checkpoints', type=int, default=5, help='量測點數（以 10 倍間隔分布）')
+        parser.add_argument('--samples', type=int, default=50, help='每個量測點的付款回調次數')
+
+    def handle(self, *args, **options):
+        target, samples = options['paid'], options['samples']
+        checkpoints = sorted({
+            max(int(target / 10 ** i), 0) for i in range(options['checkpoints'])
+        } | {0})
+        event = self._create_event(target + samples * len(checkpoints))
+        client = Client()
+        now = timezone.now()
+
+        try:
+            paid = 0
+            for checkpoint in checkpoints:
+                # 直接寫入已付款訂單到量測點（同時遞增活動的出貨順位序號）
+                self._bulk_paid(event, paid, checkpoint - paid, now)
+                paid = checkpoint
+
+                pending = self._bulk_pending(event, samples, now)
+                latencies = []
+                for order_number in pending:
+                    started = time.perf_counter()
+                    response = client.post(
+                        '/api/payment/callback/',
+                        {'order_number': order_number, 'status': 'success'},
+                        content_type='application/json',
+                    )
+                    latencies.append(time.perf_counter() - started)
+                    assert response.status_code == 200, response.content
+                paid += samples
+
+                # 舊做法：以 count 計算出貨順位
+                started = time.perf_counter()
+                for _ in range(10):
+                    SalesOrder.objects.filter(
+                        flash_sale_event_id=event.id, status='paid', paid_at__lt=timezone.now()
+                    ).count()
+                legacy = (time.perf_counter() - started) / 10
+
+                self.stdout.write(self.style.SUCCESS(
+                    f'已付款 {checkpoint:>7} 筆: 付款回調 p50 {statistics.median(latencies) * 1000:6.2f} ms  '
+                    f'max {max(latencies) * 1000:6.2f} ms  （舊做法 count 查詢 {legacy * 1000:6.2f} ms）'
+                ))
+        finally:
+            SalesOrder.objects.filter(flash_sale_event_id=event.id).delete()
+            event.product.delete()
+
+    def _create_event(self, quantity):
+        product = Product.objects.create(
+            sku=f'BENCH-{uuid.uuid4().hex[:8]}', name='壓測商品', price=100, cost=50,
+        )
+        Inventory.objects.create(
+            product=product, quantity_on_hand=quantity, quantity_reserved=0, quantity_available=quantity,
+        )
+        return FlashSaleEvent.objects.create(
+            product=product,
+            total_quantity=quantity,
+            start_time=timezone.now() - timedelta(minutes=1),
+            end_time=timezone.now() + timedelta(hours=1),
+            status='active',
+        )
+
+    def _bulk_paid(self, event, start, count, now):
+        for offset in range(0, count, 5000):
+            size = min(5000, count - offset)
+            SalesOrder.objects.bulk_create([
+                SalesOrder(
+                    order_number=f'BENCH{event.id}P{start + offset + i}',
+                    user_email=f'paid{start + offset + i}@bench.test',
+                    flash_sale_event=event,
+                    status='paid',
+                    payment_method='credit_card',
+                    total_amount=100,
+                    payment_deadline=now,
+                    paid_at=now,
+                    shipping_priority=start + offset + i + 1,
+                ) for i in range(size)
+            ])
+        with transaction.atomic():
+            FlashSaleEvent.objects.filter(id=event.id).update(
+                sold_quantity=F('sold_quantity') + count, paid_sequence=F('paid_sequence') + count
+            )
+            Inventory.objects.filter(product_id=event.product_id).update(
+                quantity_on_hand=F('quantity_on_hand') - count,
+                quantity_available=F('quantity_available') - count,
+            )
+
+    def _bulk_pending(self, event, count, now):
+        orders = SalesOrder.objects.bulk_create([
+            SalesOrder(
+                order_number=f'BENCH{event.id}Q{uuid.uuid4().hex[:12]}',
+                user_email=f'pending{uuid.uuid4().hex[:12]}@bench.test',
+                flash_sale_event=event,
+                status='pending',
+                payment_method='credit_card',
+                total_amount=100,
+                payment_deadline=now + timedelta(hours=1),
+            ) for _ in range(count)
+        ])
+        with transaction.atomic():
+            FlashSaleEvent.objects.filter(id=event.id).update(reserved_quantity=F('reserved_quantity') + count)
+            Inventory.objects.filter(product_id=event.product_id).update(
+                quantity_reserved=F('quantity_reserved') + count,
+                quantity_available=F('quantity_available') - count,
+            )
+        return [order.order_number for order in orders]
@@ -0,0 +1,160 @@
+from datetime import timedelta
+import uuid
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from shop.conf import get_setting
+from shop.db_router import PIN_COOKIE
+from shop.models import Product, Inventory, FlashSaleEvent, SalesOrder
+from shop.order_status_cache import get_order_status_cache
+from shop.sold_out import get_sold_out_cache
+
+
+class Command(BaseCommand):
+    help = (
+        '以本機 SQLite 主資料庫與副本驗證讀取副本路由與 read-your-writes '
+        '（python manage.py check_replica_routing --settings=config.settings_replica_local）'
+    )
+
+    def handle(self, *args, **options):
+        self.replicas = list(get_setting('DATABASE_REPLICAS'))
+        if not self.replicas:
+            raise CommandError('沒有設定 DATABASE_REPLICAS')
+        if any(settings.DATABASES[alias]['ENGINE'] != 'django.db.backends.sqlite3'
+               for alias in ['default'] + self.replicas):
+            raise CommandError('只支援 SQLite（以複製檔案模擬副本），請使用 config.settings_replica_local')
+
+        self.failures = 0
+        event = self._create_event()
+        self._replicate()
+        email = f'replica-{uuid.uuid4().hex[:8]}@test.com'
+        buyer, other = Client(), Client()
+
+        response, used = self._request(lambda: other.get(f'/api/flash-sale/{event.id}/status/'))
+        self._check('活動狀態查詢讀副本', response.status_code == 200 and used == {'replica'}, used)
+
+        response, used = self._request(lambda: buyer.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json'))
+        self._check('下單在主資料庫', response.status_code == 201 and used == {'default'}, used)
+        self._check('下單後回應固定讀主資料庫的 cookie', PIN_COOKIE in response.cookies, response.cookies.keys())
+        order_number = response.json()['order_number']
+
+        self._invalidate(order_number)
+        response, used = self._request(lambda: buyer.get(f'/api/order/{order_number}/status/'))
+        self._check('下單的用戶端立即查得到訂單（讀主資料庫）', response.status_code == 200 and used == {'default'}, used)
+
+        response, used = self._request(lambda: other.get(f'/api/user/orders/?email={email}'))
+        self._check(
+            '其他用戶端在副本同步前讀副本（看不到新訂單）',
+            response.status_code == 200 and not response.json()['orders'] and used == {'replica'}, used
+        )
+
+        self._replicate()
+        response, used = self._request(lambda: other.get(f'/api/user/orders/?email={email}'))
+        self._check(
+            '副本同步後其他用戶端查得到訂單',
+            response.status_code == 200 and len(response.json()['orders']) == 1 and used == {'replica'}, used
+        )
+
+        self._invalidate(order_number)
+        response, used = self._request(lambda: other.get(f'/api/order/{order_number}/status/'))
+        self._check('訂單狀態查詢讀副本', response.status_code == 200 and used == {'replica'}, used)
+
+        response, used = self._request(lambda: other.get(
+            f'/api/payment/callback/?order={order_number}&status=success'
+        ))
+        self._check('付款回調的查詢與寫入都在主資料庫', response.status_code == 200 and used == {'default'}, used)
+
+        self._check_stale_replica(buyer, Client())
+
+        if self.failures:
+            raise CommandError(f'{self.failures} 項檢查失敗')
+        self.stdout.write(self.style.SUCCESS('讀取副本路由檢查全部通過'))
+
+    def _check_stale_replica(self, buyer, other):
+        """副本落後時，依副本內容做的寫入與售罄旗標要以主資料庫為準（other 為沒有寫入過、讀副本的用戶端）"""
+        event = self._create_event()
+        email = f'replica-{uuid.uuid4().hex[:8]}@test.com'
+        response = buyer.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json')
+        order_number = response.json()['order_number']
+        self._replicate()
+        buyer.get(f'/api/payment/callback/?order={order_number}&status=success')
+
+        # 副本還是付款前的內容，且看起來已過付款期限
+        SalesOrder.objects.using(self.replicas[0]).filter(order_number=order_number).update(
+            payment_deadline=timezone.now() - timedelta(minutes=1)
+        )
+        self._invalidate(order_number)
+        response = other.get(f'/api/order/{order_number}/status/')
+        order_status = SalesOrder.objects.using('default').get(order_number=order_number).status
+        self._check(
+            '副本落後時讀取時釋放以主資料庫的訂單狀態為準（已付款的訂單不會被釋放）',
+            response.json()['status'] == 'paid' and order_status == 'paid', (response.json()['status'], order_status)
+        )
+
+        # 副本看起來已售罄，主資料庫仍有庫存
+        FlashSaleEvent.objects.using(self.replicas[0]).filter(pk=event.id).update(total_quantity=1)
+        response = Client().get(f'/api/flash-sale/{event.id}/status/')
+        self._check(
+            '副本落後時不依副本內容設定售罄旗標',
+            response.json()['has_stock'] and not get_sold_out_cache().is_sold_out(event.id),
+            response.json()['remaining'],
+        )
+
+    def _request(self, request):
+        """執行請求，回傳 (回應, 執行過查詢的資料庫別名)"""
+        contexts = {alias: CaptureQueriesContext(connections[alias]) for alias in ['default'] + self.replicas}
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            response = request()
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        return response, {alias for alias, context in contexts.items() if len(context)}
+
+    def _check(self, label, passed, detail):
+        if passed:
+            self.stdout.write(self.style.SUCCESS(f'✓ {label}'))
+        else:
+            self.failures += 1
+            self.stdout.write(self.style.ERROR(f'✗ {label}（{detail}）'))
+
+    def _replicate(self):
+        """把主資料庫的內容複製到副本（相當於副本追上主資料庫）"""
+        source = connections['default']
+        source.ensure_connection()
+        for alias in self.replicas:
+            target = connections[alias]
+            target.ensure_connection()
+            source.connection.backup(target.connection)
+
+    def _invalidate(self, order_number):
+        # 避免訂單狀態快取命中而沒有查詢資料庫
+        cache = get_order_status_cache()
+        if cache is not None:
+            cache.invalidate([order_number])
+
+    def _create_event(self):
+        product = Product.objects.create(
+            sku=f'REPLICA-{uuid.uuid4().hex[:8]}', name='副本路由檢查商品', price=100, cost=50
+        )
+        Inventory.objects.create(product=product, quantity_on_hand=10, quantity_available=10)
+        return FlashSaleEvent.objects.create(
+            product=product,
+            total_quantity=10,
+            start_time=timezone.now() - timedelta(minutes=1),
+            end_time=timezone.now() + timedelta(hours=1),
+            status='active',
+        )
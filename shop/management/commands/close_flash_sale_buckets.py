@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from shop import inventory
+from shop.models import FlashSaleEvent
+
+
+class Command(BaseCommand):
+    help = (
+        '活動結束後把各分桶未賣出的配額歸還 Inventory'
+        '（可重複執行，歸還之後逾期或取消而回到桶中的名額）'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int, help='活動 ID')
+        parser.add_argument('--force', action='store_true', help='活動仍在進行中也執行（之後分桶下單都會售罄）')
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            # 鎖定順序與付款相同：活動 → 分桶 → Inventory
+            try:
+                event = FlashSaleEvent.objects.select_for_update().get(id=options['event_id'])
+            except FlashSaleEvent.DoesNotExist:
+                raise CommandError(f"活動不存在: ID={options['event_id']}")
+
+            if not event.bucket_count:
+                raise CommandError(f'活動 {event.id} 沒有分桶')
+            if event.is_active() and not options['force']:
+                raise CommandError(f'活動 {event.id} 仍在進行中，確定要結束分桶下單請加上 --force')
+
+            buckets = event.stock_buckets.select_for_update().order_by('id')
+            remaining = sum(
+                bucket.quota - bucket.reserved_quantity - bucket.sold_quantity for bucket in buckets
+            )
+            # 配額縮到已預留加已售出，待付款的訂單付款或釋放時仍照常更新所屬的桶
+            buckets.update(quota=F('reserved_quantity') + F('sold_quantity'))
+            if remaining:
+                inventory.release(event.product_id, remaining)
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ 活動 {event.id} 分桶剩餘 {remaining} 件已歸還庫存'
+        ))
@@ -0,0 +1,60 @@
+from datetime import timedelta
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from shop.inventory import compact
+from shop.models import InventoryMovement
+
+
+class Command(BaseCommand):
+    help = '把未彙總的庫存異動加總進 Inventory（INVENTORY_LEDGER 開啟時使用，可常駐執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=10000, help='每個交易彙總的異動筆數')
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='常駐執行時每次彙總的間隔秒數（0 為只執行一次）'
+        )
+        parser.add_argument(
+            '--purge-days', type=int, default=None,
+            help='同時刪除超過 N 天的已彙總異動（不指定則保留全部作為對帳紀錄）'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        if options['interval']:
+            signal.signal(signal.SIGTERM, self._stop)
+            signal.signal(signal.SIGINT, self._stop)
+
+        total = 0
+        while True:
+            count = self._compact_all(options['batch'])
+            total += count
+            if count and options['interval']:
+                self.stdout.write(self.style.SUCCESS(f'✓ 彙總 {count} 筆異動'))
+            if not options['interval'] or self.stopping.wait(options['interval']):
+                break
+
+        self.stdout.write(self.style.SUCCESS(f'總共彙總 {total} 筆庫存異動'))
+
+        if options['purge_days'] is not None:
+            deleted = InventoryMovement.objects.filter(
+                compacted=True,
+                created_at__lt=timezone.now() - timedelta(days=options['purge_days']),
+            ).delete()[0]
+            self.stdout.write(self.style.SUCCESS(f'刪除 {deleted} 筆已彙總的異動'))
+
+    def _compact_all(self, batch):
+        """彙總到沒有剩餘的異動為止"""
+        total = 0
+        while not self.stopping.is_set():
+            count = compact(batch)
+            total += count
+            if count < batch:
+                break
+        return total
+
+    def _stop(self, signum, frame):
+        self.stopping.set()
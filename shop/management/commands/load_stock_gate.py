@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from shop.models import FlashSaleEvent
+from shop.stock_gate import get_stock_gate, remaining_from_db
+
+
+class Command(BaseCommand):
+    help = '將活動剩餘數量載入庫存閘門（活動開始前執行，或用來重新校正）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_ids', nargs='*', type=int, help='活動 ID（預設為所有進行中的活動）')
+        parser.add_argument('--force', action='store_true', help='覆蓋已載入的令牌數')
+
+    def handle(self, *args, **options):
+        stock_gate = get_stock_gate()
+        event_ids = options['event_ids'] or list(
+            FlashSaleEvent.objects.filter(status='active').values_list('id', flat=True)
+        )
+
+        for event_id in event_ids:
+            try:
+                stock_gate.load(event_id, remaining_from_db(event_id), force=options['force'])
+            except FlashSaleEvent.DoesNotExist:
+                self.stdout.write(self.style.ERROR(f'✗ 活動不存在: ID={event_id}'))
+                continue
+            self.stdout.write(
+                self.style.SUCCESS(f'✓ 活動 {event_id} 剩餘令牌: {stock_gate.remaining(event_id)}')
+            )
@@ -0,0 +1,36 @@
+import signal
+import time
+
+from django.core.management.base import BaseCommand
+from shop.services import process_queued_tickets
+
+
+class Command(BaseCommand):
+    help = '依先後順序處理非同步下單的排隊單（可同時執行多個）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch', type=int, default=50, help='每次取出的排隊單數')
+        parser.add_argument('--interval', type=float, default=0.2, help='沒有排隊單時的等待秒數')
+        parser.add_argument('--once', action='store_true', help='處理完目前的排隊單後結束')
+
+    def handle(self, *args, **options):
+        self.running = True
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        total = 0
+        while self.running:
+            processed = process_queued_tickets(options['batch'])
+            total += processed
+            if processed:
+                self.stdout.write(self.style.SUCCESS(f'✓ 處理 {processed} 筆排隊單'))
+                continue
+            if options['once']:
+                break
+            time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'\n總共處理 {total} 筆排隊單'))
+
+    def _stop(self, signum, frame):
+        # 處理完手上這批再結束
+        self.running = False
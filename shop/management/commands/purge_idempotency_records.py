@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from shop.idempotency import get_idempotency_store
+
+
+class Command(BaseCommand):
+    help = '刪除已失效的 Idempotency-Key 紀錄（資料庫後端使用，建議每小時執行）'
+
+    def handle(self, *args, **options):
+        count = get_idempotency_store().purge()
+        self.stdout.write(
+            self.style.SUCCESS(f'共刪除 {count} 筆失效的 Idempotency-Key 紀錄')
+        )
@@ -1,57 +1,70 @@
 from django.core.management.base import BaseCommand
 from django.utils import timezone
 from django.db import transaction
-from django.db.models import F
-from shop.models import SalesOrder, Inventory, FlashSaleEvent
+from shop.models import SalesOrder
+from shop.services import expire_pending_orders, release_reservation
 
 
 class Command(BaseCommand):
     help = '釋放逾時未付款的訂單庫存'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help='每個交易處理的訂單數')
+        parser.add_argument(
+            '--per-order', action='store_true',
+            help='逐筆處理（舊做法，每筆訂單一個交易）'
+        )
+
     def handle(self, *args, **options):
         now = timezone.now()
 
+        if options['per_order']:
+            released, failed = self._release_per_order(now, options['verbosity'])
+        else:
+            released, failed = expire_pending_orders(now, options['chunk_size']), 0
+
+        count = sum(released.values())
+        if count > 0:
+            detail = '、'.join(
+                f'活動 {event_id}: {quantity} 筆' if event_id else f'無活動: {quantity} 筆'
+                for event_id, quantity in sorted(released.items(), key=lambda item: item[0] or 0)
+            )
+            self.stdout.write(
+                self.style.SUCCESS(f'總共成功釋放 {count} 筆逾時訂單的庫存（{detail}）')
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING('沒有逾時未付款的訂單')
+            )
+        if failed:
+            self.stdout.write(
+                self.style.ERROR(f'{failed} 筆訂單處理失敗')
+            )
+
+    def _release_per_order(self, now, verbosity):
         expired_orders = SalesOrder.objects.filter(
             status='pending',
             payment_deadline__lt=now
-        ).select_related('flash_sale_event')
+        )
 
-        count = 0
+        released, failed = {}, 0
         for order in expired_orders:
             try:
                 with transaction.atomic():
                     order.status = 'expired'
                     order.save()
 
-                    if order.flash_sale_event:
-                        inventory = Inventory.objects.select_for_update().get(
-                            product=order.flash_sale_event.product
-                        )
-                        inventory.quantity_reserved -= 1
-                        inventory.quantity_available = (
-                            inventory.quantity_on_hand - inventory.quantity_reserved
-                        )
-                        inventory.save()
-
-                        FlashSaleEvent.objects.filter(pk=order.flash_sale_event_id).update(
-                            reserved_quantity=F('reserved_quantity') - 1
-                        )
-
-                    count += 1
+                    if order.flash_sale_event_id:
+                        release_reservation(order)
+
+                released[order.flash_sale_event_id] = released.get(order.flash_sale_event_id, 0) + 1
+                if verbosity >= 2:
                     self.stdout.write(
                         self.style.SUCCESS(f'✓ 釋放訂單: {order.order_number}')
                     )
             except Exception as e:
+                failed += 1
                 self.stdout.write(
                     self.style.ERROR(f'✗ 處理訂單 {order.order_number} 失敗: {str(e)}')
                 )
-
-        if count > 0:
-            self.stdout.write(
-                self.style.SUCCESS(f'\n總共成功釋放 {count} 筆逾時訂單的庫存')
-            )
-        else:
-            self.stdout.write(
-                self.style.WARNING('沒有逾時未付款的訂單')
-            )
-
+        return released, failed
@@ -0,0 +1,64 @@
+from datetime import timedelta
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from shop.models import Product, Inventory, FlashSaleEvent, SalesOrder
+
+
+class Command(BaseCommand):
+    help = '列出各 API 每次請求執行的 SQL 數量（在交易中執行，結束後全部還原）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-sql', action='store_true', help='同時列出 SQL')
+
+    def handle(self, *args, **options):
+        client = Client()
+        self.verbose_sql = options['verbose_sql']
+
+        with transaction.atomic():
+            event = self._create_event()
+
+            def order(email):
+                return client.post('/api/flash-sale/order/', {
+                    'user_email': email,
+                    'flash_sale_event_id': event.id,
+                    'payment_method': 'credit_card',
+                }, content_type='application/json')
+
+            self._measure('下單（第一筆）', lambda: order('first@test.com'))
+            self._measure('下單', lambda: order('second@test.com'))
+            self._measure('重複下單', lambda: order('second@test.com'))
+
+            order_number = SalesOrder.objects.get(user_email='first@test.com').order_number
+            self._measure('付款成功回調', lambda: client.get(
+                f'/api/payment/callback/?order={order_number}&status=success'
+            ))
+            self._measure('查詢訂單狀態', lambda: client.get(f'/api/order/{order_number}/status/'))
+            self._measure('查詢活動狀態', lambda: client.get(f'/api/flash-sale/{event.id}/status/'))
+
+            transaction.set_rollback(True)
+
+    def _measure(self, label, request):
+        with CaptureQueriesContext(connection) as queries:
+            response = request()
+        self.stdout.write(f'{label:<12} {response.status_code}  {len(queries):>3} 次查詢')
+        if self.verbose_sql:
+            for query in queries:
+                self.stdout.write(f"    {query['sql']}")
+
+    def _create_event(self):
+        product = Product.objects.create(
+            sku=f'QUERY-{uuid.uuid4().hex[:8]}', name='查詢計數商品', price=100, cost=50
+        )
+        Inventory.objects.create(product=product, quantity_on_hand=10, quantity_available=10)
+        return FlashSaleEvent.objects.create(
+            product=product,
+            total_quantity=10,
+            start_time=timezone.now() - timedelta(minutes=1),
+            end_time=timezone.now() + timedelta(hours=1),
+            status='active',
+        )
@@ -0,0 +1,119 @@
+import heapq
+import signal
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+from django.utils import timezone
+from shop.models import SalesOrder
+from shop.services import expire_pending_orders
+
+
+class Command(BaseCommand):
+    help = '常駐釋放逾期訂單：依付款期限排程，到期後約一秒內釋放（可同時執行多個）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=1.0, help='檢查新訂單與到期訂單的間隔秒數')
+        parser.add_argument('--batch', type=int, default=1000, help='每次讀取新訂單的筆數')
+        parser.add_argument('--chunk-size', type=int, default=500, help='每個交易釋放的訂單數')
+        parser.add_argument(
+            '--sweep-interval', type=float, default=60,
+            help='全面檢查的間隔秒數（補上漏掉的訂單、移除已付款的排程）'
+        )
+
+    def handle(self, *args, **options):
+        self.stopping = threading.Event()
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+
+        self.options = options
+        # (付款期限 timestamp, 訂單 ID) 的最小堆積
+        self.heap = []
+        self.scheduled = set()
+        # 先記下目前最大的訂單 ID，之後只讀取比它新的訂單
+        self.watermark = SalesOrder.objects.aggregate(top=Max('id'))['top'] or 0
+        for order_id, deadline in SalesOrder.objects.filter(
+            status='pending', payment_deadline__isnull=False
+        ).values_list('id', 'payment_deadline').iterator():
+            self._schedule(order_id, deadline)
+        self.stdout.write(self.style.SUCCESS(f'載入 {len(self.heap)} 筆待付款訂單，開始排程'))
+
+        total = 0
+        next_sweep = time.monotonic() + options['sweep_interval']
+        while not self.stopping.is_set():
+            self._load_new_orders()
+            total += self._release_due()
+
+            if time.monotonic() >= next_sweep:
+                total += self._sweep()
+                next_sweep = time.monotonic() + options['sweep_interval']
+
+            # 睡到下一筆到期或下一次檢查新訂單，收到停止信號時立即醒來
+            wait = options['interval']
+            if self.heap:
+                wait = min(wait, max(self.heap[0][0] - time.time(), 0))
+            self.stopping.wait(wait)
+
+        self.stdout.write(self.style.SUCCESS(f'\n總共釋放 {total} 筆逾時訂單的庫存'))
+
+    def _schedule(self, order_id, deadline):
+        if order_id not in self.scheduled:
+            self.scheduled.add(order_id)
+            heapq.heappush(self.heap, (deadline.timestamp(), order_id))
+
+    def _load_new_orders(self):
+        """依 ID 遞增讀取新訂單，只排程待付款的"""
+        while True:
+            rows = list(SalesOrder.objects.filter(id__gt=self.watermark).order_by('id').values_list(
+                'id', 'payment_deadline', 'status'
+            )[:self.options['batch']])
+            for order_id, deadline, status in rows:
+                if status == 'pending' and deadline is not None:
+                    self._schedule(order_id, deadline)
+            if rows:
+                self.watermark = rows[-1][0]
+            if len(rows) < self.options['batch']:
+                return
+
+    def _release_due(self):
+        now = time.time()
+        due = []
+        while self.heap and self.heap[0][0] <= now:
+            _, order_id = heapq.heappop(self.heap)
+            self.scheduled.discard(order_id)
+            due.append(order_id)
+        if not due:
+            return 0
+
+        # 已付款或已取消的訂單不會被改動；其他程序正在處理的訂單會被跳過
+        released = expire_pending_orders(timezone.now(), self.options['chunk_size'], order_ids=due)
+        count = sum(released.values())
+        if count:
+            self.stdout.write(self.style.SUCCESS(f'✓ 釋放 {count} 筆逾時訂單'))
+        return count
+
+    def _sweep(self):
+        """
+        ID 比 watermark 小、但較晚提交的訂單不會被讀到，定期全面釋放一次補上；
+        同時移除已經付款或取消的排程，避免堆積越來越大
+        """
+        count = sum(expire_pending_orders(timezone.now(), self.options['chunk_size']).values())
+        if count:
+            self.stdout.write(self.style.SUCCESS(f'✓ 全面檢查釋放 {count} 筆逾時訂單'))
+
+        scheduled = list(self.scheduled)
+        settled = set()
+        for offset in range(0, len(scheduled), 1000):
+            settled.update(SalesOrder.objects.filter(
+                id__in=scheduled[offset:offset + 1000]
+            ).exclude(status='pending').values_list('id', flat=True))
+        if settled:
+            self.heap = [entry for entry in self.heap if entry[1] not in settled]
+            heapq.heapify(self.heap)
+            self.scheduled -= settled
+        return count
+
+    def _stop(self, signum, frame):
+        # 處理完手上這批再結束
+        self.stopping.set()
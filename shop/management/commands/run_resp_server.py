@@ -0,0 +1,136 @@
+import asyncio
+import time
+
+from django.core.management.base import BaseCommand
+
+
+class RespStore:
+    """記憶體內的 key/value 儲存，只支援搶購用到的指令"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    def _incr(self, key, amount):
+        value = int(self.data[key]) if self._alive(key) else 0
+        value += amount
+        self.data[key] = str(value)
+        return value
+
+    def execute(self, command, args):
+        command = command.upper()
+        if command == 'PING':
+            return 'PONG'
+        if command in ('SELECT', 'AUTH'):
+            return 'OK'
+        if command == 'GET':
+            return self.data[args[0]] if self._alive(args[0]) else None
+        if command == 'SET':
+            key, value, options = args[0], args[1], [a.upper() for a in args[2:]]
+            if 'NX' in options and self._alive(key):
+                return None
+            self.data[key] = value
+            self.expires.pop(key, None)
+            for unit, scale in (('EX', 1), ('PX', 0.001)):
+                if unit in options:
+                    ttl = float(args[2 + options.index(unit) + 1]) * scale
+                    self.expires[key] = time.monotonic() + ttl
+            return 'OK'
+        if command == 'DEL':
+            removed = sum(1 for key in args if self._alive(key))
+            for key in args:
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return removed
+        if command == 'EXISTS':
+            return sum(1 for key in args if self._alive(key))
+        if command == 'INCR':
+            return self._incr(args[0], 1)
+        if command == 'DECR':
+            return self._incr(args[0], -1)
+        if command == 'INCRBY':
+            return self._incr(args[0], int(args[1]))
+        if command == 'DECRBY':
+            return self._incr(args[0], -int(args[1]))
+        if command in ('EXPIRE', 'PEXPIRE'):
+            if not self._alive(args[0]):
+                return 0
+            scale = 1 if command == 'EXPIRE' else 0.001
+            self.expires[args[0]] = time.monotonic() + float(args[1]) * scale
+            return 1
+        raise ValueError(f"unknown command '{command}'")
+
+
+def encode(value):
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, Exception):
+        return b'-ERR %s\r\n' % str(value).encode()
+    if isinstance(value, list):
+        return b'*%d\r\n' % len(value) + b''.join(encode(v) for v in value)
+    if value in ('OK', 'PONG'):
+        return b'+%s\r\n' % value.encode()
+    data = value.encode()
+    return b'$%d\r\n%s\r\n' % (len(data), data)
+
+
+async def read_command(reader):
+    line = await reader.readline()
+    if not line:
+        return None
+    count = int(line[1:-2])
+    args = []
+    for _ in range(count):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2].decode())
+    return args
+
+
+class Command(BaseCommand):
+    help = '啟動本機的 Redis 協定替代服務（開發與壓測用，資料只存在記憶體）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=6379)
+
+    def handle(self, *args, **options):
+        store = RespStore()
+
+        async def handle_client(reader, writer):
+            try:
+                while True:
+                    args = await read_command(reader)
+                    if not args:
+                        break
+                    try:
+                        result = store.execute(args[0], args[1:])
+                    except Exception as e:
+                        result = e
+                    writer.write(encode(result))
+                    await writer.drain()
+            except (ConnectionError, asyncio.IncompleteReadError):
+                pass
+            finally:
+                writer.close()
+
+        async def serve():
+            server = await asyncio.start_server(handle_client, options['host'], options['port'])
+            self.stdout.write(self.style.SUCCESS(
+                f"✓ Redis 協定替代服務啟動於 {options['host']}:{options['port']}"
+            ))
+            async with server:
+                await server.serve_forever()
+
+        try:
+            asyncio.run(serve())
+        except KeyboardInterrupt:
+            self.stdout.write('已停止')
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from shop import inventory
+from shop.models import FlashSaleEvent, FlashSaleStockBucket
+
+
+class Command(BaseCommand):
+    help = '將搶購活動的剩餘配額拆成多個庫存分桶（活動開始前執行）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int, help='活動 ID')
+        parser.add_argument('--buckets', type=int, default=8, help='分桶數（建議接近資料庫 CPU 核心數）')
+
+    def handle(self, *args, **options):
+        bucket_count = options['buckets']
+        if bucket_count < 1:
+            raise CommandError('分桶數至少為 1')
+
+        with transaction.atomic():
+            try:
+                event = FlashSaleEvent.objects.select_for_update().get(id=options['event_id'])
+            except FlashSaleEvent.DoesNotExist:
+                raise CommandError(f"活動不存在: ID={options['event_id']}")
+
+            if event.bucket_count:
+                raise CommandError(f'活動 {event.id} 已經分成 {event.bucket_count} 桶')
+
+            remaining = event.total_quantity - event.reserved_quantity - event.sold_quantity
+            # 分桶配額整批從 Inventory 預留，下單時就不需要再鎖 Inventory
+            if not inventory.reserve(event.product_id, remaining):
+                raise CommandError(
+                    f'可售庫存不足: 需要 {remaining} 件，目前可售 {inventory.available(event.product_id)} 件'
+                )
+
+            base, extra = divmod(remaining, bucket_count)
+            FlashSaleStockBucket.objects.bulk_create([
+                FlashSaleStockBucket(
+                    flash_sale_event=event,
+                    bucket_index=index,
+                    quota=base + (1 if index < extra else 0),
+                )
+                for index in range(bucket_count)
+            ])
+
+            event.bucket_count = bucket_count
+            event.save(update_fields=['bucket_count'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ 活動 {event.id} 剩餘 {remaining} 件已分成 {bucket_count} 桶'
+        ))
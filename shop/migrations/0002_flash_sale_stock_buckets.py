@@ -0,0 +1,41 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashsaleevent',
+            name='bucket_count',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='庫存分桶數'),
+        ),
+        migrations.CreateModel(
+            name='FlashSaleStockBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_index', models.PositiveSmallIntegerField(verbose_name='桶編號')),
+                ('quota', models.IntegerField(verbose_name='配額')),
+                ('reserved_quantity', models.IntegerField(default=0, verbose_name='已預留數量')),
+                ('sold_quantity', models.IntegerField(default=0, verbose_name='已售出數量')),
+                ('flash_sale_event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_buckets', to='shop.flashsaleevent', verbose_name='搶購活動')),
+            ],
+            options={
+                'verbose_name': '庫存分桶',
+                'verbose_name_plural': '庫存分桶',
+                'db_table': 'flash_sale_stock_buckets',
+                'unique_together': {('flash_sale_event', 'bucket_index')},
+            },
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='stock_bucket',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='shop.flashsalestockbucket', verbose_name='庫存分桶'),
+        ),
+    ]
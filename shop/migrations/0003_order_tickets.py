@@ -0,0 +1,37 @@
+# Generated by Django 4.2.7 on 2026-10-16 23:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0002_flash_sale_stock_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderTicket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ticket_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True, verbose_name='排隊編號')),
+                ('user_email', models.EmailField(max_length=254, verbose_name='用戶Email')),
+                ('event_id', models.BigIntegerField(verbose_name='搶購活動ID')),
+                ('payment_method', models.CharField(max_length=20, verbose_name='付款方式')),
+                ('holds_stock_token', models.BooleanField(default=False, verbose_name='已取得庫存令牌')),
+                ('status', models.CharField(choices=[('queued', '排隊中'), ('succeeded', '下單成功'), ('rejected', '下單失敗'), ('failed', '系統錯誤')], default='queued', max_length=20, verbose_name='處理狀態')),
+                ('message', models.CharField(blank=True, max_length=200, verbose_name='處理結果')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('processed_at', models.DateTimeField(blank=True, null=True, verbose_name='處理時間')),
+                ('order', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.salesorder', verbose_name='訂單')),
+            ],
+            options={
+                'verbose_name': '下單排隊單',
+                'verbose_name_plural': '下單排隊單',
+                'db_table': 'order_tickets',
+                'indexes': [models.Index(fields=['status', 'id'], name='order_ticke_status_9c3d68_idx')],
+            },
+        ),
+    ]
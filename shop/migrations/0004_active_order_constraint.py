@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0003_order_tickets'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='salesorder',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'paid'])), fields=('flash_sale_event', 'user_email'), name='uniq_active_order_per_user_event'),
+        ),
+    ]
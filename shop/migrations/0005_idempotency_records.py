@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0004_active_order_constraint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True, verbose_name='Idempotency Key')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='請求摘要')),
+                ('status_code', models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='回應狀態碼')),
+                ('response_body', models.JSONField(blank=True, null=True, verbose_name='回應內容')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='失效時間')),
+            ],
+            options={
+                'verbose_name': 'Idempotency 紀錄',
+                'verbose_name_plural': 'Idempotency 紀錄',
+                'db_table': 'idempotency_records',
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0005_idempotency_records'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flashsaleevent',
+            name='paid_sequence',
+            field=models.PositiveIntegerField(default=0, verbose_name='已發出貨順位'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0006_event_paid_sequence'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['payment_deadline'], name='sales_order_pending_deadline'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0007_pending_deadline_index'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='salesorder',
+            name='sales_order_user_em_34be69_idx',
+        ),
+        migrations.AddIndex(
+            model_name='salesorder',
+            index=models.Index(fields=['user_email', '-created_at', '-id'], name='sales_order_user_created'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0008_user_orders_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('reserve', '預留'), ('sell', '售出'), ('release', '釋放'), ('adjust', '調整')], max_length=10, verbose_name='異動類型')),
+                ('reserved_delta', models.IntegerField(default=0, verbose_name='預留增減')),
+                ('on_hand_delta', models.IntegerField(default=0, verbose_name='實際庫存增減')),
+                ('compacted', models.BooleanField(default=False, verbose_name='已彙總')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='inventory_movements', to='shop.product', verbose_name='商品')),
+            ],
+            options={
+                'verbose_name': '庫存異動',
+                'verbose_name_plural': '庫存異動',
+                'db_table': 'inventory_movements',
+                'indexes': [models.Index(condition=models.Q(('compacted', False)), fields=['product'], name='inventory_movement_pending')],
+            },
+        ),
+    ]
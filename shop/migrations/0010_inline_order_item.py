@@ -0,0 +1,29 @@
+# Generated by Django 4.2.7 on 2026-10-17 00:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('shop', '0009_inventory_movements'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='salesorder',
+            name='product',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='shop.product', verbose_name='商品'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='quantity',
+            field=models.PositiveIntegerField(blank=True, null=True, verbose_name='數量'),
+        ),
+        migrations.AddField(
+            model_name='salesorder',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True, verbose_name='單價'),
+        ),
+    ]
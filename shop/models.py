@@ -1,6 +1,8 @@
 from django.db import models, transaction
+from django.db.models import Sum
 from django.utils import timezone
 from datetime import timedelta
+import uuid
 
 
 class Product(models.Model):
@@ -45,6 +47,50 @@ class Inventory(models.Model):
         return f"{self.product.sku} - 可售: {self.quantity_available}"
 
 
+class InventoryMovement(models.Model):
+    """
+    庫存異動紀錄（INVENTORY_LEDGER 開啟時使用）
+
+    預留、售出、釋放都新增一筆異動而不更新 Inventory，
+    compact_inventory_movements 定期把未彙總的異動加總進 Inventory 後標記為已彙總。
+    已彙總的異動保留作為對帳紀錄。
+    """
+    KIND_CHOICES = [
+        ('reserve', '預留'),
+        ('sell', '售出'),
+        ('release', '釋放'),
+        ('adjust', '調整'),
+    ]
+
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='inventory_movements',
+        verbose_name='商品'
+    )
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES, verbose_name='異動類型')
+    reserved_delta = models.IntegerField(default=0, verbose_name='預留增減')
+    on_hand_delta = models.IntegerField(default=0, verbose_name='實際庫存增減')
+    compacted = models.BooleanField(default=False, verbose_name='已彙總')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+
+    class Meta:
+        db_table = 'inventory_movements'
+        indexes = [
+            # 讀取與彙總只找尚未彙總的異動
+            models.Index(
+                fields=['product'],
+                condition=models.Q(compacted=False),
+                name='inventory_movement_pending',
+            ),
+        ]
+        verbose_name = '庫存異動'
+        verbose_name_plural = '庫存異動'
+
+    def __str__(self):
+        return f"{self.product_id} {self.get_kind_display()} 預留 {self.reserved_delta:+d} 實際 {self.on_hand_delta:+d}"
+
+
 class FlashSaleEvent(models.Model):
     """搶購活動表"""
     STATUS_CHOICES = [
@@ -70,6 +116,9 @@ class FlashSaleEvent(models.Model):
         default='pending',
         verbose_name='活動狀態'
     )
+    bucket_count = models.PositiveSmallIntegerField(default=0, verbose_name='庫存分桶數')
+    # 最後一個發出的出貨順位，付款成功時在同一個交易中遞增
+    paid_sequence = models.PositiveIntegerField(default=0, verbose_name='已發出貨順位')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
 
     class Meta:
@@ -85,9 +134,53 @@ class FlashSaleEvent(models.Model):
         now = timezone.now()
         return self.status == 'active' and self.start_time <= now <= self.end_time
 
+    def stock_counts(self):
+        """回傳 (已預留, 已售出)；分桶模式下加上各桶的數量"""
+        if not self.bucket_count:
+            return self.reserved_quantity, self.sold_quantity
+        totals = self.stock_buckets.aggregate(
+            reserved=Sum('reserved_quantity'),
+            sold=Sum('sold_quantity'),
+        )
+        return (
+            self.reserved_quantity + (totals['reserved'] or 0),
+            self.sold_quantity + (totals['sold'] or 0),
+        )
+
     def has_stock(self):
         """檢查是否還有庫存"""
-        return (self.reserved_quantity + self.sold_quantity) < self.total_quantity
+        reserved, sold = self.stock_counts()
+        return (reserved + sold) < self.total_quantity
+
+
+class FlashSaleStockBucket(models.Model):
+    """
+    搶購活動庫存分桶
+
+    分桶模式下，活動的剩餘配額拆到多個桶，下單時隨機挑一個還有庫存的桶
+    （SKIP LOCKED），讓併發請求分散到不同資料列，而不是全部排隊等同一列的鎖。
+    活動本身的 reserved_quantity / sold_quantity 保留分桶前的數量，
+    實際數量為活動數量加上各桶數量。
+    """
+    flash_sale_event = models.ForeignKey(
+        FlashSaleEvent,
+        on_delete=models.CASCADE,
+        related_name='stock_buckets',
+        verbose_name='搶購活動'
+    )
+    bucket_index = models.PositiveSmallIntegerField(verbose_name='桶編號')
+    quota = models.IntegerField(verbose_name='配額')
+    reserved_quantity = models.IntegerField(default=0, verbose_name='已預留數量')
+    sold_quantity = models.IntegerField(default=0, verbose_name='已售出數量')
+
+    class Meta:
+        db_table = 'flash_sale_stock_buckets'
+        unique_together = [('flash_sale_event', 'bucket_index')]
+        verbose_name = '庫存分桶'
+        verbose_name_plural = '庫存分桶'
+
+    def __str__(self):
+        return f"活動 {self.flash_sale_event_id} 桶 {self.bucket_index}"
 
 
 class SalesOrder(models.Model):
@@ -116,6 +209,14 @@ class SalesOrder(models.Model):
         related_name='orders',
         verbose_name='搶購活動'
     )
+    stock_bucket = models.ForeignKey(
+        FlashSaleStockBucket,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='orders',
+        verbose_name='庫存分桶'
+    )
     payment_method = models.CharField(
         max_length=20,
         choices=PAYMENT_METHOD_CHOICES,
@@ -132,6 +233,19 @@ class SalesOrder(models.Model):
         verbose_name='訂單狀態'
     )
     total_amount = models.DecimalField(max_digits=10, decimal_places=2, verbose_name='總金額')
+    # 單品訂單直接記錄商品、數量與單價，不一定有 SalesOrderItem（見 line_items）；
+    # 不建立索引，下單時少更新一個索引
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        db_index=False,
+        related_name='+',
+        verbose_name='商品'
+    )
+    quantity = models.PositiveIntegerField(null=True, blank=True, verbose_name='數量')
+    unit_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, verbose_name='單價')
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新時間')
 
@@ -140,9 +254,27 @@ class SalesOrder(models.Model):
         ordering = ['-created_at']
         indexes = [
             models.Index(fields=['order_number']),
-            models.Index(fields=['user_email']),
+            # 用戶訂單列表依 (created_at, id) 由新到舊分頁
+            models.Index(
+                fields=['user_email', '-created_at', '-id'],
+                name='sales_order_user_created',
+            ),
             models.Index(fields=['paid_at']),
             models.Index(fields=['flash_sale_event', 'status', 'paid_at']),
+            # 逾期釋放只找待付款訂單，部分索引只包含 pending 的訂單
+            models.Index(
+                fields=['payment_deadline'],
+                condition=models.Q(status='pending'),
+                name='sales_order_pending_deadline',
+            ),
+        ]
+        constraints = [
+            # 每位用戶在同一活動只能有一筆進行中的訂單
+            models.UniqueConstraint(
+                fields=['flash_sale_event', 'user_email'],
+                condition=models.Q(status__in=['pending', 'paid']),
+                name='uniq_active_order_per_user_event',
+            ),
         ]
         verbose_name = '訂單'
         verbose_name_plural = '訂單'
@@ -156,6 +288,21 @@ class SalesOrder(models.Model):
             return timezone.now() > self.payment_deadline
         return False
 
+    def line_items(self):
+        """
+        訂單明細：單品訂單以訂單上的商品、數量與單價組成（不查詢明細表，明細列可能尚未建立），
+        其他訂單讀取 SalesOrderItem
+        """
+        if self.product_id is not None:
+            return [SalesOrderItem(
+                sales_order=self,
+                product=self.product,
+                quantity=self.quantity,
+                unit_price=self.unit_price,
+                subtotal=self.unit_price * self.quantity,
+            )]
+        return list(self.items.select_related('product'))
+
 
 class SalesOrderItem(models.Model):
     """訂單明細"""
@@ -178,3 +325,75 @@ class SalesOrderItem(models.Model):
     def __str__(self):
         return f"{self.sales_order.order_number} - {self.product.sku} x {self.quantity}"
 
+
+
+class OrderTicket(models.Model):
+    """
+    非同步下單排隊單
+
+    非同步收單模式下，下單 API 只寫入一筆排隊單就回應 202，
+    由 process_order_tickets 指令依先後順序處理。
+    """
+    STATUS_CHOICES = [
+        ('queued', '排隊中'),
+        ('succeeded', '下單成功'),
+        ('rejected', '下單失敗'),
+        ('failed', '系統錯誤'),
+    ]
+
+    ticket_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False, verbose_name='排隊編號')
+    user_email = models.EmailField(verbose_name='用戶Email')
+    event_id = models.BigIntegerField(verbose_name='搶購活動ID')
+    payment_method = models.CharField(max_length=20, verbose_name='付款方式')
+    holds_stock_token = models.BooleanField(default=False, verbose_name='已取得庫存令牌')
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='queued',
+        verbose_name='處理狀態'
+    )
+    order = models.ForeignKey(
+        SalesOrder,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+',
+        verbose_name='訂單'
+    )
+    message = models.CharField(max_length=200, blank=True, verbose_name='處理結果')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    processed_at = models.DateTimeField(null=True, blank=True, verbose_name='處理時間')
+
+    class Meta:
+        db_table = 'order_tickets'
+        indexes = [
+            models.Index(fields=['status', 'id']),
+        ]
+        verbose_name = '下單排隊單'
+        verbose_name_plural = '下單排隊單'
+
+    def __str__(self):
+        return f"{self.ticket_id} - {self.get_status_display()}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    Idempotency-Key 對應的第一次回應
+
+    status_code 為空表示第一個請求仍在處理中；
+    expires_at 之後紀錄失效，可以被同一個 key 的新請求取代。
+    """
+    key = models.CharField(max_length=255, unique=True, verbose_name='Idempotency Key')
+    fingerprint = models.CharField(max_length=64, verbose_name='請求摘要')
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name='回應狀態碼')
+    response_body = models.JSONField(null=True, blank=True, verbose_name='回應內容')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='建立時間')
+    expires_at = models.DateTimeField(db_index=True, verbose_name='失效時間')
+
+    class Meta:
+        db_table = 'idempotency_records'
+        verbose_name = 'Idempotency 紀錄'
+        verbose_name_plural = 'Idempotency 紀錄'
+
+    def __str__(self):
+        return self.key
@@ -0,0 +1,115 @@
+"""
+訂單編號產生器
+
+預設使用 snowflake 形式的時間序編號：FS + 日期(UTC) + 13 碼 Crockford Base32，
+後 13 碼為 64 位元整數 = 毫秒時間戳(41) + worker ID(10) + 序號(12)。
+同一個 worker 內嚴格遞增，不同 worker 只要 ID 不同就不會重複；
+依時間排序寫入，唯一索引只會在最右邊的頁面新增資料，不會隨機分裂 B-tree 頁面。
+
+worker ID 由 ORDER_NUMBER_WORKER_ID 設定（或環境變數 FLASH_SALE_WORKER_ID），
+多個 worker 部署時每個程序都要明確指定不同的 ID。
+未設定時隨機選一個 ID（PID 在不同機器或容器間經常相同，不適合當作 ID），
+不同程序仍可能選到相同的 ID；此時兩邊在同一毫秒產生的編號可能重複，
+由下單流程在訂單編號的唯一索引衝突時換一個編號重試。
+"""
+from datetime import datetime, timezone as dt_timezone
+import os
+import random
+import threading
+import time
+import uuid
+
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+
+
+# 2024-01-01T00:00:00Z，41 位元毫秒可用到 2093 年
+EPOCH_MS = 1704067200000
+WORKER_ID_BITS = 10
+SEQUENCE_BITS = 12
+MAX_WORKER_ID = (1 << WORKER_ID_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+# Crockford Base32，字元依 ASCII 遞增排列，編碼後的字串順序與數值順序相同
+_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+
+
+def _base32(value, width=13):
+    chars = []
+    for _ in range(width):
+        chars.append(_ALPHABET[value & 31])
+        value >>= 5
+    return ''.join(reversed(chars))
+
+
+class RandomOrderNumberGenerator:
+    """原本的編號格式：FS + 日期 + 8 碼隨機十六進位"""
+
+    def next(self):
+        return f"FS{timezone.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
+
+
+class SnowflakeOrderNumberGenerator:
+    """時間序、不重複的訂單編號"""
+
+    def __init__(self, worker_id=None):
+        if worker_id is None:
+            worker_id = get_setting('ORDER_NUMBER_WORKER_ID')
+        if worker_id is None:
+            worker_id = os.environ.get('FLASH_SALE_WORKER_ID')
+        if worker_id is None:
+            worker_id = random.SystemRandom().randint(0, MAX_WORKER_ID)
+        worker_id = int(worker_id)
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            # 超出範圍時截斷會與其他 ID 重複
+            raise ImproperlyConfigured(f'訂單編號 worker ID 必須介於 0~{MAX_WORKER_ID}: {worker_id}')
+        self.worker_id = worker_id
+        self._lock = threading.Lock()
+        self._last_ms = -1
+        self._sequence = 0
+
+    def next(self):
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms < self._last_ms:
+                # 系統時間倒退時沿用上一個時間戳，維持遞增
+                now_ms = self._last_ms
+            if now_ms == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # 同一毫秒的序號用完，等到下一毫秒
+                    while now_ms <= self._last_ms:
+                        now_ms = int(time.time() * 1000)
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            sequence = self._sequence
+
+        value = (
+            ((now_ms - EPOCH_MS) << (WORKER_ID_BITS + SEQUENCE_BITS))
+            | (self.worker_id << SEQUENCE_BITS)
+            | sequence
+        )
+        date = datetime.fromtimestamp(now_ms / 1000, tz=dt_timezone.utc).strftime('%Y%m%d')
+        return f'FS{date}{_base32(value)}'
+
+
+_generator = None
+_generator_lock = threading.Lock()
+
+
+def get_order_number_generator():
+    """取得設定中的訂單編號產生器（每個程序一個實例）"""
+    global _generator
+    if _generator is None:
+        with _generator_lock:
+            if _generator is None:
+                _generator = import_string(get_setting('ORDER_NUMBER_GENERATOR'))()
+    return _generator
+
+
+def next_order_number():
+    return get_order_number_generator().next()
@@ -0,0 +1,140 @@
+"""
+訂單狀態的 read-through 快取
+
+下單後用戶會不斷重新整理 /api/order/<order_number>/status/，
+但訂單狀態只在付款回調、逾期釋放與後台修改時改變。
+這裡以訂單編號為 key，把狀態回應（不含訊息）保存在 Django 快取
+（ORDER_STATUS_CACHE_ALIAS）ORDER_STATUS_CACHE_TTL 秒：
+
+- 訂單狀態改變的交易提交後清除快取（signals 處理 save()，批次付款與批次釋放在 services 中清除）
+- 清除時留下短暫的墓碑，清除前讀到舊資料的請求不會把舊資料寫回快取
+- 「剩餘幾分鐘」的訊息在讀取時依付款期限計算，不會因為快取而過時
+
+多個 worker 需要共用同一個快取後端（例如 Redis、Memcached），清除才會對所有 worker 生效；
+ORDER_STATUS_CACHE_ALIAS 是程序內的快取（LocMemCache、DummyCache）時不啟用快取，
+避免其他 worker 付款後仍回應快取中的待付款狀態。
+"""
+import threading
+
+from django.core.cache import caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.utils import timezone
+
+from .conf import get_setting
+
+
+# 清除後這段時間內不接受寫回（秒）
+TOMBSTONE_SECONDS = 2
+_TOMBSTONE = 'invalidated'
+
+# 只存在單一程序內的快取後端，其他程序的清除無法生效
+PROCESS_LOCAL_BACKENDS = (LocMemCache, DummyCache)
+
+
+def order_status_payload(order):
+    """訂單狀態回應中可以快取的部分（order 以 select_related('product') 讀取可省下明細的查詢）"""
+    return {
+        'order_number': order.order_number,
+        'user_email': order.user_email,
+        'status': order.status,
+        'status_display': order.get_status_display(),
+        'created_at': order.created_at,
+        'payment_deadline': order.payment_deadline,
+        'paid_at': order.paid_at,
+        'shipping_priority': order.shipping_priority,
+        'total_amount': str(order.total_amount),
+        'payment_method': order.get_payment_method_display() if order.payment_method else None,
+        'items': [{
+            'product_sku': item.product.sku,
+            'product_name': item.product.name,
+            'quantity': item.quantity,
+            'unit_price': str(item.unit_price),
+            'subtotal': str(item.subtotal),
+        } for item in order.line_items()],
+    }
+
+
+def order_status_message(payload):
+    """依目前時間產生訂單狀態訊息"""
+    if payload['status'] == 'paid' and payload['shipping_priority']:
+        return f"🎉 搶購成功！您的出貨順位是第 {payload['shipping_priority']} 位"
+    if payload['status'] == 'pending':
+        if payload['payment_deadline'] and timezone.now() > payload['payment_deadline']:
+            return '⏰ 訂單已逾期'
+        if payload['payment_deadline']:
+            remaining_time = payload['payment_deadline'] - timezone.now()
+            minutes_left = int(remaining_time.total_seconds() / 60)
+            return f'⏳ 請在 {minutes_left} 分鐘內完成付款'
+    if payload['status'] == 'expired':
+        return '⏰ 訂單已逾期'
+    if payload['status'] == 'cancelled':
+        return '❌ 訂單已取消'
+    return None
+
+
+class OrderStatusCache:
+    """以訂單編號為 key 的訂單狀態快取，並記錄本程序的命中次數"""
+
+    def __init__(self):
+        self.cache = caches[get_setting('ORDER_STATUS_CACHE_ALIAS')]
+        self.ttl = get_setting('ORDER_STATUS_CACHE_TTL')
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _key(self, order_number):
+        return f'order_status:{order_number}'
+
+    def get(self, order_number):
+        """取得快取的回應資料，沒有時回傳 None"""
+        payload = self.cache.get(self._key(order_number))
+        hit = isinstance(payload, dict)
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return payload if hit else None
+
+    def add(self, payload, ttl=None):
+        """寫入從資料庫讀到的回應資料；已有內容或剛被清除時不覆寫"""
+        self.cache.add(self._key(payload['order_number']), payload, min(ttl or self.ttl, self.ttl))
+
+    def invalidate(self, order_numbers):
+        """訂單狀態改變後清除（在交易提交後呼叫）"""
+        self.cache.set_many(
+            {self._key(order_number): _TOMBSTONE for order_number in order_numbers},
+            TOMBSTONE_SECONDS,
+        )
+
+    def stats(self):
+        """本程序的命中統計"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        return {
+            'hits': hits,
+            'misses': misses,
+            'hit_rate': hits / total if total else 0.0,
+        }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_order_status_cache():
+    """
+    取得程序內共用的訂單狀態快取
+    ORDER_STATUS_CACHE_TTL 為 0 或 ORDER_STATUS_CACHE_ALIAS 不是共用的快取後端時回傳 None
+    """
+    global _cache
+    if not get_setting('ORDER_STATUS_CACHE_TTL'):
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                shared = not isinstance(caches[get_setting('ORDER_STATUS_CACHE_ALIAS')], PROCESS_LOCAL_BACKENDS)
+                _cache = OrderStatusCache() if shared else False
+    return _cache or None
@@ -0,0 +1,201 @@
+"""
+請求頻率限制
+
+以權杖桶（token bucket）限制同一個 email 或 IP 的請求頻率，規則依 URL 名稱設定
+（shop/urls.py 的 name），例如：
+
+    'RATE_LIMITS': {
+        'create_flash_sale_order': {'email': (1, 3), 'ip': (50, 100)},
+    }
+
+(1, 3) 表示每秒補充 1 個權杖、最多累積 3 個。超過時由 RateLimitMiddleware
+在進入 view 之前回應 429 與 Retry-After，不會碰資料庫。
+同一個請求的 email 與 IP 規則全部通過才會扣權杖，被任一規則拒絕時不扣其他規則的權杖。
+
+部署在負載平衡器或反向代理後面時，REMOTE_ADDR 是代理的位址，
+RATE_LIMIT_TRUSTED_PROXIES 設為代理的層數，改以 X-Forwarded-For 從右邊數過這些代理後的位址
+作為用戶端 IP（最左邊的值由用戶端自行填寫，不可信）。
+
+- LocalRateLimiter：程序內的權杖桶，每個 worker 各自計算
+- RedisRateLimiter：透過 Redis 協定共享，以固定視窗計數近似權杖桶
+  （視窗長度 = burst / rate 秒，視窗內最多 burst 次）
+"""
+from collections import OrderedDict
+import json
+import math
+import threading
+import time
+
+from django.http import JsonResponse
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+from .resp import RespError, get_client
+
+
+class LocalRateLimiter:
+    """
+    程序內的權杖桶
+    記錄數達到 RATE_LIMIT_MAX_KEYS 時從最久沒使用的桶開始移除：已經補滿的桶移除後與重新建立相同，
+    仍然太多時移除最久沒使用的一個。持續被拒絕的用戶每次請求都會更新使用順序，
+    大量不同的 key 不會把它的桶清掉
+    """
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or get_setting('RATE_LIMIT_MAX_KEYS')
+        # key -> [剩餘權杖, 上次補充時間, 補滿的時間]，依最後使用時間排序
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, key, rate, burst):
+        """取用一個權杖，成功回傳 0，否則回傳需要等待的秒數"""
+        return self.hit_many([(key, rate, burst)])
+
+    def hit_many(self, limits):
+        """
+        limits 為 [(key, 每秒補充, 最多累積), ...]，全部都有權杖時各扣一個並回傳 0，
+        否則不扣任何權杖，回傳需要等待的秒數
+        """
+        now = time.monotonic()
+        with self._lock:
+            buckets = []
+            for key, rate, burst in limits:
+                bucket = self._buckets.get(key)
+                if bucket is None:
+                    if len(self._buckets) >= self.max_keys:
+                        self._evict(now)
+                    bucket = self._buckets[key] = [burst, now, now]
+                else:
+                    bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+                    bucket[1] = now
+                    self._buckets.move_to_end(key)
+                buckets.append((bucket, rate, burst))
+            waits = [(1 - bucket[0]) / rate for bucket, rate, _ in buckets if bucket[0] < 1]
+            if not waits:
+                for bucket, _, _ in buckets:
+                    bucket[0] -= 1
+            for bucket, rate, burst in buckets:
+                bucket[2] = now + (burst - bucket[0]) / rate
+            return max(waits) if waits else 0
+
+    def _evict(self, now):
+        """從最久沒使用的桶開始移除已補滿的桶，仍然太多時移除最久沒使用的一個"""
+        while self._buckets and next(iter(self._buckets.values()))[2] <= now:
+            self._buckets.popitem(last=False)
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.popitem(last=False)
+
+
+class RedisRateLimiter:
+    """所有 worker 共用的頻率限制（固定視窗計數）"""
+
+    def __init__(self, url=None):
+        self.client = get_client(url)
+
+    def hit(self, key, rate, burst):
+        return self.hit_many([(key, rate, burst)])
+
+    def hit_many(self, limits):
+        """
+        先讀取所有視窗的計數，任一已達上限時不計數並回傳需要等待的秒數；
+        全部未達上限才各加一（讀取與加一之間的併發請求可能讓計數略超過上限）
+        """
+        now_ms = int(time.time() * 1000)
+        windows = []
+        for key, rate, burst in limits:
+            window_ms = max(int(burst / rate * 1000), 1)
+            window = now_ms // window_ms
+            windows.append((self.client.key('rate_limit', key, window), window_ms, window, burst))
+        try:
+            wait = 0
+            for window_key, window_ms, window, burst in windows:
+                if int(self.client.execute('GET', window_key) or 0) >= burst:
+                    wait = max(wait, ((window + 1) * window_ms - now_ms) / 1000)
+            if wait:
+                return wait
+            for window_key, window_ms, _, _ in windows:
+                if self.client.execute('INCR', window_key) == 1:
+                    self.client.execute('PEXPIRE', window_key, window_ms * 2)
+        except (OSError, RespError):
+            # 限流服務不可用時放行，不影響正常下單
+            return 0
+        return 0
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """取得設定中的頻率限制後端，未開啟時回傳 None"""
+    global _limiter
+    if _limiter is None:
+        backend = get_setting('RATE_LIMIT_BACKEND')
+        if not backend:
+            return None
+        with _limiter_lock:
+            if _limiter is None:
+                _limiter = import_string(backend)()
+    return _limiter
+
+
+def _client_ip(request, trusted_proxies):
+    """
+    用戶端 IP：沒有信任的代理時為 REMOTE_ADDR；
+    否則為 X-Forwarded-For 從右邊數第 trusted_proxies 個（最後一層代理記錄的連線來源）
+    """
+    if trusted_proxies:
+        hops = [hop.strip() for hop in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if hop.strip()]
+        # 少於代理層數表示請求沒有經過所有代理，不使用這個標頭
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return request.META.get('REMOTE_ADDR')
+
+
+def _user_email(request):
+    email = request.GET.get('email')
+    if email or request.method != 'POST':
+        return email
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return None
+        return data.get('user_email') if isinstance(data, dict) else None
+    return request.POST.get('user_email')
+
+
+class RateLimitMiddleware:
+    """依 URL 名稱套用 RATE_LIMITS 規則，超過時回應 429"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.rules = get_setting('RATE_LIMITS')
+        self.trusted_proxies = get_setting('RATE_LIMIT_TRUSTED_PROXIES')
+        self.limiter = get_rate_limiter()
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        match = request.resolver_match
+        rule = self.rules.get(match.url_name) if match is not None else None
+        if not rule or self.limiter is None:
+            return None
+
+        limits = []
+        for kind, (rate, burst) in rule.items():
+            value = _client_ip(request, self.trusted_proxies) if kind == 'ip' else _user_email(request)
+            if value:
+                limits.append((f'{match.url_name}:{kind}:{value}', rate, burst))
+        wait = self.limiter.hit_many(limits) if limits else 0
+        if wait <= 0:
+            return None
+
+        response = JsonResponse(
+            {'error': '請求過於頻繁，請稍後再試'},
+            status=429,
+            json_dumps_params={'ensure_ascii': False},
+        )
+        response['Retry-After'] = str(math.ceil(wait))
+        return response
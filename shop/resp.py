@@ -0,0 +1,115 @@
+"""
+精簡的 Redis 協定（RESP）用戶端
+
+只實作搶購需要的指令，任何相容 Redis 協定的服務（Redis、KeyDB、
+或 run_resp_server 指令啟動的本機替代服務）都可以使用。
+每個執行緒各自持有一條連線，連線中斷時自動重連一次。
+"""
+import socket
+import threading
+from urllib.parse import urlparse
+
+from .conf import get_setting
+
+
+class RespError(Exception):
+    """Redis 服務回傳的錯誤"""
+
+
+class RespClient:
+    """Redis 協定用戶端"""
+
+    def __init__(self, url=None, timeout=None):
+        parsed = urlparse(url or get_setting('REDIS_URL'))
+        self.host = parsed.hostname or 'localhost'
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip('/') or 0)
+        self.timeout = timeout if timeout is not None else get_setting('REDIS_SOCKET_TIMEOUT')
+        self._local = threading.local()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.reader = sock.makefile('rb')
+        if self.password:
+            self._call('AUTH', self.password)
+        if self.db:
+            self._call('SELECT', self.db)
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            try:
+                self._local.reader.close()
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    def execute(self, *args):
+        """執行一個指令並回傳結果，連線失效時重連一次"""
+        for attempt in (1, 2):
+            if getattr(self._local, 'sock', None) is None:
+                self._connect()
+            try:
+                return self._call(*args)
+            except (ConnectionError, socket.timeout, OSError):
+                self._close()
+                if attempt == 2:
+                    raise
+
+    def _call(self, *args):
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    @staticmethod
+    def _encode(args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b'$%d\r\n%s\r\n' % (len(arg), arg))
+        return b''.join(parts)
+
+    def _read(self):
+        line = self._local.reader.readline()
+        if not line:
+            raise ConnectionError('Redis 連線已中斷')
+        prefix, payload = line[:1], line[1:-2]
+        if prefix == b'+':
+            return payload.decode()
+        if prefix == b'-':
+            raise RespError(payload.decode())
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length == -1:
+                return None
+            data = self._local.reader.read(length + 2)
+            return data[:-2].decode()
+        if prefix == b'*':
+            length = int(payload)
+            if length == -1:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RespError(f'無法解析的回應: {line!r}')
+
+    def key(self, *parts):
+        """組合帶有前綴的 key"""
+        return ':'.join([get_setting('REDIS_KEY_PREFIX'), *map(str, parts)])
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(url=None):
+    """取得共用的用戶端（同一位址共用一個實例）"""
+    url = url or get_setting('REDIS_URL')
+    with _clients_lock:
+        if url not in _clients:
+            _clients[url] = RespClient(url)
+        return _clients[url]
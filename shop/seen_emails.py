@@ -0,0 +1,90 @@
+"""
+重複下單預先過濾
+
+程序內記住每個活動已經有進行中訂單的 email，重複點擊的請求在碰資料庫前就回應。
+真正的規則由資料庫的 uniq_active_order_per_user_event 索引保證，這裡只是前置過濾：
+
+- 下單成功、被資料庫擋下的重複下單記住 SEEN_EMAILS_TTL 秒
+- 付款成功後記住到活動結束（已付款的訂單不會再被釋放）
+- 本程序內付款失敗或逾期釋放時移除
+
+其他程序釋放的訂單不會通知這裡，待付款的訂單只記住 SEEN_EMAILS_TTL 秒，
+用戶在其他程序付款失敗後，最晚 SEEN_EMAILS_TTL 秒就能在原本的 worker 重新下單。
+
+記錄數達到 SEEN_EMAILS_MAX_KEYS 時先移除已過期的記錄，仍然太多時全部清除（只是前置過濾，清除不影響正確性）。
+"""
+import threading
+import time
+
+from .conf import get_setting
+
+
+class SeenEmailFilter:
+    """以雜湊表記錄 (活動, email) 與有效期限"""
+
+    def __init__(self, max_keys=None):
+        self.max_keys = max_keys or get_setting('SEEN_EMAILS_MAX_KEYS')
+        # event_id -> {email: 有效期限}
+        self._seen = {}
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def contains(self, event_id, user_email):
+        until = self._seen.get(event_id, {}).get(user_email)
+        return until is not None and until > time.time()
+
+    def add(self, event_id, user_email, until=None):
+        """記住 email，until 為 datetime，未指定時保留 SEEN_EMAILS_TTL 秒"""
+        expires_at = until.timestamp() if until is not None else time.time() + get_setting('SEEN_EMAILS_TTL')
+        with self._lock:
+            if self._size >= self.max_keys:
+                self._prune(time.time())
+            emails = self._seen.setdefault(event_id, {})
+            if user_email not in emails:
+                self._size += 1
+            emails[user_email] = expires_at
+
+    def discard(self, event_id, user_email):
+        with self._lock:
+            if self._seen.get(event_id, {}).pop(user_email, None) is not None:
+                self._size -= 1
+
+    def _prune(self, now):
+        """移除已過期的記錄；仍然太多時全部清除"""
+        for event_id in list(self._seen):
+            emails = {email: until for email, until in self._seen[event_id].items() if until > now}
+            if emails:
+                self._seen[event_id] = emails
+            else:
+                del self._seen[event_id]
+        self._size = sum(len(emails) for emails in self._seen.values())
+        if self._size >= self.max_keys:
+            self._seen.clear()
+            self._size = 0
+
+
+class NullSeenEmailFilter:
+    """關閉過濾時使用"""
+
+    def contains(self, event_id, user_email):
+        return False
+
+    def add(self, event_id, user_email, until=None):
+        pass
+
+    def discard(self, event_id, user_email):
+        pass
+
+
+_filter = None
+_filter_lock = threading.Lock()
+
+
+def get_seen_emails():
+    """取得程序內共用的重複下單過濾器"""
+    global _filter
+    if _filter is None:
+        with _filter_lock:
+            if _filter is None:
+                _filter = SeenEmailFilter() if get_setting('SEEN_EMAILS_FILTER') else NullSeenEmailFilter()
+    return _filter
@@ -0,0 +1,850 @@
+"""
+訂單與庫存的共用邏輯
+
+下單、付款回調與逾期釋放都透過這裡更新庫存，
+確保活動計數、分桶計數、Inventory 與庫存閘門保持一致。
+"""
+from contextlib import contextmanager
+from datetime import timedelta
+import random
+import time
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from . import inventory
+from .conf import get_setting
+from .event_meta import get_event_meta
+from .models import FlashSaleEvent, FlashSaleStockBucket, SalesOrder, SalesOrderItem, OrderTicket
+from .order_numbers import next_order_number
+from .order_status_cache import get_order_status_cache
+from .seen_emails import get_seen_emails
+from .sold_out import get_sold_out_cache
+from .status_stream import notify_stock_changed
+from .stock_gate import get_stock_gate
+
+
+class OrderRejected(Exception):
+    """下單不符合業務規則，message 會直接回應給用戶"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.message = message
+        self.code = code
+
+
+# 鎖定活動記錄時只讀取判斷需要的欄位，售價等中繼資料從 event_meta 取得
+_LOCKED_EVENT_FIELDS = (
+    'total_quantity', 'reserved_quantity', 'sold_quantity', 'bucket_count',
+    'status', 'start_time', 'end_time',
+)
+
+
+def create_order(user_email, event_id, payment_method):
+    """
+    預留庫存並建立訂單，回傳 SalesOrder
+    不符合規則時拋出 OrderRejected，活動不存在時拋出 FlashSaleEvent.DoesNotExist
+    """
+    meta = get_event_meta(event_id)
+
+    if meta.bucket_count:
+        return _retrying_order_number(_create_order_sharded, user_email, meta, payment_method)
+    return _retrying_order_number(_create_order_locked, user_email, meta, payment_method)
+
+
+def _retrying_order_number(create, *args):
+    """
+    訂單編號與其他程序重複（worker ID 相同）時，整個交易已回滾，
+    以新的編號重試，最多 ORDER_NUMBER_ATTEMPTS 次
+    """
+    attempts = get_setting('ORDER_NUMBER_ATTEMPTS')
+    for attempt in range(1, attempts + 1):
+        try:
+            return create(*args)
+        except IntegrityError as e:
+            if attempt == attempts or not _order_number_taken(e):
+                raise
+
+
+def _order_number_taken(error):
+    """唯一索引衝突是否來自 order_number（PostgreSQL 與 SQLite 的訊息都包含欄位或索引名稱）"""
+    return 'order_number' in str(error)
+
+
+def _lock_event(meta):
+    """鎖定活動記錄（防止併發）"""
+    return FlashSaleEvent.objects.select_for_update().only(
+        *_LOCKED_EVENT_FIELDS
+    ).get(id=meta.event_id)
+
+
+def _create_order_locked(user_email, meta, payment_method):
+    """
+    單列模式：鎖定活動記錄後預留，再建立訂單
+    訂單編號與時間在鎖定前準備好；ORDER_RESERVE_MODE 為 'split' 時預留與建立訂單分成兩個交易
+    """
+    order = _build_order(user_email, meta, payment_method)
+    item = _build_order_item(order, meta)
+
+    if get_setting('ORDER_RESERVE_MODE') == 'split':
+        return _create_order_split(order, item, meta)
+
+    with _rejecting_duplicates(user_email, meta), transaction.atomic():
+        _reserve_stock(meta)
+        return _save_order(order, item, meta)
+
+
+def _create_order_split(order, item, meta):
+    """
+    預留交易只包含活動記錄的鎖定、檢查與計數更新，提交後立即放開活動記錄的鎖；
+    訂單與明細在另一個交易中寫入，寫入失敗（例如重複下單）時以補償交易歸還預留
+
+    程序在兩個交易之間中斷時，這一件預留會沒有對應的訂單
+    """
+    with transaction.atomic():
+        _reserve_stock(meta)
+
+    try:
+        with _rejecting_duplicates(order.user_email, meta), transaction.atomic():
+            return _save_order(order, item, meta)
+    except BaseException:
+        _compensate_reservation(meta)
+        raise
+
+
+def _compensate_reservation(meta):
+    """歸還預留交易保留的一件（訂單沒有建立）"""
+    with transaction.atomic():
+        FlashSaleEvent.objects.filter(pk=meta.event_id).update(
+            reserved_quantity=F('reserved_quantity') - 1
+        )
+        inventory.release(meta.product_id)
+
+        # 預留期間其他請求可能判斷為售罄
+        transaction.on_commit(lambda: get_sold_out_cache().clear(meta.event_id))
+        _stock_changed(meta.event_id)
+
+
+def _reserve_stock(meta):
+    """鎖定活動記錄並預留一件（需在交易中呼叫），不符合規則時拋出 OrderRejected"""
+    locked_event = _lock_event(meta)
+
+    # 檢查活動是否有效
+    if not locked_event.is_active():
+        raise OrderRejected('活動尚未開始或已結束', code='inactive')
+
+    # 檢查是否還有庫存（防止超賣）
+    if not locked_event.has_stock():
+        raise _sold_out(meta)
+
+    # 預留庫存（帶條件的 UPDATE，可售數量不足時不更新）
+    if not _reserve_inventory(meta.product_id):
+        raise OrderRejected('庫存不足', code='insufficient_inventory')
+
+    # 更新活動預留數量（使用資料庫原子更新，避免併發競爭）
+    FlashSaleEvent.objects.filter(pk=meta.event_id).update(
+        reserved_quantity=F('reserved_quantity') + 1
+    )
+
+
+def _reserve_inventory(product_id, quantity=1):
+    """預留 Inventory，樂觀鎖重試後仍衝突時請用戶稍後再試"""
+    try:
+        return inventory.reserve(product_id, quantity)
+    except inventory.InventoryConflict:
+        raise OrderRejected('系統忙碌，請稍後再試', code='busy')
+
+
+def _create_order_sharded(user_email, meta, payment_method):
+    """
+    分桶模式：只鎖定一個還有庫存的桶
+    分桶配額在分桶時已從 Inventory 預留，這裡不需要再鎖 Inventory 與活動記錄
+    """
+    if not meta.is_active():
+        raise OrderRejected('活動尚未開始或已結束', code='inactive')
+
+    with _rejecting_duplicates(user_email, meta), transaction.atomic():
+        bucket = _lock_bucket_with_stock(meta)
+        if bucket is None:
+            raise _sold_out(meta)
+
+        FlashSaleStockBucket.objects.filter(pk=bucket.pk).update(
+            reserved_quantity=F('reserved_quantity') + 1
+        )
+
+        return _insert_order(user_email, meta, payment_method, stock_bucket=bucket)
+
+
+def _sold_out(meta):
+    """資料庫判斷售罄：設定售罄旗標，回傳要拋出的例外"""
+    get_sold_out_cache().mark(meta.event_id)
+    return OrderRejected('商品已售罄', code='sold_out')
+
+
+def _lock_bucket_with_stock(meta):
+    """隨機鎖定一個還有庫存的桶，全部售完時回傳 None"""
+    buckets = FlashSaleStockBucket.objects.filter(
+        flash_sale_event_id=meta.event_id,
+        reserved_quantity__lt=F('quota') - F('sold_quantity'),
+    ).order_by('?')
+
+    # 先跳過其他交易正在使用的桶
+    bucket = buckets.select_for_update(skip_locked=True).first()
+    if bucket is None:
+        # 有庫存的桶可能都正被鎖住，改為等待其中一個
+        bucket = buckets.select_for_update().first()
+    return bucket
+
+
+@contextmanager
+def _rejecting_duplicates(user_email, meta):
+    """
+    「一人一單」由 uniq_active_order_per_user_event 唯一索引保證，
+    寫入訂單違反索引時整個交易回滾，這裡轉成一般的重複下單回應
+    """
+    try:
+        yield
+    except IntegrityError:
+        # 只有在失敗時才查詢，確認是重複下單而不是其他唯一鍵衝突
+        if not SalesOrder.objects.filter(
+            user_email=user_email,
+            flash_sale_event_id=meta.event_id,
+            status__in=['pending', 'paid']
+        ).exists():
+            raise
+        raise _duplicate(user_email, meta)
+
+
+def _duplicate(user_email, meta):
+    """重複下單：記住這個 email，回傳要拋出的例外"""
+    get_seen_emails().add(meta.event_id, user_email)
+    return OrderRejected('您已經有一筆進行中的訂單', code='duplicate')
+
+
+def _remember_active_orders(orders):
+    """
+    交易提交後，在重複下單過濾器中記住這些訂單的 email SEEN_EMAILS_TTL 秒
+    待付款的訂單可能在其他程序付款失敗或逾期釋放，只記住擋下重複點擊所需的短時間
+    """
+    def remember():
+        seen_emails = get_seen_emails()
+        for order in orders:
+            seen_emails.add(order.flash_sale_event_id, order.user_email)
+    transaction.on_commit(remember)
+
+
+def _stock_changed(event_id):
+    """交易提交後提早喚醒該活動的即時推送"""
+    transaction.on_commit(lambda: notify_stock_changed(event_id))
+
+
+def _orders_changed(orders):
+    """
+    交易提交後清除這些訂單的狀態快取
+    （bulk_update 與 UPDATE 不會觸發 post_save，需要自行清除）
+    """
+    cache = get_order_status_cache()
+    order_numbers = [order.order_number for order in orders]
+    if cache is not None and order_numbers:
+        transaction.on_commit(lambda: cache.invalidate(order_numbers))
+
+
+def _build_order(user_email, meta, payment_method, stock_bucket=None):
+    """組出尚未寫入的訂單"""
+    order_number = next_order_number()
+    payment_deadline = timezone.now() + timedelta(hours=1)
+
+    order = SalesOrder(
+        order_number=order_number,
+        user_email=user_email,
+        flash_sale_event_id=meta.event_id,
+        stock_bucket=stock_bucket,
+        payment_method=payment_method,
+        payment_deadline=payment_deadline,
+        status='pending',
+        total_amount=meta.price
+    )
+    if get_setting('ORDER_INLINE_ITEMS'):
+        # 搶購固定一件：商品、數量與單價記錄在訂單上，不另外寫入訂單明細
+        order.product_id = meta.product_id
+        order.quantity = 1
+        order.unit_price = meta.price
+    return order
+
+
+def _build_order_item(order, meta):
+    """組出尚未寫入的訂單明細（搶購固定一件）；明細已記錄在訂單上時回傳 None"""
+    if order.product_id is not None:
+        return None
+    return SalesOrderItem(
+        sales_order=order,
+        product_id=meta.product_id,
+        quantity=1,
+        unit_price=meta.price,
+        subtotal=meta.price
+    )
+
+
+def _insert_order(user_email, meta, payment_method, stock_bucket=None):
+    """建立訂單與訂單明細"""
+    order = _build_order(user_email, meta, payment_method, stock_bucket)
+    return _save_order(order, _build_order_item(order, meta), meta)
+
+
+def _save_order(order, item, meta):
+    """寫入已組好的訂單與訂單明細"""
+    order.save(force_insert=True)
+
+    # 建立訂單明細
+    if item is not None:
+        item.save(force_insert=True)
+
+    _remember_active_orders([order])
+    _stock_changed(meta.event_id)
+    return order
+
+
+def create_orders_batch(event_id, requests):
+    """
+    在同一個交易中為多筆下單請求預留庫存（group commit）
+    requests 為 [(user_email, payment_method), ...]，
+    回傳同順序的結果：成功為 SalesOrder，被拒絕為 OrderRejected
+    """
+    meta = get_event_meta(event_id)
+
+    if meta.bucket_count:
+        # 分桶模式本身就分散了鎖，逐筆處理
+        results = []
+        for user_email, payment_method in requests:
+            try:
+                results.append(_retrying_order_number(_create_order_sharded, user_email, meta, payment_method))
+            except OrderRejected as e:
+                results.append(e)
+        return results
+
+    return _retrying_order_number(_create_orders_locked, meta, requests)
+
+
+def _create_orders_locked(meta, requests):
+    """單列模式的整批下單：鎖定活動記錄一次後整批預留並寫入"""
+    with transaction.atomic():
+        # 整批只鎖一次活動記錄
+        locked_event = _lock_event(meta)
+
+        if not locked_event.is_active():
+            return [OrderRejected('活動尚未開始或已結束', code='inactive') for _ in requests]
+
+        event_remaining = (
+            locked_event.total_quantity
+            - locked_event.reserved_quantity
+            - locked_event.sold_quantity
+        )
+
+        # 一次查出整批中已經有進行中訂單的用戶
+        active_emails = set(SalesOrder.objects.filter(
+            user_email__in={user_email for user_email, _ in requests},
+            flash_sale_event_id=meta.event_id,
+            status__in=['pending', 'paid']
+        ).values_list('user_email', flat=True))
+
+        # 依送出順序決定誰拿到庫存，檢查順序與逐筆下單相同
+        results = [None] * len(requests)
+        accepted = []
+        for index, (user_email, payment_method) in enumerate(requests):
+            if len(accepted) >= event_remaining:
+                results[index] = _sold_out(meta)
+            elif user_email in active_emails:
+                results[index] = _duplicate(user_email, meta)
+            else:
+                active_emails.add(user_email)
+                accepted.append(index)
+
+        if not accepted:
+            return results
+
+        # 整批只更新一次庫存，可售數量不足時只有前面的請求拿到庫存
+        try:
+            granted = inventory.reserve_up_to(meta.product_id, len(accepted))
+        except inventory.InventoryConflict:
+            granted = 0
+            rejection = OrderRejected('系統忙碌，請稍後再試', code='busy')
+        else:
+            rejection = OrderRejected('庫存不足', code='insufficient_inventory')
+        for index in accepted[granted:]:
+            results[index] = rejection
+        accepted = accepted[:granted]
+        if not accepted:
+            return results
+
+        FlashSaleEvent.objects.filter(pk=meta.event_id).update(
+            reserved_quantity=F('reserved_quantity') + len(accepted)
+        )
+
+        orders = SalesOrder.objects.bulk_create([
+            _build_order(requests[index][0], meta, requests[index][1])
+            for index in accepted
+        ])
+        items = [_build_order_item(order, meta) for order in orders]
+        SalesOrderItem.objects.bulk_create([item for item in items if item is not None])
+        _remember_active_orders(orders)
+        _stock_changed(meta.event_id)
+
+        for index, order in zip(accepted, orders):
+            results[index] = order
+        return results
+
+
+def _product_id(order):
+    """訂單對應的商品 ID（從快取取得，不需要載入活動與商品）"""
+    return get_event_meta(order.flash_sale_event_id).product_id
+
+
+def confirm_sale(order):
+    """
+    付款成功：預留轉為售出，回傳這筆訂單的出貨順位
+    （需在交易中、訂單已鎖定時呼叫）
+
+    鎖定順序與下單相同：活動 → 分桶 → Inventory，避免與下單、批次付款互相死結
+    """
+    # 已付款的用戶到活動結束前都不能再下單
+    meta = get_event_meta(order.flash_sale_event_id)
+    transaction.on_commit(
+        lambda: get_seen_emails().add(meta.event_id, order.user_email, meta.end_time)
+    )
+    _stock_changed(meta.event_id)
+    events = FlashSaleEvent.objects.filter(pk=order.flash_sale_event_id)
+
+    if order.stock_bucket_id:
+        # 分桶模式下單不鎖活動記錄，付款之間只在活動記錄上排隊
+        events.update(paid_sequence=F('paid_sequence') + 1)
+        FlashSaleStockBucket.objects.filter(pk=order.stock_bucket_id).update(
+            reserved_quantity=F('reserved_quantity') - 1,
+            sold_quantity=F('sold_quantity') + 1,
+        )
+        # 分桶配額整批預留在 Inventory，售出時從預留與實際庫存各扣一件，可售數量不變
+        inventory.sell(meta.product_id)
+        return _paid_sequence(events)
+
+    # 更新活動統計並發出出貨順位（原子更新，避免遺失更新）
+    events.update(
+        reserved_quantity=F('reserved_quantity') - 1,
+        sold_quantity=F('sold_quantity') + 1,
+        paid_sequence=F('paid_sequence') + 1,
+    )
+
+    # 更新庫存（從預留變成實際銷售）
+    inventory.sell(meta.product_id)
+    return _paid_sequence(events)
+
+
+def _paid_sequence(events):
+    """讀回本交易剛遞增的出貨順位（活動記錄已被本交易鎖定，其他付款要等到提交後才能遞增）"""
+    return events.values_list('paid_sequence', flat=True).get()
+
+
+def release_reservation(order):
+    """取消或逾期：釋放訂單預留的庫存（需在交易中、訂單已鎖定時呼叫）"""
+    if order.stock_bucket_id:
+        # 名額回到原本的桶，Inventory 上的分桶配額不變
+        FlashSaleStockBucket.objects.filter(pk=order.stock_bucket_id).update(
+            reserved_quantity=F('reserved_quantity') - 1
+        )
+    else:
+        # 釋放活動預留數量（原子更新）
+        FlashSaleEvent.objects.filter(pk=order.flash_sale_event_id).update(
+            reserved_quantity=F('reserved_quantity') - 1
+        )
+
+        bucket_ids = _event_bucket_ids([order.flash_sale_event_id]).get(order.flash_sale_event_id)
+        if bucket_ids:
+            # 分桶前建立的訂單在分桶後才釋放：名額加進一個桶的配額，Inventory 維持預留
+            FlashSaleStockBucket.objects.filter(pk=random.choice(bucket_ids)).update(quota=F('quota') + 1)
+        else:
+            inventory.release(_product_id(order))
+
+    # 歸還庫存閘門令牌，清除售罄旗標，用戶可以重新下單
+    event_id = order.flash_sale_event_id
+    transaction.on_commit(lambda: get_stock_gate().release(event_id))
+    transaction.on_commit(lambda: get_sold_out_cache().clear(event_id))
+    transaction.on_commit(lambda: get_seen_emails().discard(event_id, order.user_email))
+    _stock_changed(event_id)
+
+
+def _event_bucket_ids(event_ids):
+    """
+    {活動 ID: [分桶 ID, ...]}，只包含已分桶的活動
+    分桶模式下單只讀取各桶的配額，釋放分桶前的訂單時要把名額加回桶，否則不會再被賣出；
+    在活動記錄已鎖定後呼叫，不會與分桶指令交錯
+    """
+    bucket_ids = {}
+    for event_id, bucket_id in FlashSaleStockBucket.objects.filter(
+        flash_sale_event_id__in=event_ids
+    ).values_list('flash_sale_event_id', 'id'):
+        bucket_ids.setdefault(event_id, []).append(bucket_id)
+    return bucket_ids
+
+
+def settle_payments(notifications):
+    """
+    批次處理金流付款通知
+    notifications 為 [(order_number, success), ...]，回傳同順序的結果字典
+
+    整批在一個交易中：依訂單 ID 順序鎖定訂單，活動、分桶與 Inventory 的計數
+    依活動／桶／商品彙總後各更新一次，出貨順位依通知順序整批發出。
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        orders = {
+            order.order_number: order
+            for order in SalesOrder.objects.select_for_update().filter(
+                order_number__in={order_number for order_number, _ in notifications}
+            ).only(
+                'id', 'order_number', 'user_email', 'flash_sale_event_id', 'stock_bucket_id', 'status'
+            ).order_by('id')
+        }
+
+        results = []
+        paid, cancelled = [], []
+        seen = set()
+        for order_number, success in notifications:
+            order = orders.get(order_number)
+            if order is None:
+                results.append({'order_number': order_number, 'success': False, 'message': '訂單不存在'})
+            elif order_number in seen:
+                results.append({'order_number': order_number, 'success': False, 'message': '重複的付款通知'})
+            elif order.status != 'pending':
+                results.append({
+                    'order_number': order_number,
+                    'success': False,
+                    'message': f'訂單已處理過，目前狀態: {order.get_status_display()}',
+                })
+            else:
+                (paid if success else cancelled).append(order)
+                results.append(None)
+            seen.add(order_number)
+
+        _apply_settlement(paid, cancelled)
+
+        SalesOrder.objects.bulk_update(
+            [_settled(order, 'paid', now, paid_at=now) for order in paid],
+            ['status', 'paid_at', 'shipping_priority', 'updated_at'],
+            batch_size=500,
+        )
+        if cancelled:
+            # 取消的訂單只改狀態，一個 UPDATE 完成
+            # （放進 bulk_update 會為每筆訂單讀取未載入的 shipping_priority）
+            SalesOrder.objects.filter(pk__in=[order.pk for order in cancelled]).update(
+                status='cancelled', updated_at=now
+            )
+            for order in cancelled:
+                _settled(order, 'cancelled', now)
+
+        _after_settlement(paid, cancelled)
+        _orders_changed(paid + cancelled)
+
+    by_number = {order.order_number: order for order in paid + cancelled}
+    for index, (order_number, success) in enumerate(notifications):
+        if results[index] is not None:
+            continue
+        order = by_number[order_number]
+        if order.status == 'paid':
+            results[index] = {
+                'order_number': order_number,
+                'success': True,
+                'message': '付款成功！',
+                'shipping_priority': order.shipping_priority,
+                'paid_at': order.paid_at,
+            }
+        else:
+            results[index] = {
+                'order_number': order_number,
+                'success': False,
+                'message': '付款失敗，訂單已取消',
+            }
+    return results
+
+
+def _settled(order, status, now, paid_at=None):
+    order.status = status
+    order.paid_at = paid_at
+    order.updated_at = now
+    return order
+
+
+def _apply_settlement(paid, released):
+    """
+    彙總計數變化後更新，paid 為付款成功、released 為取消或逾期的訂單
+    鎖定順序：活動 → 分桶 → Inventory（各依 ID 排序）
+    """
+    events, buckets, inventories = {}, {}, {}
+
+    def delta(table, key, **changes):
+        row = table.setdefault(key, {})
+        for field, value in changes.items():
+            row[field] = row.get(field, 0) + value
+
+    for order in paid:
+        product_id = _product_id(order)
+        if order.stock_bucket_id:
+            delta(events, order.flash_sale_event_id, paid_sequence=1)
+            delta(buckets, order.stock_bucket_id, reserved_quantity=-1, sold_quantity=1)
+            delta(inventories, product_id, quantity_reserved=-1, quantity_on_hand=-1)
+        else:
+            delta(events, order.flash_sale_event_id, reserved_quantity=-1, sold_quantity=1, paid_sequence=1)
+            delta(inventories, product_id, quantity_reserved=-1, quantity_on_hand=-1)
+    # 沒有分桶的釋放訂單：活動 ID -> {商品 ID: 件數}
+    unbucketed = {}
+    for order in released:
+        if order.stock_bucket_id:
+            delta(buckets, order.stock_bucket_id, reserved_quantity=-1)
+        else:
+            delta(events, order.flash_sale_event_id, reserved_quantity=-1)
+            delta(unbucketed.setdefault(order.flash_sale_event_id, {}), _product_id(order), quantity=1)
+
+    for event_id in sorted(events):
+        FlashSaleEvent.objects.filter(pk=event_id).update(
+            **{field: F(field) + value for field, value in events[event_id].items()}
+        )
+    # 活動已分桶時名額加進一個桶的配額（Inventory 維持預留），否則釋放 Inventory 的預留
+    bucket_ids = _event_bucket_ids(unbucketed) if unbucketed else {}
+    for event_id, products in unbucketed.items():
+        if event_id in bucket_ids:
+            quantity = sum(changes['quantity'] for changes in products.values())
+            delta(buckets, random.choice(bucket_ids[event_id]), quota=quantity)
+        else:
+            for product_id, changes in products.items():
+                delta(inventories, product_id, quantity_reserved=-changes['quantity'])
+    for bucket_id in sorted(buckets):
+        FlashSaleStockBucket.objects.filter(pk=bucket_id).update(
+            **{field: F(field) + value for field, value in buckets[bucket_id].items()}
+        )
+    for product_id in sorted(inventories):
+        changes = inventories[product_id]
+        sold = -changes.get('quantity_on_hand', 0)
+        inventory.settle(product_id, sold=sold, released=-changes['quantity_reserved'] - sold)
+
+    # 出貨順位：各活動這次遞增的區段依通知順序分配
+    if paid:
+        tops = dict(FlashSaleEvent.objects.filter(
+            pk__in={order.flash_sale_event_id for order in paid}
+        ).values_list('id', 'paid_sequence'))
+        next_priority = {
+            event_id: tops[event_id] - changes['paid_sequence'] + 1
+            for event_id, changes in events.items() if changes.get('paid_sequence')
+        }
+        for order in paid:
+            order.shipping_priority = next_priority[order.flash_sale_event_id]
+            next_priority[order.flash_sale_event_id] += 1
+
+
+def _after_settlement(paid, released):
+    """提交後更新重複下單過濾、歸還庫存閘門令牌、清除售罄旗標與喚醒即時推送"""
+    seen_emails = get_seen_emails()
+    for order in paid:
+        meta = get_event_meta(order.flash_sale_event_id)
+        transaction.on_commit(
+            lambda meta=meta, email=order.user_email: seen_emails.add(meta.event_id, email, meta.end_time)
+        )
+
+    quantities = {}
+    for order in released:
+        quantities[order.flash_sale_event_id] = quantities.get(order.flash_sale_event_id, 0) + 1
+        transaction.on_commit(
+            lambda event_id=order.flash_sale_event_id, email=order.user_email:
+                seen_emails.discard(event_id, email)
+        )
+    for event_id, quantity in quantities.items():
+        transaction.on_commit(
+            lambda event_id=event_id, quantity=quantity: get_stock_gate().release(event_id, quantity)
+        )
+        transaction.on_commit(lambda event_id=event_id: get_sold_out_cache().clear(event_id))
+    for event_id in {order.flash_sale_event_id for order in paid} | quantities.keys():
+        _stock_changed(event_id)
+
+
+_EXPIRE_SQL = """
+    UPDATE sales_orders SET status = 'expired', updated_at = %s
+    WHERE id IN (
+        SELECT id FROM sales_orders
+        WHERE status = 'pending' AND payment_deadline < %s {filters}
+        ORDER BY payment_deadline
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING id, order_number, user_email, flash_sale_event_id, stock_bucket_id
+"""
+
+
+def expire_pending_orders(now=None, chunk_size=500, order_ids=None, event_id=None, max_chunks=None):
+    """
+    將逾期未付款的訂單整批改為 expired 並釋放庫存，回傳 {活動 ID: 釋放筆數}
+    指定 order_ids 或 event_id 時只處理其中已逾期、仍待付款的訂單；
+    max_chunks 限制最多處理幾個 chunk
+
+    每個 chunk 一個交易：一個 UPDATE ... RETURNING 改訂單狀態，
+    釋放數量依活動／桶／商品彙總後各更新一次。
+    已被其他交易鎖定的訂單（付款中、或由其他程序釋放中）會被跳過，
+    所以可以同時執行多個程序。
+    """
+    now = now or timezone.now()
+    released = {}
+    total = chunks = 0
+    while True:
+        with transaction.atomic():
+            orders = _expire_chunk(now, chunk_size, order_ids, event_id)
+            # 活動已刪除的訂單只改狀態，沒有庫存可以釋放
+            orders_with_event = [order for order in orders if order.flash_sale_event_id]
+            _apply_settlement([], orders_with_event)
+            _after_settlement([], orders_with_event)
+            _orders_changed(orders)
+
+        for order in orders:
+            released[order.flash_sale_event_id] = released.get(order.flash_sale_event_id, 0) + 1
+        total += len(orders)
+        chunks += 1
+        if (
+            len(orders) < chunk_size
+            or (order_ids is not None and total >= len(order_ids))
+            or (max_chunks is not None and chunks >= max_chunks)
+        ):
+            return released
+
+
+def _expire_chunk(now, chunk_size, order_ids=None, event_id=None):
+    """改一個 chunk 的訂單狀態，回傳只帶有釋放所需欄位的 SalesOrder"""
+    fields = ('id', 'order_number', 'user_email', 'flash_sale_event_id', 'stock_bucket_id')
+    if connection.vendor == 'postgresql':
+        filters, params = '', [now, now]
+        if order_ids is not None:
+            filters += ' AND id = ANY(%s)'
+            params.append(list(order_ids))
+        if event_id is not None:
+            filters += ' AND flash_sale_event_id = %s'
+            params.append(event_id)
+        with connection.cursor() as cursor:
+            cursor.execute(_EXPIRE_SQL.format(filters=filters), params + [chunk_size])
+            rows = cursor.fetchall()
+    else:
+        pending = SalesOrder.objects.select_for_update(skip_locked=True).filter(
+            status='pending', payment_deadline__lt=now
+        ).order_by('payment_deadline')
+        if order_ids is not None:
+            pending = pending.filter(id__in=order_ids)
+        if event_id is not None:
+            pending = pending.filter(flash_sale_event_id=event_id)
+        # 不支援 SKIP LOCKED 的資料庫（SQLite）不會鎖定，讀取後可能已被付款或其他程序釋放，
+        # 逐筆以 status='pending' 為條件更新，只釋放確實由這裡改為逾期的訂單
+        rows = [
+            row for row in pending.values_list(*fields)[:chunk_size]
+            if SalesOrder.objects.filter(id=row[0], status='pending').update(status='expired', updated_at=now)
+        ]
+    return [SalesOrder(**dict(zip(fields, row))) for row in rows]
+
+
+def expire_if_overdue(order):
+    """
+    讀取訂單時發現已逾期但仍是待付款：立即以批次釋放相同的流程釋放，
+    回傳訂單是否已經逾期（order.status 會同步更新）
+    """
+    if not order.is_expired():
+        return order.status == 'expired'
+    if expire_pending_orders(order_ids=[order.id], chunk_size=1):
+        order.status = 'expired'
+        return True
+    # 正在付款或其他程序釋放中，交給對方處理
+    return False
+
+
+# event_id -> 上次檢查逾期訂單的時間
+_reclaim_checked = {}
+
+
+def reclaim_expired_stock(event_id):
+    """
+    活動售罄時，釋放該活動已逾期但尚未被釋放的訂單，回傳釋放筆數
+    每個活動每 LAZY_EXPIRY_INTERVAL 秒最多檢查一次、每次最多釋放 LAZY_EXPIRY_BATCH 筆，
+    售罄後的大量請求不會每次都查資料庫，其餘交給批次釋放
+    """
+    now = time.monotonic()
+    if now - _reclaim_checked.get(event_id, float('-inf')) < get_setting('LAZY_EXPIRY_INTERVAL'):
+        return 0
+    _reclaim_checked[event_id] = now
+    return sum(expire_pending_orders(
+        chunk_size=get_setting('LAZY_EXPIRY_BATCH'), event_id=event_id, max_chunks=1
+    ).values())
+
+
+# (查詢時間, 隊伍最前面的排隊單 ID)
+_ticket_head = (float('-inf'), None)
+
+
+def queued_ticket_position(ticket_id):
+    """
+    排隊單的大約順位：與隊伍最前面的排隊單 ID 相減（排隊單依 ID 順序處理）
+    隊伍最前面的 ID 每 TICKET_POSITION_TTL 秒最多查詢一次（status, id 索引上的 MIN），
+    輪詢不會每次都計算整個隊伍的筆數；中間已處理完的排隊單也會算進去，順位只會偏大
+    """
+    global _ticket_head
+    checked_at, head_id = _ticket_head
+    now = time.monotonic()
+    if head_id is None or now - checked_at >= get_setting('TICKET_POSITION_TTL'):
+        head_id = OrderTicket.objects.filter(status='queued').aggregate(head=Min('id'))['head']
+        _ticket_head = (now, head_id)
+    if head_id is None or head_id > ticket_id:
+        return 1
+    return ticket_id - head_id + 1
+
+
+def process_queued_tickets(limit=50):
+    """
+    依先後順序取出一批排隊單並處理，回傳處理筆數
+    多個 worker 同時執行時以 SKIP LOCKED 分配，不會重複處理
+    """
+    with transaction.atomic():
+        tickets = list(
+            OrderTicket.objects.select_for_update(skip_locked=True)
+            .filter(status='queued')
+            .order_by('id')[:limit]
+        )
+        if not tickets:
+            return 0
+
+        # 同一活動的排隊單整批預留，維持先後順序
+        by_event = {}
+        for ticket in tickets:
+            by_event.setdefault(ticket.event_id, []).append(ticket)
+
+        for event_id, event_tickets in by_event.items():
+            requests = [(t.user_email, t.payment_method) for t in event_tickets]
+            try:
+                with transaction.atomic():
+                    results = create_orders_batch(event_id, requests)
+            except FlashSaleEvent.DoesNotExist:
+                results = [OrderRejected('活動不存在', code='not_found') for _ in event_tickets]
+            except Exception as e:
+                results = [e for _ in event_tickets]
+
+            for ticket, result in zip(event_tickets, results):
+                if isinstance(result, SalesOrder):
+                    ticket.status = 'succeeded'
+                    ticket.order = result
+                    ticket.message = '訂單建立成功，請在1小時內完成付款'
+                    continue
+                if isinstance(result, OrderRejected):
+                    ticket.status = 'rejected'
+                    ticket.message = result.message
+                else:
+                    ticket.status = 'failed'
+                    ticket.message = f'系統錯誤: {str(result)}'[:200]
+                if ticket.holds_stock_token:
+                    # 沒有成立訂單，歸還收單時取得的令牌
+                    transaction.on_commit(
+                        lambda event_id=ticket.event_id: get_stock_gate().release(event_id)
+                    )
+
+        processed_at = timezone.now()
+        for ticket in tickets:
+            ticket.processed_at = processed_at
+        OrderTicket.objects.bulk_update(tickets, ['status', 'order', 'message', 'processed_at'])
+        return len(tickets)
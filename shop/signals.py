@@ -0,0 +1,27 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .event_meta import invalidate_event, invalidate_product
+from .models import Product, FlashSaleEvent, SalesOrder
+from .order_status_cache import get_order_status_cache
+
+
+@receiver([post_save, post_delete], sender=FlashSaleEvent)
+def flash_sale_event_changed(sender, instance, **kwargs):
+    """活動修改後清除中繼資料快取"""
+    invalidate_event(instance.id)
+
+
+@receiver([post_save, post_delete], sender=Product)
+def product_changed(sender, instance, **kwargs):
+    """商品修改（例如售價）後清除相關活動的中繼資料快取"""
+    invalidate_product(instance.id)
+
+
+@receiver([post_save, post_delete], sender=SalesOrder)
+def sales_order_changed(sender, instance, created=False, **kwargs):
+    """訂單修改（付款回調、逾期釋放、後台）提交後清除訂單狀態快取；新建的訂單不會有快取"""
+    cache = get_order_status_cache()
+    if cache is not None and not created:
+        transaction.on_commit(lambda: cache.invalidate([instance.order_number]))
@@ -0,0 +1,98 @@
+"""
+售罄快取
+
+活動售完後，大部分請求都只是為了得到「商品已售罄」。
+資料庫判斷出售罄時設定旗標，之後的下單與狀態查詢直接回應，不碰資料庫。
+
+- 程序內旗標：最多維持 SOLD_OUT_LOCAL_TTL 秒
+- 共享旗標（SOLD_OUT_SHARED 開啟時，透過 Redis 協定）：最多維持 SOLD_OUT_SHARED_TTL 秒
+
+付款失敗或逾期釋放庫存時清除旗標；其他程序的程序內旗標最晚在 TTL 到期後失效，
+所以售罄狀態最多落後 SOLD_OUT_LOCAL_TTL 秒（有共享旗標時再加上共享旗標的 TTL）。
+"""
+import threading
+import time
+
+from .conf import get_setting
+from .resp import RespError, get_client
+
+
+class SoldOutCache:
+    """售罄旗標（程序內 + 可選的共享旗標）"""
+
+    def __init__(self):
+        self.local_ttl = get_setting('SOLD_OUT_LOCAL_TTL')
+        self.shared_ttl = get_setting('SOLD_OUT_SHARED_TTL')
+        self.client = get_client() if get_setting('SOLD_OUT_SHARED') else None
+        # event_id -> (到期時間, 活動狀態回應)
+        self._local = {}
+        self._lock = threading.Lock()
+
+    def _key(self, event_id):
+        return self.client.key('event', event_id, 'sold_out')
+
+    def is_sold_out(self, event_id):
+        """活動是否已知售罄"""
+        entry = self._local.get(event_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return True
+        if self.client is None:
+            return False
+        try:
+            shared = self.client.execute('EXISTS', self._key(event_id))
+        except (OSError, RespError):
+            # 共享旗標只是快取，服務不可用時交給資料庫判斷
+            return False
+        if shared:
+            self._remember(event_id, None)
+        return bool(shared)
+
+    def status_payload(self, event_id):
+        """售罄時快取的活動狀態回應，沒有時回傳 None"""
+        entry = self._local.get(event_id)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def mark(self, event_id, status_payload=None):
+        """標記活動售罄"""
+        self._remember(event_id, status_payload)
+        if self.client is not None:
+            try:
+                self.client.execute(
+                    'SET', self._key(event_id), 1, 'PX', int(self.shared_ttl * 1000)
+                )
+            except (OSError, RespError):
+                pass
+
+    def clear(self, event_id):
+        """庫存釋放後清除售罄旗標"""
+        with self._lock:
+            self._local.pop(event_id, None)
+        if self.client is not None:
+            try:
+                self.client.execute('DEL', self._key(event_id))
+            except (OSError, RespError):
+                pass
+
+    def _remember(self, event_id, status_payload):
+        with self._lock:
+            entry = self._local.get(event_id)
+            if status_payload is None and entry is not None and entry[0] > time.monotonic():
+                # 保留已快取的狀態回應
+                status_payload = entry[1]
+            self._local[event_id] = (time.monotonic() + self.local_ttl, status_payload)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_sold_out_cache():
+    """取得程序內共用的售罄快取"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SoldOutCache()
+    return _cache
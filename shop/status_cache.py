@@ -0,0 +1,132 @@
+"""
+活動狀態的回應微快取
+
+搶購期間所有用戶端都在輪詢 /api/flash-sale/<id>/status/，
+每次都查詢正被下單鎖定的活動記錄會和下單互相競爭。
+這裡把每個活動的回應（序列化後的 JSON bytes 與 ETag）保留 STATUS_CACHE_TTL 秒：
+
+- 過期後同一程序只有一個請求重建（single-flight），其他請求先回應舊的內容；
+  還沒有任何內容時才等待重建完成
+- ETag 為回應內容的雜湊，用戶端帶 If-None-Match 時可以回應 304
+"""
+import hashlib
+import threading
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from .conf import get_setting
+from .db_router import reading_from_replica, use_primary
+from .models import FlashSaleEvent
+from .sold_out import get_sold_out_cache
+
+
+def build_status(event_id):
+    """活動狀態的回應資料（售罄後使用售罄快取中的內容），活動不存在時拋出 FlashSaleEvent.DoesNotExist"""
+    sold_out = get_sold_out_cache()
+    cached = sold_out.status_payload(event_id)
+    if cached is not None:
+        return cached
+
+    event = FlashSaleEvent.objects.select_related('product').get(id=event_id)
+    # 分桶模式下為各桶加總後的數量
+    reserved_quantity, sold_quantity = event.stock_counts()
+
+    response_data = {
+        'event_id': event.id,
+        'product_name': event.product.name,
+        'product_sku': event.product.sku,
+        'total_quantity': event.total_quantity,
+        'reserved_quantity': reserved_quantity,
+        'sold_quantity': sold_quantity,
+        'remaining': event.total_quantity - reserved_quantity - sold_quantity,
+        'status': event.status,
+        'status_display': event.get_status_display(),
+        'start_time': event.start_time,
+        'end_time': event.end_time,
+        'is_active': event.is_active(),
+        'has_stock': reserved_quantity + sold_quantity < event.total_quantity,
+    }
+
+    # 售罄後快取這份回應，之後的查詢不需要再讀資料庫
+    if not response_data['has_stock']:
+        if reading_from_replica():
+            # 副本可能落後（例如還沒看到逾期釋放），售罄旗標只依主資料庫的結果設定
+            with use_primary():
+                return build_status(event_id)
+        sold_out.mark(event.id, response_data)
+
+    return response_data
+
+
+class CachedResponse:
+    """序列化後的回應"""
+
+    __slots__ = ('body', 'etag', 'expires_at')
+
+    def __init__(self, body, expires_at):
+        self.body = body
+        self.etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        self.expires_at = expires_at
+
+
+class StatusCache:
+    """以活動 ID 為 key 的回應微快取"""
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl if ttl is not None else get_setting('STATUS_CACHE_TTL')
+        self._entries = {}
+        self._refresh_locks = {}
+        self._lock = threading.Lock()
+        self._renderer = JSONRenderer()
+
+    def get(self, event_id, build=None):
+        """
+        取得活動的回應；過期時呼叫 build(event_id)（預設為 build_status）取得回應資料重建
+        build 拋出的例外（例如活動不存在）會直接傳給呼叫端
+        """
+        build = build or build_status
+        entry = self._entries.get(event_id)
+        if entry is not None and entry.expires_at > time.monotonic():
+            return entry
+
+        refresh_lock = self._refresh_lock(event_id)
+        if not refresh_lock.acquire(blocking=entry is None):
+            # 其他請求正在重建，先回應舊的內容
+            return entry
+        try:
+            # 等待期間可能已經由其他請求重建完成
+            current = self._entries.get(event_id)
+            if current is not None and current.expires_at > time.monotonic():
+                return current
+            entry = CachedResponse(
+                self._renderer.render(build(event_id)), time.monotonic() + self.ttl
+            )
+            self._entries[event_id] = entry
+            return entry
+        finally:
+            refresh_lock.release()
+
+    def invalidate(self, event_id):
+        self._entries.pop(event_id, None)
+
+    def _refresh_lock(self, event_id):
+        refresh_lock = self._refresh_locks.get(event_id)
+        if refresh_lock is None:
+            with self._lock:
+                refresh_lock = self._refresh_locks.setdefault(event_id, threading.Lock())
+        return refresh_lock
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_status_cache():
+    """取得程序內共用的活動狀態快取"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = StatusCache()
+    return _cache
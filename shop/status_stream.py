@@ -0,0 +1,153 @@
+"""
+活動庫存的即時推送（Server-Sent Events）
+
+每個程序、每個活動只有一個發布者：有訂閱者時每 STREAM_TICK 秒透過活動狀態微快取
+讀一次狀態，內容有變化時推送給所有訂閱者，不論有多少用戶端連線，
+每個程序每個 tick 最多讀一次資料庫。
+下單、付款與逾期釋放提交後呼叫 notify_stock_changed 提早喚醒發布者，
+發布者等到微快取的內容過期後再讀，所以仍然不會比微快取更頻繁地讀資料庫。
+
+只能以 ASGI 啟動（config/asgi.py）：Django 4.2 在 WSGI 下會把非同步的串流回應整個收集完才送出。
+Django 4.2 的 ASGI handler 不會偵測用戶端離線，DisconnectWatcher 在讀完請求內容後
+繼續監聽 http.disconnect，離線時推送立即結束並取消訂閱，不必等到 STREAM_MAX_SECONDS。
+"""
+import asyncio
+import time
+
+from asgiref.sync import sync_to_async
+
+from .conf import get_setting
+from .status_cache import get_status_cache
+
+
+class StatusPublisher:
+    """單一活動的發布者"""
+
+    def __init__(self, event_id, loop):
+        self.event_id = event_id
+        self.loop = loop
+        self.subscribers = set()
+        self.wake = asyncio.Event()
+        self.latest = None
+        self.task = None
+
+    async def run(self):
+        tick = get_setting('STREAM_TICK')
+        cache = get_status_cache()
+        while self.subscribers:
+            try:
+                entry = await sync_to_async(cache.get)(self.event_id)
+            except Exception:
+                # 暫時讀不到（例如資料庫忙碌）時保留上一次的內容，下一個 tick 再試
+                entry = self.latest
+            if entry is not None and (self.latest is None or entry.etag != self.latest.etag):
+                self.latest = entry
+                for queue in self.subscribers:
+                    queue.put_nowait(entry)
+
+            try:
+                await asyncio.wait_for(self.wake.wait(), tick)
+                # 被喚醒時等到微快取內容過期，避免比微快取更頻繁地讀資料庫
+                if self.latest is not None:
+                    await asyncio.sleep(max(self.latest.expires_at - time.monotonic(), 0))
+            except asyncio.TimeoutError:
+                pass
+            self.wake.clear()
+
+
+# event_id -> StatusPublisher（只在 ASGI 的事件迴圈中存取）
+_publishers = {}
+
+
+async def subscribe(event_id):
+    """
+    訂閱活動狀態，回傳 asyncio.Queue，內容有變化時放入 CachedResponse
+    使用完畢必須呼叫 unsubscribe
+    """
+    publisher = _publishers.get(event_id)
+    if publisher is None:
+        publisher = _publishers[event_id] = StatusPublisher(event_id, asyncio.get_running_loop())
+    queue = asyncio.Queue()
+    publisher.subscribers.add(queue)
+    if publisher.latest is not None:
+        queue.put_nowait(publisher.latest)
+    if publisher.task is None or publisher.task.done():
+        publisher.task = asyncio.create_task(publisher.run())
+    return queue
+
+
+def unsubscribe(event_id, queue):
+    publisher = _publishers.get(event_id)
+    if publisher is None:
+        return
+    publisher.subscribers.discard(queue)
+    if not publisher.subscribers:
+        # 最後一個訂閱者離開，發布者在下一個 tick 結束
+        _publishers.pop(event_id, None)
+        publisher.wake.set()
+
+
+def notify_stock_changed(event_id):
+    """庫存計數變動後呼叫（可在任何執行緒），提早喚醒該活動的發布者"""
+    publisher = _publishers.get(event_id)
+    if publisher is not None:
+        publisher.loop.call_soon_threadsafe(publisher.wake.set)
+
+
+class ClientDisconnected(Exception):
+    """推送中的用戶端已離線"""
+
+
+class DisconnectWatcher:
+    """
+    包在 Django ASGI application 外層：請求內容讀完後監聽 http.disconnect，
+    離線時設定 scope 中的 asyncio.Event（以 client_disconnected(request) 取得）
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        disconnected = scope['flash_sale.disconnected'] = asyncio.Event()
+        watcher = None
+
+        async def watch():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+            disconnected.set()
+
+        async def receive_body():
+            nonlocal watcher
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+            elif not message.get('more_body') and watcher is None:
+                # Django 讀完請求內容後不再呼叫 receive，改由這裡接手監聽
+                watcher = asyncio.create_task(watch())
+            return message
+
+        try:
+            await self.app(scope, receive_body, send)
+        finally:
+            if watcher is not None:
+                watcher.cancel()
+
+
+def client_disconnected(request):
+    """請求的離線事件；不是經由 DisconnectWatcher 的請求回傳永遠不會設定的事件"""
+    return request.scope.get('flash_sale.disconnected') or asyncio.Event()
+
+
+async def next_update(queue, disconnected, timeout):
+    """等待訂閱的下一份內容，逾時回傳 None，用戶端離線時拋出 ClientDisconnected"""
+    update = asyncio.ensure_future(queue.get())
+    gone = asyncio.ensure_future(disconnected.wait())
+    done, pending = await asyncio.wait({update, gone}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+    for task in pending:
+        task.cancel()
+    if gone in done:
+        raise ClientDisconnected
+    return update.result() if update in done else None
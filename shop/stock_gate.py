@@ -0,0 +1,221 @@
+"""
+庫存閘門（下單前的庫存令牌）
+
+活動開始後第一次下單時，從資料庫載入剩餘數量
+（total_quantity - reserved_quantity - sold_quantity）作為令牌數。
+每筆下單請求在進入資料庫交易前先原子地扣一個令牌，
+拿不到令牌的請求直接回應售罄，不會碰到資料庫。
+
+資料庫仍然是最終依據：拿到令牌但交易失敗時會歸還令牌；
+付款失敗與逾期釋放時也會歸還令牌。
+令牌用完時每 STOCK_GATE_RESYNC_INTERVAL 秒最多以資料庫重新校正一次，
+其他程序歸還（例如逾期釋放指令）或程序中斷而沒有歸還的令牌會在校正時補回。
+校正時尚未提交的下單不在資料庫的計數中，可能短暫多發令牌，仍由資料庫交易把關。
+
+LocalStockGate 只在本程序內計數，適合單一程序；多 worker 部署請使用 RedisStockGate。
+RedisStockGate 連不上時 acquire 拋出 StockGateUnavailable，下單不經過閘門、直接由資料庫交易把關；
+歸還失敗的令牌在下次校正時補回。
+"""
+import threading
+import time
+
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+from .models import FlashSaleEvent
+from .resp import RespError, get_client
+
+
+def remaining_from_db(event_id):
+    """從資料庫計算活動剩餘可下單數量"""
+    event = FlashSaleEvent.objects.only(
+        'total_quantity', 'reserved_quantity', 'sold_quantity', 'bucket_count'
+    ).get(id=event_id)
+    reserved_quantity, sold_quantity = event.stock_counts()
+    return max(event.total_quantity - reserved_quantity - sold_quantity, 0)
+
+
+class StockGateUnavailable(Exception):
+    """共享的令牌計數無法連線（此時沒有扣到令牌，也不需要歸還）"""
+
+
+class BaseStockGate:
+    """庫存閘門介面"""
+
+    # 令牌數是否由所有程序共享（非共享時，只能在取得令牌的程序內歸還）
+    shared = False
+
+    def acquire(self, event_id, quantity=1):
+        """扣除令牌，成功回傳 True；尚未載入時先從資料庫載入"""
+        if not self.is_loaded(event_id):
+            self.load(event_id, remaining_from_db(event_id))
+        if self._acquire(event_id, quantity):
+            return True
+        if not self._claim_resync(event_id):
+            return False
+        self.load(event_id, remaining_from_db(event_id), force=True)
+        return self._acquire(event_id, quantity)
+
+    def release(self, event_id, quantity=1):
+        """歸還令牌（閘門尚未載入時不做任何事）"""
+        raise NotImplementedError
+
+    def load(self, event_id, tokens, force=False):
+        """載入令牌數，force=False 時若已載入則不覆蓋"""
+        raise NotImplementedError
+
+    def is_loaded(self, event_id):
+        raise NotImplementedError
+
+    def remaining(self, event_id):
+        """目前剩餘令牌數，未載入時回傳 None"""
+        raise NotImplementedError
+
+    def _acquire(self, event_id, quantity):
+        raise NotImplementedError
+
+    def _claim_resync(self, event_id):
+        """令牌用完時是否由這次請求以資料庫重新校正（每個活動每 STOCK_GATE_RESYNC_INTERVAL 秒最多一次）"""
+        raise NotImplementedError
+
+
+class NullStockGate(BaseStockGate):
+    """不做任何限制（關閉閘門時使用）"""
+
+    shared = True
+
+    def acquire(self, event_id, quantity=1):
+        return True
+
+    def release(self, event_id, quantity=1):
+        pass
+
+    def load(self, event_id, tokens, force=False):
+        pass
+
+    def is_loaded(self, event_id):
+        return True
+
+    def remaining(self, event_id):
+        return None
+
+
+class LocalStockGate(BaseStockGate):
+    """
+    單一程序內的令牌計數，只適合單一程序部署
+    其他程序歸還的令牌不會反映在這裡，載入超過 STOCK_GATE_RESYNC_INTERVAL 秒後重新從資料庫載入
+    """
+
+    def __init__(self):
+        self._tokens = {}
+        self._loaded_at = {}
+        self._resync_at = {}
+        self._interval = get_setting('STOCK_GATE_RESYNC_INTERVAL')
+        self._lock = threading.Lock()
+
+    def _acquire(self, event_id, quantity):
+        with self._lock:
+            if self._tokens.get(event_id, 0) < quantity:
+                return False
+            self._tokens[event_id] -= quantity
+            return True
+
+    def release(self, event_id, quantity=1):
+        with self._lock:
+            if event_id in self._tokens:
+                self._tokens[event_id] += quantity
+
+    def load(self, event_id, tokens, force=False):
+        with self._lock:
+            if force or not self.is_loaded(event_id):
+                self._tokens[event_id] = tokens
+                self._loaded_at[event_id] = time.monotonic()
+
+    def is_loaded(self, event_id):
+        loaded_at = self._loaded_at.get(event_id)
+        return loaded_at is not None and time.monotonic() - loaded_at < self._interval
+
+    def remaining(self, event_id):
+        return self._tokens.get(event_id) if self.is_loaded(event_id) else None
+
+    def _claim_resync(self, event_id):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._resync_at.get(event_id, float('-inf')) < self._interval:
+                return False
+            self._resync_at[event_id] = now
+            return True
+
+
+class RedisStockGate(BaseStockGate):
+    """以 Redis 協定共享的令牌計數，所有 worker 共用同一份數量"""
+
+    shared = True
+
+    def __init__(self, url=None):
+        self.client = get_client(url)
+
+    def _key(self, event_id):
+        return self.client.key('event', event_id, 'stock')
+
+    def acquire(self, event_id, quantity=1):
+        try:
+            return super().acquire(event_id, quantity)
+        except (OSError, RespError) as e:
+            raise StockGateUnavailable(str(e)) from e
+
+    def _acquire(self, event_id, quantity):
+        key = self._key(event_id)
+        if self.client.execute('DECRBY', key, quantity) < 0:
+            # 扣過頭，還原
+            self.client.execute('INCRBY', key, quantity)
+            return False
+        return True
+
+    def release(self, event_id, quantity=1):
+        key = self._key(event_id)
+        try:
+            # INCRBY 會自動建立不存在的 key，未載入時不能歸還
+            if self.client.execute('EXISTS', key):
+                self.client.execute('INCRBY', key, quantity)
+        except (OSError, RespError):
+            # 在交易提交後呼叫，不能讓付款或釋放失敗；少掉的令牌在下次校正時補回
+            pass
+
+    def load(self, event_id, tokens, force=False):
+        if force:
+            self.client.execute('SET', self._key(event_id), tokens)
+        else:
+            self.client.execute('SET', self._key(event_id), tokens, 'NX')
+
+    def is_loaded(self, event_id):
+        return bool(self.client.execute('EXISTS', self._key(event_id)))
+
+    def remaining(self, event_id):
+        try:
+            value = self.client.execute('GET', self._key(event_id))
+        except (OSError, RespError):
+            return None
+        return None if value is None else int(value)
+
+    def _claim_resync(self, event_id):
+        # 所有 worker 共用一個校正標記，同一時間只有一個 worker 重新載入
+        interval_ms = max(int(get_setting('STOCK_GATE_RESYNC_INTERVAL') * 1000), 1)
+        return self.client.execute(
+            'SET', self.client.key('event', event_id, 'stock_resync'), 1, 'NX', 'PX', interval_ms
+        ) is not None
+
+
+_gate = None
+_gate_lock = threading.Lock()
+
+
+def get_stock_gate():
+    """取得設定中的庫存閘門（每個程序一個實例）"""
+    global _gate
+    if _gate is None:
+        with _gate_lock:
+            if _gate is None:
+                backend = get_setting('STOCK_GATE_BACKEND')
+                _gate = import_string(backend)() if backend else NullStockGate()
+    return _gate
@@ -0,0 +1,91 @@
+"""
+測試共用的資料建立與程序內狀態重置
+
+搶購的快取、過濾器與閘門都是程序內的單例，每個測試開始前清空，
+避免前一個測試的售罄旗標或活動中繼資料影響結果。
+"""
+from datetime import timedelta
+import uuid
+
+from django.conf import settings
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from shop import (
+    event_meta, group_commit, idempotency, order_status_cache, rate_limit, seen_emails, services,
+    sold_out, status_cache, stock_gate,
+)
+from shop.inventory import available
+from shop.services import OrderRejected, create_order
+from shop.models import FlashSaleEvent, Inventory, Product
+
+
+def reset_process_state():
+    """清空程序內的快取與單例"""
+    event_meta._cache.clear()
+    services._reclaim_checked.clear()
+    services._ticket_head = (float('-inf'), None)
+    idempotency._in_flight.clear()
+    for module, name in [
+        (group_commit, '_writer'), (idempotency, '_store'), (order_status_cache, '_cache'),
+        (rate_limit, '_limiter'), (seen_emails, '_filter'), (sold_out, '_cache'),
+        (status_cache, '_cache'), (stock_gate, '_gate'),
+    ]:
+        setattr(module, name, None)
+
+
+def flash_sale_settings(**overrides):
+    """以目前的 FLASH_SALE 為基礎覆寫部分設定"""
+    return override_settings(FLASH_SALE={**settings.FLASH_SALE, **overrides})
+
+
+def create_event(quantity=10, on_hand=None, **fields):
+    """建立進行中的活動、商品與庫存"""
+    product = Product.objects.create(
+        sku=f'TEST-{uuid.uuid4().hex[:8]}', name='測試商品', price=100, cost=50
+    )
+    on_hand = quantity if on_hand is None else on_hand
+    Inventory.objects.create(product=product, quantity_on_hand=on_hand, quantity_available=on_hand)
+    return FlashSaleEvent.objects.create(**{
+        'product': product,
+        'total_quantity': quantity,
+        'start_time': timezone.now() - timedelta(minutes=1),
+        'end_time': timezone.now() + timedelta(hours=1),
+        'status': 'active',
+        **fields,
+    })
+
+
+# 讀取副本、頻率限制與各種快取預設關閉，測試只看要驗證的路徑
+@override_settings(FLASH_SALE={
+    **settings.FLASH_SALE,
+    'DATABASE_REPLICAS': [],
+    'RATE_LIMIT_BACKEND': None,
+    'STOCK_GATE_BACKEND': None,
+    'ORDER_STATUS_CACHE_TTL': 0,
+    'SEEN_EMAILS_FILTER': False,
+})
+class FlashSaleTestCase(TestCase):
+
+    def setUp(self):
+        reset_process_state()
+        self.addCleanup(reset_process_state)
+
+    def assertCounts(self, event, reserved, sold, quantity_available):
+        """活動（含分桶）的預留與售出數量，以及 Inventory 的可售數量（含未彙總的異動）"""
+        event.refresh_from_db()
+        self.assertEqual(event.stock_counts(), (reserved, sold))
+        self.assertEqual(available(event.product_id), quantity_available)
+
+    def assertSellsOut(self, quantity=2):
+        """下單到售完：計數一致、之後的下單以售罄拒絕，回傳活動"""
+        event = create_event(quantity=quantity)
+        for index in range(quantity):
+            create_order(f'{index}@test.com', event.id, 'credit_card')
+        self.assertCounts(event, reserved=quantity, sold=0, quantity_available=0)
+
+        with self.assertRaises(OrderRejected) as cm:
+            create_order('late@test.com', event.id, 'credit_card')
+        self.assertEqual(cm.exception.code, 'sold_out')
+        self.assertCounts(event, reserved=quantity, sold=0, quantity_available=0)
+        return event
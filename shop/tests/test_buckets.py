@@ -0,0 +1,58 @@
+"""庫存分桶：分桶下單、分桶前訂單的釋放與結束分桶"""
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+
+from shop import services
+from shop.models import FlashSaleStockBucket, SalesOrder
+from shop.services import OrderRejected, create_order
+
+from .base import FlashSaleTestCase, create_event
+
+
+class BucketTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event = create_event(quantity=4)
+
+    def shard(self, buckets=2):
+        call_command('shard_flash_sale_event', self.event.id, buckets=buckets, stdout=StringIO())
+
+    def quota(self):
+        return sum(FlashSaleStockBucket.objects.values_list('quota', flat=True))
+
+    def test_sharded_orders_sell_out(self):
+        self.shard()
+        for index in range(4):
+            order = create_order(f'{index}@test.com', self.event.id, 'credit_card')
+            self.assertIsNotNone(order.stock_bucket_id)
+        with self.assertRaises(OrderRejected) as cm:
+            create_order('late@test.com', self.event.id, 'credit_card')
+        self.assertEqual(cm.exception.code, 'sold_out')
+        # 分桶配額在分桶時已整批從 Inventory 預留
+        self.assertCounts(self.event, reserved=4, sold=0, quantity_available=0)
+
+    def test_pre_shard_order_returns_to_bucket(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        self.shard()
+        self.assertEqual(self.quota(), 3)
+
+        services.release_reservation(order)
+        SalesOrder.objects.filter(pk=order.pk).update(status='cancelled')
+
+        # 名額加進桶的配額，Inventory 仍由分桶預留
+        self.assertEqual(self.quota(), 4)
+        self.assertCounts(self.event, reserved=0, sold=0, quantity_available=0)
+
+    def test_close_buckets_returns_unsold_quota(self):
+        self.shard()
+        create_order('a@test.com', self.event.id, 'credit_card')
+
+        with self.assertRaises(CommandError):
+            call_command('close_flash_sale_buckets', self.event.id, stdout=StringIO())
+        call_command('close_flash_sale_buckets', self.event.id, force=True, stdout=StringIO())
+
+        self.assertCounts(self.event, reserved=1, sold=0, quantity_available=3)
+        with self.assertRaises(OrderRejected):
+            create_order('b@test.com', self.event.id, 'credit_card')
@@ -0,0 +1,56 @@
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connections
+from django.test import SimpleTestCase, TransactionTestCase
+
+from shop import db_router
+from shop.db_router import ReplicaRouter, use_primary
+from shop.models import SalesOrder
+
+from .base import reset_process_state
+
+
+REPLICAS = settings.FLASH_SALE.get('DATABASE_REPLICAS') or []
+
+
+def _sqlite_replicas():
+    return bool(REPLICAS) and all(
+        settings.DATABASES[alias]['ENGINE'] == 'django.db.backends.sqlite3'
+        for alias in ['default', *REPLICAS]
+    )
+
+
+@skipUnless(_sqlite_replicas(), '需要 SQLite 讀取副本（--settings=config.settings_replica_local）')
+class ReplicaRoutingTests(TransactionTestCase):
+    """以 check_replica_routing 驗證讀取副本路由、read-your-writes 與副本落後時改讀主資料庫"""
+
+    databases = {'default', *REPLICAS}
+
+    def setUp(self):
+        reset_process_state()
+        self.addCleanup(reset_process_state)
+
+    def test_check_replica_routing(self):
+        call_command('check_replica_routing', stdout=StringIO())
+
+
+class ReplicaRouterTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        token = db_router._read_alias.set('replica')
+        self.addCleanup(db_router._read_alias.reset, token)
+
+    def test_reads_follow_request_alias(self):
+        with mock.patch.object(connections['default'], 'in_atomic_block', False):
+            self.assertEqual(self.router.db_for_read(SalesOrder), 'replica')
+            with use_primary():
+                self.assertIsNone(self.router.db_for_read(SalesOrder))
+
+    def test_reads_inside_primary_transaction_use_primary(self):
+        # 交易中要看到交易內的寫入與鎖定後的資料
+        with mock.patch.object(connections['default'], 'in_atomic_block', True):
+            self.assertIsNone(self.router.db_for_read(SalesOrder))
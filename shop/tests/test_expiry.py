@@ -0,0 +1,77 @@
+"""逾期釋放：整批改狀態、彙總釋放庫存，不釋放已付款的訂單"""
+from datetime import timedelta
+from io import StringIO
+from unittest import mock, skipIf
+
+from django.core.management import call_command
+from django.db import connection
+from django.db.models.query import QuerySet
+from django.test import Client
+from django.utils import timezone
+
+from shop.models import SalesOrder
+from shop.services import create_order, expire_pending_orders
+
+from .base import FlashSaleTestCase, create_event
+
+
+class ExpiryTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.event = create_event(quantity=5)
+
+    def overdue(self, *orders):
+        SalesOrder.objects.filter(pk__in=[order.pk for order in orders]).update(
+            payment_deadline=timezone.now() - timedelta(minutes=1)
+        )
+
+    def test_expiry_releases_stock(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        create_order('b@test.com', self.event.id, 'credit_card')
+        self.overdue(order)
+
+        self.assertEqual(expire_pending_orders(), {self.event.id: 1})
+        self.assertEqual(SalesOrder.objects.get(pk=order.pk).status, 'expired')
+        self.assertCounts(self.event, reserved=1, sold=0, quantity_available=4)
+        # 已釋放的訂單不會再被釋放
+        self.assertEqual(expire_pending_orders(), {})
+
+    def test_chunks(self):
+        orders = [create_order(f'{index}@test.com', self.event.id, 'credit_card') for index in range(5)]
+        self.overdue(*orders)
+        call_command('release_expired_orders', chunk_size=2, stdout=StringIO())
+        self.assertEqual(SalesOrder.objects.filter(status='expired').count(), 5)
+        self.assertCounts(self.event, reserved=0, sold=0, quantity_available=5)
+
+    def test_expiry_skips_paid_order(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        Client().get(f'/api/payment/callback/?order={order.order_number}&status=success')
+        self.overdue(order)
+
+        # 讀取後才付款的訂單不會被改為逾期
+        self.assertEqual(expire_pending_orders(order_ids=[order.id]), {})
+        self.assertEqual(SalesOrder.objects.get(pk=order.pk).status, 'paid')
+        self.assertCounts(self.event, reserved=0, sold=1, quantity_available=4)
+
+    @skipIf(connection.vendor == 'postgresql', 'PostgreSQL 以 UPDATE ... SKIP LOCKED 處理，不會讀到舊狀態')
+    def test_order_paid_after_read_is_not_expired(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        self.overdue(order)
+
+        values_list = QuerySet.values_list
+        raced = []
+
+        def read_then_pay(queryset, *args, **kwargs):
+            if raced or queryset.model is not SalesOrder:
+                return values_list(queryset, *args, **kwargs)
+            rows = list(values_list(queryset, *args, **kwargs))
+            # 讀取待付款訂單之後、改為逾期之前，另一個程序完成付款
+            raced.append(True)
+            Client().get(f'/api/payment/callback/?order={order.order_number}&status=success')
+            return rows
+
+        with mock.patch.object(QuerySet, 'values_list', read_then_pay):
+            self.assertEqual(expire_pending_orders(), {})
+        self.assertEqual(SalesOrder.objects.get(pk=order.pk).status, 'paid')
+        self.assertCounts(self.event, reserved=0, sold=1, quantity_available=4)
@@ -0,0 +1,47 @@
+"""Idempotency-Key：重送回傳第一次的回應、key 依用戶端區分、在外層交易中宣告處理權"""
+from django.test import Client
+
+from shop.idempotency import DatabaseIdempotencyStore
+from shop.models import IdempotencyRecord, SalesOrder
+
+from .base import FlashSaleTestCase, create_event
+
+
+class IdempotencyTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.event = create_event()
+
+    def order(self, email, key='retry-1'):
+        return self.client.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': self.event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_first_response(self):
+        first = self.order('a@test.com')
+        self.assertEqual(first.status_code, 201)
+        retry = self.order('a@test.com')
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json()['order_number'], first.json()['order_number'])
+        self.assertEqual(SalesOrder.objects.count(), 1)
+
+    def test_key_is_scoped_to_client(self):
+        first = self.order('a@test.com')
+        other = self.order('b@test.com')
+        # 其他用戶使用相同的 key 不會取得第一個用戶的回應
+        self.assertEqual(other.status_code, 201)
+        self.assertFalse(other.has_header('Idempotent-Replayed'))
+        self.assertNotEqual(other.json()['order_number'], first.json()['order_number'])
+
+    def test_claim_conflict_keeps_outer_transaction_usable(self):
+        store = DatabaseIdempotencyStore()
+        self.assertIsNone(store.claim('scope:key', 'fingerprint'))
+        record = store.claim('scope:key', 'fingerprint')
+        self.assertIsNone(record.status_code)
+        # TestCase 的外層交易仍可使用
+        self.assertEqual(IdempotencyRecord.objects.count(), 1)
@@ -0,0 +1,56 @@
+"""ORDER_INLINE_ITEMS：單品訂單的明細記錄在訂單上，少一次寫入，之後再補建明細"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client
+
+from shop.models import SalesOrder, SalesOrderItem
+from shop.services import create_order
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings
+
+
+class InlineItemTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.event = create_event()
+
+    def order(self, email):
+        return self.client.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': self.event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json')
+
+    def test_create_order_skips_item_insert(self):
+        self.order('first@test.com')
+        # 與 test_query_counts 的一般下單（7 次）相比少了明細的 INSERT
+        with flash_sale_settings(ORDER_INLINE_ITEMS=True), self.assertNumQueries(6):
+            self.assertEqual(self.order('second@test.com').status_code, 201)
+        self.assertEqual(SalesOrderItem.objects.count(), 1)
+
+    def test_order_status_reads_inline_item(self):
+        with flash_sale_settings(ORDER_INLINE_ITEMS=True):
+            order_number = self.order('first@test.com').json()['order_number']
+        # 不查詢明細表
+        with self.assertNumQueries(1):
+            response = self.client.get(f'/api/order/{order_number}/status/')
+        self.assertEqual(len(response.json()['items']), 1)
+        self.assertEqual(response.json()['items'][0]['subtotal'], '100.00')
+
+    def test_backfill_order_items(self):
+        create_order('legacy@test.com', self.event.id, 'credit_card')
+        with flash_sale_settings(ORDER_INLINE_ITEMS=True):
+            inline = [create_order(f'{index}@test.com', self.event.id, 'credit_card') for index in range(3)]
+
+        call_command('backfill_order_items', batch_size=2, stdout=StringIO())
+        self.assertEqual(SalesOrderItem.objects.count(), 4)
+        for order in inline:
+            item = SalesOrderItem.objects.get(sales_order=order)
+            self.assertEqual((item.product_id, item.quantity, item.subtotal), (self.event.product_id, 1, 100))
+        # 重複執行不會重複建立
+        call_command('backfill_order_items', stdout=StringIO())
+        self.assertEqual(SalesOrderItem.objects.count(), 4)
+        self.assertEqual(SalesOrder.objects.count(), 4)
@@ -0,0 +1,80 @@
+"""Inventory 的預留方式：帶條件的 UPDATE、樂觀鎖與異動紀錄"""
+from unittest import mock
+
+from django.db.models import F
+from django.test import Client
+
+from shop import inventory
+from shop.models import Inventory
+from shop.services import OrderRejected, create_order
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings
+
+
+class ReserveModeTests(FlashSaleTestCase):
+
+    def test_conditional(self):
+        self.assertSellsOut()
+
+    def test_optimistic(self):
+        with flash_sale_settings(INVENTORY_RESERVE_MODE='optimistic'):
+            self.assertSellsOut()
+
+    def test_conditional_update_rejects_without_available_stock(self):
+        # 活動名額比 Inventory 多時，由 UPDATE 的條件擋下
+        event = create_event(quantity=2, on_hand=1)
+        create_order('a@test.com', event.id, 'credit_card')
+        with self.assertRaises(OrderRejected) as cm:
+            create_order('b@test.com', event.id, 'credit_card')
+        self.assertEqual(cm.exception.code, 'insufficient_inventory')
+        self.assertCounts(event, reserved=1, sold=0, quantity_available=0)
+
+    def test_optimistic_conflict_asks_to_retry(self):
+        event = create_event()
+        changes = inventory._changes
+
+        def concurrent_writer(*args, **kwargs):
+            # 讀取 version 之後、更新之前，其他交易先更新了這一列
+            Inventory.objects.filter(product_id=event.product_id).update(version=F('version') + 1)
+            return changes(*args, **kwargs)
+
+        with flash_sale_settings(INVENTORY_RESERVE_MODE='optimistic', INVENTORY_OPTIMISTIC_RETRIES=2), \
+                mock.patch.object(inventory, '_changes', concurrent_writer):
+            with self.assertRaises(OrderRejected) as cm:
+                create_order('a@test.com', event.id, 'credit_card')
+        self.assertEqual(cm.exception.code, 'busy')
+        self.assertCounts(event, reserved=0, sold=0, quantity_available=10)
+
+
+class LedgerTests(FlashSaleTestCase):
+    """異動紀錄模式：不更新 Inventory，彙總後數量一致"""
+
+    def setUp(self):
+        super().setUp()
+        settings_override = flash_sale_settings(INVENTORY_LEDGER=True)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_sells_out_and_compacts(self):
+        event = self.assertSellsOut()
+        row = Inventory.objects.get(product_id=event.product_id)
+        self.assertEqual(row.quantity_available, 2)
+
+        self.assertEqual(inventory.compact(), 2)
+        self.assertEqual(inventory.compact(), 0)
+        row.refresh_from_db()
+        self.assertEqual((row.quantity_reserved, row.quantity_available), (2, 0))
+        self.assertCounts(event, reserved=2, sold=0, quantity_available=0)
+
+    def test_payment_and_expiry_are_recorded(self):
+        event = create_event(quantity=3)
+        paid = create_order('a@test.com', event.id, 'credit_card')
+        failed = create_order('b@test.com', event.id, 'credit_card')
+        client = Client()
+        client.get(f'/api/payment/callback/?order={paid.order_number}&status=success')
+        client.get(f'/api/payment/callback/?order={failed.order_number}&status=failed')
+        self.assertCounts(event, reserved=0, sold=1, quantity_available=2)
+
+        inventory.compact()
+        row = Inventory.objects.get(product_id=event.product_id)
+        self.assertEqual((row.quantity_on_hand, row.quantity_reserved, row.quantity_available), (2, 0, 2))
@@ -0,0 +1,36 @@
+"""訂單編號：遞增、worker ID 範圍與重複時重試"""
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+
+from shop import services
+from shop.order_numbers import MAX_WORKER_ID, SnowflakeOrderNumberGenerator
+from shop.services import create_order
+
+from .base import FlashSaleTestCase, create_event
+
+
+class SnowflakeOrderNumberTests(SimpleTestCase):
+
+    def test_numbers_increase(self):
+        generator = SnowflakeOrderNumberGenerator(worker_id=1)
+        numbers = [generator.next() for _ in range(1000)]
+        self.assertEqual(numbers, sorted(numbers))
+        self.assertEqual(len(set(numbers)), len(numbers))
+
+    def test_worker_id_out_of_range(self):
+        with self.assertRaises(ImproperlyConfigured):
+            SnowflakeOrderNumberGenerator(worker_id=MAX_WORKER_ID + 1)
+
+
+class OrderNumberCollisionTests(FlashSaleTestCase):
+
+    def test_collision_retries_with_new_number(self):
+        event = create_event()
+        taken = create_order('a@test.com', event.id, 'credit_card').order_number
+        numbers = iter([taken, 'FRESH-ORDER-NUMBER'])
+        with mock.patch.object(services, 'next_order_number', lambda: next(numbers)):
+            order = create_order('b@test.com', event.id, 'credit_card')
+        self.assertEqual(order.order_number, 'FRESH-ORDER-NUMBER')
+        self.assertCounts(event, reserved=2, sold=0, quantity_available=8)
@@ -0,0 +1,61 @@
+"""訂單狀態快取：共用快取後端才啟用、付款後清除、命中統計"""
+import shutil
+import tempfile
+
+from django.test import Client, override_settings
+
+from shop import order_status_cache
+from shop.order_status_cache import get_order_status_cache
+from shop.services import create_order
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings
+
+
+class OrderStatusCacheTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # 以檔案快取代替共用的快取服務（LocMemCache 只存在程序內，不會啟用）
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir, ignore_errors=True)
+        for override in [
+            override_settings(CACHES={'default': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': cache_dir,
+            }}),
+            flash_sale_settings(ORDER_STATUS_CACHE_TTL=30),
+        ]:
+            override.enable()
+            self.addCleanup(override.disable)
+        self.client = Client()
+        self.order = create_order('a@test.com', create_event().id, 'credit_card')
+
+    def status(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.get(f'/api/order/{self.order.order_number}/status/')
+
+    def test_hit_after_miss_and_invalidated_by_payment(self):
+        self.assertEqual(self.status()['X-Cache'], 'MISS')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.status()['X-Cache'], 'HIT')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/payment/callback/?order={self.order.order_number}&status=success')
+        response = self.status()
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.json()['status'], 'paid')
+
+    def test_stats_endpoint(self):
+        self.status()
+        self.status()
+        stats = self.client.get('/api/order/status-cache/stats/').json()
+        self.assertTrue(stats['enabled'])
+        self.assertEqual((stats['hits'], stats['misses'], stats['hit_rate']), (1, 1, 0.5))
+
+    def test_process_local_cache_is_not_used(self):
+        with override_settings(CACHES={'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}):
+            order_status_cache._cache = None
+            self.assertIsNone(get_order_status_cache())
+            self.assertEqual(self.client.get('/api/order/status-cache/stats/').json(), {'enabled': False})
@@ -0,0 +1,54 @@
+"""批次付款通知：計數彙總與 SQL 數量不隨筆數增加"""
+from django.test import Client
+
+from shop.models import SalesOrder
+from shop.services import create_order
+
+from .base import FlashSaleTestCase, create_event
+
+
+class PaymentBatchTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.event = create_event(quantity=50)
+
+    def orders(self, count, offset=0):
+        return [
+            create_order(f'{offset + index}@test.com', self.event.id, 'credit_card').order_number
+            for index in range(count)
+        ]
+
+    def settle(self, order_numbers, payment_status):
+        return self.client.post('/api/payment/callback/batch/', {
+            'notifications': [
+                {'order_number': order_number, 'status': payment_status} for order_number in order_numbers
+            ],
+        }, content_type='application/json')
+
+    def test_mixed_batch(self):
+        paid, failed = self.orders(3), self.orders(2, offset=3)
+        response = self.settle(paid, 'success')
+        self.assertEqual([result['shipping_priority'] for result in response.json()['results']], [1, 2, 3])
+        response = self.settle(failed + paid[:1], 'failed')
+        self.assertEqual([result['success'] for result in response.json()['results']], [False] * 3)
+        self.assertEqual(SalesOrder.objects.filter(status='cancelled').count(), 2)
+        self.assertCounts(self.event, reserved=0, sold=3, quantity_available=47)
+
+    def test_query_count_does_not_grow_with_failures(self):
+        small, large = self.orders(5), self.orders(20, offset=5)
+        # 鎖定訂單、更新活動、讀取分桶、更新 Inventory、取消訂單各一次（加上 SAVEPOINT／RELEASE）
+        with self.assertNumQueries(7):
+            self.settle(small, 'failed')
+        with self.assertNumQueries(7):
+            self.settle(large, 'failed')
+        self.assertCounts(self.event, reserved=0, sold=0, quantity_available=50)
+
+    def test_query_count_does_not_grow_with_payments(self):
+        small, large = self.orders(5), self.orders(20, offset=5)
+        with self.assertNumQueries(7):
+            self.settle(small, 'success')
+        with self.assertNumQueries(7):
+            self.settle(large, 'success')
+        self.assertCounts(self.event, reserved=0, sold=25, quantity_available=25)
@@ -0,0 +1,84 @@
+"""
+各 API 每次請求的 SQL 數量
+
+數量包含 TestCase 交易中 transaction.atomic() 產生的 SAVEPOINT／RELEASE。
+新增查詢時若是刻意的，請同時更新這裡的數字（python manage.py report_query_counts --verbose-sql 可列出 SQL）。
+
+與加入活動中繼資料快取前比較（同樣在 TestCase 中以 SQLite 量測）：
+
+    API                       最初版本   中繼資料快取前   目前
+    下單（第一筆）                10           11           8
+    下單（之後）                  10           10           7
+    付款回調（成功）              10           10           7
+
+快取前每筆下單都要重新讀取活動，並為 Inventory、訂單金額與訂單明細各載入一次商品；
+目前只有快取過期時讀一次活動與商品（見 test_create_order_cold_metadata）。
+"""
+from django.test import Client
+
+from shop.event_meta import invalidate_event
+from shop.models import SalesOrder
+
+from .base import FlashSaleTestCase, create_event
+
+
+class QueryCountTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.event = create_event()
+
+    def order(self, email):
+        return self.client.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': self.event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json')
+
+    def test_create_order(self):
+        # 活動中繼資料、鎖定活動、預留 Inventory、更新活動、寫入訂單與明細
+        with self.assertNumQueries(8):
+            self.assertEqual(self.order('first@test.com').status_code, 201)
+        # 中繼資料已快取
+        with self.assertNumQueries(7):
+            self.assertEqual(self.order('second@test.com').status_code, 201)
+
+    def test_create_order_cold_metadata(self):
+        self.order('first@test.com')
+        # 快取失效時的路徑：多一次讀取活動與商品
+        invalidate_event(self.event.id)
+        with self.assertNumQueries(8):
+            self.assertEqual(self.order('second@test.com').status_code, 201)
+
+    def test_duplicate_order(self):
+        self.order('first@test.com')
+        # 唯一索引擋下後回滾，再確認是重複下單
+        with self.assertNumQueries(8):
+            self.assertEqual(self.order('first@test.com').status_code, 400)
+
+    def test_payment_callback(self):
+        order_number = self.order('first@test.com').json()['order_number']
+        with self.assertNumQueries(7):
+            response = self.client.get(f'/api/payment/callback/?order={order_number}&status=success')
+        self.assertEqual(response.json()['shipping_priority'], 1)
+
+    def test_order_status(self):
+        order_number = self.order('first@test.com').json()['order_number']
+        # 訂單與商品一起讀取，明細另外一次
+        with self.assertNumQueries(2):
+            self.assertEqual(self.client.get(f'/api/order/{order_number}/status/').status_code, 200)
+
+    def test_event_status_micro_cache(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(f'/api/flash-sale/{self.event.id}/status/').status_code, 200)
+        # STATUS_CACHE_TTL 內不再讀資料庫
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(f'/api/flash-sale/{self.event.id}/status/').status_code, 200)
+
+    def test_user_orders(self):
+        self.order('first@test.com')
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/user/orders/?email=first@test.com')
+        self.assertEqual(len(response.json()['orders']), 1)
+        self.assertEqual(SalesOrder.objects.count(), 1)
@@ -0,0 +1,57 @@
+from unittest import mock
+
+from django.test import RequestFactory, SimpleTestCase
+
+from shop import rate_limit
+from shop.rate_limit import LocalRateLimiter, _client_ip
+
+
+class ClientIpTests(SimpleTestCase):
+
+    def request(self, forwarded=None):
+        headers = {'HTTP_X_FORWARDED_FOR': forwarded} if forwarded is not None else {}
+        return RequestFactory().get('/', REMOTE_ADDR='10.0.0.1', **headers)
+
+    def test_without_trusted_proxies_ignores_header(self):
+        self.assertEqual(_client_ip(self.request('1.1.1.1'), 0), '10.0.0.1')
+
+    def test_uses_address_recorded_by_last_proxy(self):
+        # 最左邊由用戶端自行填寫，換 IP 也不會繞過限制
+        self.assertEqual(_client_ip(self.request('6.6.6.6, 2.2.2.2'), 1), '2.2.2.2')
+        self.assertEqual(_client_ip(self.request('6.6.6.6, 2.2.2.2, 172.16.0.1'), 2), '2.2.2.2')
+
+    def test_short_header_falls_back_to_remote_addr(self):
+        self.assertEqual(_client_ip(self.request('2.2.2.2'), 2), '10.0.0.1')
+        self.assertEqual(_client_ip(self.request(), 1), '10.0.0.1')
+
+
+class LocalRateLimiterTests(SimpleTestCase):
+
+    def test_rejected_request_does_not_consume_other_buckets(self):
+        limiter = LocalRateLimiter(max_keys=100)
+        self.assertEqual(limiter.hit('email:a', 0.001, 1), 0)
+        # email 已用完，IP 的權杖不應被扣
+        self.assertGreater(limiter.hit_many([('email:a', 0.001, 1), ('ip:x', 0.001, 1)]), 0)
+        self.assertEqual(limiter.hit('ip:x', 0.001, 1), 0)
+        self.assertGreater(limiter.hit('ip:x', 0.001, 1), 0)
+
+    def test_flooding_keys_does_not_reset_limited_bucket(self):
+        limiter = LocalRateLimiter(max_keys=50)
+        self.assertEqual(limiter.hit('email:victim', 0.001, 1), 0)
+        for index in range(500):
+            limiter.hit(f'ip:{index}', 100, 200)
+            if index % 10 == 0:
+                # 超過額度的用戶仍然被拒絕，不會因為記錄數達到上限而重置
+                self.assertGreater(limiter.hit('email:victim', 0.001, 1), 0)
+        self.assertLessEqual(len(limiter._buckets), 50)
+
+    def test_full_buckets_are_evicted_first(self):
+        limiter = LocalRateLimiter(max_keys=2)
+        with mock.patch.object(rate_limit.time, 'monotonic', return_value=0):
+            limiter.hit('ip:fast', 100, 1)
+            limiter.hit('email:slow', 0.001, 1)
+        # 'ip:fast' 已補滿，以它自己的速率判斷；'email:slow' 仍然超過額度
+        with mock.patch.object(rate_limit.time, 'monotonic', return_value=1):
+            limiter.hit('ip:new', 100, 1)
+            self.assertGreater(limiter.hit('email:slow', 0.001, 1), 0)
+        self.assertNotIn('ip:fast', limiter._buckets)
@@ -0,0 +1,76 @@
+"""重複下單預先過濾：其他程序付款失敗後可以重新下單、記錄數有上限"""
+import time
+from unittest import mock
+
+from django.test import Client, SimpleTestCase
+
+from shop import seen_emails
+from shop.seen_emails import SeenEmailFilter
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings
+
+
+class SeenEmailOrderTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = flash_sale_settings(SEEN_EMAILS_FILTER=True, SEEN_EMAILS_TTL=10)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = Client()
+        self.event = create_event()
+
+    def order(self, email='a@test.com'):
+        # 過濾器在交易提交後才記住 email
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post('/api/flash-sale/order/', {
+                'user_email': email,
+                'flash_sale_event_id': self.event.id,
+                'payment_method': 'credit_card',
+            }, content_type='application/json')
+
+    def pay(self, order_number, payment_status):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.get(f'/api/payment/callback/?order={order_number}&status={payment_status}')
+
+    def pay_in_other_process(self, order_number, payment_status):
+        # 其他程序的過濾器不是這一個，這裡的記錄不會被移除
+        local_filter = seen_emails.get_seen_emails()
+        seen_emails._filter = SeenEmailFilter()
+        try:
+            self.pay(order_number, payment_status)
+        finally:
+            seen_emails._filter = local_filter
+
+    def later(self, seconds):
+        return mock.patch.object(seen_emails.time, 'time', return_value=time.time() + seconds)
+
+    def test_reorder_after_failed_payment_in_other_process(self):
+        order_number = self.order().json()['order_number']
+        # 重複點擊在過濾器擋下，不碰資料庫
+        with self.assertNumQueries(0):
+            self.assertEqual(self.order().status_code, 400)
+
+        self.pay_in_other_process(order_number, 'failed')
+        # 待付款的訂單只記住 SEEN_EMAILS_TTL 秒，不會擋到原本的付款期限
+        with self.later(11):
+            self.assertEqual(self.order().status_code, 201)
+
+    def test_paid_order_is_remembered_until_event_end(self):
+        order_number = self.order().json()['order_number']
+        self.pay(order_number, 'success')
+        with self.later(600):
+            self.assertTrue(seen_emails.get_seen_emails().contains(self.event.id, 'a@test.com'))
+
+
+class SeenEmailFilterTests(SimpleTestCase):
+
+    def test_prunes_expired_entries_when_full(self):
+        seen = SeenEmailFilter(max_keys=2)
+        with mock.patch.object(seen_emails.time, 'time', return_value=100):
+            seen.add(1, 'old@test.com')
+        seen.add(1, 'a@test.com')
+        seen.add(1, 'b@test.com')
+        self.assertFalse(seen.contains(1, 'old@test.com'))
+        self.assertTrue(seen.contains(1, 'a@test.com'))
+        self.assertTrue(seen.contains(1, 'b@test.com'))
@@ -0,0 +1,64 @@
+"""出貨順位：付款時遞增發出、升級時的序號回填"""
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import Client
+
+from shop.models import FlashSaleEvent, SalesOrder
+from shop.services import create_order
+
+from .base import FlashSaleTestCase, create_event
+
+
+class ShippingPriorityTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client = Client()
+        self.event = create_event()
+
+    def pay(self, order):
+        return self.client.get(f'/api/payment/callback/?order={order.order_number}&status=success')
+
+    def paid_order(self, email):
+        order = create_order(email, self.event.id, 'credit_card')
+        self.pay(order)
+        return SalesOrder.objects.get(pk=order.pk)
+
+    def backfill(self, *args):
+        call_command('backfill_paid_sequence', *args, stdout=StringIO())
+        return FlashSaleEvent.objects.get(pk=self.event.pk).paid_sequence
+
+    def test_payment_moves_reservation_to_sold(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        response = self.pay(order)
+        self.assertEqual(response.json()['shipping_priority'], 1)
+        self.assertCounts(self.event, reserved=0, sold=1, quantity_available=9)
+
+    def test_failed_payment_releases_stock(self):
+        order = create_order('a@test.com', self.event.id, 'credit_card')
+        self.client.get(f'/api/payment/callback/?order={order.order_number}&status=failed')
+        self.assertCounts(self.event, reserved=0, sold=0, quantity_available=10)
+
+    def test_backfill_counts_shipped_orders(self):
+        self.paid_order('a@test.com')
+        latest = self.paid_order('b@test.com')
+        SalesOrder.objects.filter(pk=latest.pk).update(status='shipped')
+        FlashSaleEvent.objects.filter(pk=self.event.pk).update(paid_sequence=0)
+
+        self.assertEqual(self.backfill(), 2)
+        # 下一筆付款不會拿到已出貨訂單的順位
+        self.assertEqual(self.paid_order('c@test.com').shipping_priority, 3)
+
+    def test_renumber_keeps_existing_priorities(self):
+        shipped = self.paid_order('a@test.com')
+        duplicate = self.paid_order('b@test.com')
+        missing = self.paid_order('c@test.com')
+        SalesOrder.objects.filter(pk=shipped.pk).update(status='completed', shipping_priority=5)
+        # 舊版可能發出重複或沒有發出順位
+        SalesOrder.objects.filter(pk=duplicate.pk).update(shipping_priority=5)
+        SalesOrder.objects.filter(pk=missing.pk).update(shipping_priority=None)
+
+        self.assertEqual(self.backfill('--renumber'), 7)
+        priorities = dict(SalesOrder.objects.values_list('pk', 'shipping_priority'))
+        self.assertEqual(priorities, {shipped.pk: 5, duplicate.pk: 6, missing.pk: 7})
@@ -0,0 +1,60 @@
+"""ORDER_RESERVE_MODE='split'：預留與寫入訂單分成兩個交易，失敗時以補償交易歸還"""
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import IntegrityError
+from django.test import TransactionTestCase
+
+from shop import services
+from shop.models import FlashSaleEvent, Product, SalesOrder
+from shop.services import OrderRejected, create_order
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings, reset_process_state
+
+
+class SplitReserveTests(FlashSaleTestCase):
+
+    def setUp(self):
+        super().setUp()
+        settings_override = flash_sale_settings(ORDER_RESERVE_MODE='split')
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_sells_out(self):
+        self.assertSellsOut()
+
+    def test_duplicate_returns_reservation(self):
+        event = create_event(quantity=2)
+        create_order('a@test.com', event.id, 'credit_card')
+        with self.assertRaises(OrderRejected) as cm:
+            create_order('a@test.com', event.id, 'credit_card')
+        self.assertEqual(cm.exception.code, 'duplicate')
+        self.assertCounts(event, reserved=1, sold=0, quantity_available=1)
+
+    def test_failed_insert_returns_reservation(self):
+        event = create_event(quantity=2)
+        with mock.patch.object(services, '_save_order', side_effect=IntegrityError('寫入失敗')):
+            with self.assertRaises(IntegrityError):
+                create_order('a@test.com', event.id, 'credit_card')
+        self.assertCounts(event, reserved=0, sold=0, quantity_available=2)
+
+
+class OrderLockHoldBenchTests(TransactionTestCase):
+    """壓測指令需要實際提交交易（鎖的持有時間在提交後記錄）"""
+
+    def setUp(self):
+        reset_process_state()
+        self.addCleanup(reset_process_state)
+
+    def test_bench_cleans_up(self):
+        out = StringIO()
+        call_command('bench_order_lock_hold', orders=5, stdout=out)
+        self.assertIn('split', out.getvalue())
+        # 壓測用的商品、活動與訂單都已刪除，設定也已還原
+        self.assertFalse(Product.objects.exists())
+        self.assertFalse(FlashSaleEvent.objects.exists())
+        self.assertFalse(SalesOrder.objects.exists())
+        self.assertEqual(services._lock_event.__name__, '_lock_event')
+        self.assertEqual(settings.FLASH_SALE.get('ORDER_RESERVE_MODE', 'single'), 'single')
@@ -0,0 +1,60 @@
+"""庫存閘門：令牌校正與共享計數無法連線時的下單"""
+from django.test import Client
+
+from shop import stock_gate
+from shop.stock_gate import LocalStockGate, RedisStockGate
+
+from .base import FlashSaleTestCase, create_event, flash_sale_settings
+
+
+class LocalStockGateTests(FlashSaleTestCase):
+
+    def test_resync_after_tokens_run_out(self):
+        event = create_event(quantity=1)
+        with flash_sale_settings(STOCK_GATE_RESYNC_INTERVAL=60):
+            gate = LocalStockGate()
+        # 令牌用完，但庫存已由其他程序釋放：以資料庫重新校正一次
+        gate.load(event.id, 0)
+        self.assertTrue(gate.acquire(event.id))
+        # 校正間隔內不會再查資料庫
+        gate.load(event.id, 0, force=True)
+        with self.assertNumQueries(0):
+            self.assertFalse(gate.acquire(event.id))
+
+    def test_stale_tokens_are_reloaded(self):
+        event = create_event(quantity=3)
+        with flash_sale_settings(STOCK_GATE_RESYNC_INTERVAL=0):
+            gate = LocalStockGate()
+        gate.load(event.id, 0)
+        self.assertIsNone(gate.remaining(event.id))
+        self.assertTrue(gate.acquire(event.id))
+
+
+class UnavailableStockGateTests(FlashSaleTestCase):
+    """共享計數連不上時不回應 500，改由資料庫交易把關"""
+
+    def setUp(self):
+        super().setUp()
+        # 沒有服務在聽的位址
+        stock_gate._gate = RedisStockGate('redis://127.0.0.1:1/0')
+        self.client = Client()
+
+    def order(self, event, email):
+        return self.client.post('/api/flash-sale/order/', {
+            'user_email': email,
+            'flash_sale_event_id': event.id,
+            'payment_method': 'credit_card',
+        }, content_type='application/json')
+
+    def test_order_falls_back_to_database(self):
+        event = create_event(quantity=1)
+        self.assertEqual(self.order(event, 'a@test.com').status_code, 201)
+        response = self.order(event, 'b@test.com')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['error'], '商品已售罄')
+        self.assertCounts(event, reserved=1, sold=0, quantity_available=0)
+
+    def test_release_and_remaining_do_not_raise(self):
+        event = create_event()
+        stock_gate._gate.release(event.id)
+        self.assertIsNone(stock_gate._gate.remaining(event.id))
@@ -3,13 +3,18 @@ from . import views
 
 urlpatterns = [
     path('flash-sale/order/', views.create_flash_sale_order, name='create_flash_sale_order'),
+    path('flash-sale/<int:event_id>/queue/', views.join_waiting_room, name='join_waiting_room'),
+    path('flash-sale/ticket/<uuid:ticket_id>/', views.order_ticket_status, name='order_ticket_status'),
 
     path('payment/simulate/', views.simulate_payment, name='simulate_payment'),
     path('payment/callback/', views.payment_callback, name='payment_callback'),
+    path('payment/callback/batch/', views.payment_callback_batch, name='payment_callback_batch'),
 
+    path('order/status-cache/stats/', views.order_status_cache_stats, name='order_status_cache_stats'),
     path('order/<str:order_number>/status/', views.check_order_status, name='check_order_status'),
     path('user/orders/', views.user_orders, name='user_orders'),
 
     path('flash-sale/<int:event_id>/status/', views.flash_sale_status, name='flash_sale_status'),
+    path('flash-sale/<int:event_id>/stream/', views.flash_sale_stream, name='flash_sale_stream'),
 ]
 
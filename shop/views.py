@@ -1,24 +1,54 @@
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
+from django.core.handlers.asgi import ASGIRequest
 from django.db import transaction
-from django.db.models import F
+from django.db.models import Q
+from django.http import HttpResponse, HttpResponseNotModified, JsonResponse, StreamingHttpResponse
 from django.utils import timezone
-from datetime import timedelta
-import uuid
-
-from .models import Product, Inventory, FlashSaleEvent, SalesOrder, SalesOrderItem
+from django.utils.cache import patch_cache_control
+from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
+from datetime import datetime
+import math
+import os
+import time
+
+from asgiref.sync import sync_to_async
+
+from .conf import get_setting
+from .db_router import reading_from_replica, use_primary
+from .models import FlashSaleEvent, SalesOrder, OrderTicket
+from .event_meta import get_event_meta
+from .group_commit import get_group_commit_writer
+from .idempotency import idempotent
+from .order_status_cache import get_order_status_cache, order_status_message, order_status_payload
+from .services import (
+    OrderRejected, confirm_sale, create_order, expire_if_overdue, queued_ticket_position,
+    reclaim_expired_stock, release_reservation, settle_payments,
+)
+from .seen_emails import get_seen_emails
+from .sold_out import get_sold_out_cache
+from .status_cache import get_status_cache
+from .status_stream import ClientDisconnected, client_disconnected, next_update, subscribe, unsubscribe
+from .stock_gate import StockGateUnavailable, get_stock_gate
+from .waiting_room import (
+    AdmissionDenied, get_waiting_room, issue_admission_token, issue_queue_token,
+    read_queue_token, verify_admission_token,
+)
 
 
 @api_view(['POST'])
+@idempotent('create_flash_sale_order')
 def create_flash_sale_order(request):
     """
     建立搶購訂單 API
     POST /api/flash-sale/order/
+    Headers: Idempotency-Key（可選，重送時回傳第一次的結果）
     Body: {
         "user_email": "user@example.com",
         "flash_sale_event_id": 1,
-        "payment_method": "credit_card"  # or "line_pay"
+        "payment_method": "credit_card",  # or "line_pay"
+        "admission_token": "..."  # 開啟排隊室時必填
     }
     """
     user_email = request.data.get('user_email')
@@ -38,100 +68,278 @@ def create_flash_sale_order(request):
         )
 
     try:
-        with transaction.atomic():
-            # 鎖定活動記錄（防止併發）
-            event: FlashSaleEvent
-            event = FlashSaleEvent.objects.select_for_update().get(id=event_id)
+        event_id = int(event_id)
+    except (TypeError, ValueError):
+        return Response(
+            {'error': '活動編號不正確'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-            # 檢查活動是否有效
-            if not event.is_active():
-                return Response(
-                    {'error': '活動尚未開始或已結束'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    # 開啟排隊室時，只接受已放行的用戶
+    waiting_room = get_waiting_room()
+    if waiting_room is not None:
+        try:
+            verify_admission_token(request.data.get('admission_token'), event_id, user_email)
+        except AdmissionDenied as e:
+            return Response(
+                {'error': e.message},
+                status=status.HTTP_403_FORBIDDEN
+            )
 
-            # 檢查是否還有庫存（防止超賣）
-            if not event.has_stock():
-                return Response(
-                    {'error': '商品已售罄'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    # 已經有進行中訂單的用戶重複點擊，直接回應
+    if get_seen_emails().contains(event_id, user_email):
+        return Response(
+            {'error': '您已經有一筆進行中的訂單'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-            # 檢查用戶是否已經下過單
-            existing_order = SalesOrder.objects.filter(
-                user_email=user_email,
-                flash_sale_event=event,
-                status__in=['pending', 'paid']
-            ).exists()
+    # 已知售罄時直接回應，不碰資料庫（除非有逾期未釋放的訂單可以回收）
+    if get_sold_out_cache().is_sold_out(event_id) and not reclaim_expired_stock(event_id):
+        return Response(
+            {'error': '商品已售罄'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-            if existing_order:
-                return Response(
-                    {'error': '您已經有一筆進行中的訂單'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    stock_gate = get_stock_gate()
 
-            # 鎖定庫存
-            inventory = Inventory.objects.select_for_update().get(product=event.product)
+    if get_setting('ORDER_INTAKE_MODE') == 'async':
+        return _enqueue_order(stock_gate, user_email, event_id, payment_method)
 
-            if inventory.quantity_available < 1:
-                return Response(
-                    {'error': '庫存不足'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    holds_stock_token = True
+    try:
+        # 先扣庫存令牌，拿不到令牌（且沒有逾期訂單可以回收）直接回應售罄，不碰資料庫交易
+        if not stock_gate.acquire(event_id) and not (
+            reclaim_expired_stock(event_id) and stock_gate.acquire(event_id)
+        ):
+            return Response(
+                {'error': '商品已售罄'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    except FlashSaleEvent.DoesNotExist:
+        return Response(
+            {'error': '活動不存在'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except StockGateUnavailable:
+        # 閘門無法連線：沒有扣到令牌，直接由資料庫交易判斷庫存
+        holds_stock_token = False
 
-            # 更新庫存（預留）
-            inventory.quantity_reserved += 1
-            inventory.quantity_available = inventory.quantity_on_hand - inventory.quantity_reserved
-            inventory.save()
+    order_created = False
+    started_at = time.perf_counter()
+    try:
+        order = _submit_order(user_email, event_id, payment_method)
+        order_created = True
+        return Response({
+            'success': True,
+            'order_number': order.order_number,
+            'payment_deadline': order.payment_deadline,
+            'payment_method': payment_method,
+            'total_amount': str(order.total_amount),
+            'message': '訂單建立成功，請在1小時內完成付款'
+        }, status=status.HTTP_201_CREATED)
 
-            # 更新活動預留數量（使用資料庫原子更新，避免併發競爭）
-            FlashSaleEvent.objects.filter(pk=event.pk).update(
-                reserved_quantity=F('reserved_quantity') + 1
-            )
+    except OrderRejected as e:
+        return Response(
+            {'error': e.message},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except FlashSaleEvent.DoesNotExist:
+        return Response(
+            {'error': '活動不存在'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+    except Exception as e:
+        return Response(
+            {'error': f'系統錯誤: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    finally:
+        # 交易沒有成立訂單（被拒絕或失敗），歸還令牌
+        if not order_created and holds_stock_token:
+            stock_gate.release(event_id)
+        # 下單耗時回饋給排隊室調整放行速率
+        if waiting_room is not None:
+            waiting_room.record_latency(event_id, time.perf_counter() - started_at)
+
+
+def _submit_order(user_email, event_id, payment_method):
+    """下單；資料庫判斷售罄時，先回收已逾期的訂單再試一次"""
+    writer = get_group_commit_writer()
+    submit = writer.submit if writer is not None else create_order
+    try:
+        return submit(user_email, event_id, payment_method)
+    except OrderRejected as e:
+        if e.code != 'sold_out' or not reclaim_expired_stock(event_id):
+            raise
+    return submit(user_email, event_id, payment_method)
 
-            # 建立訂單
-            order_number = f"FS{timezone.now().strftime('%Y%m%d')}{uuid.uuid4().hex[:8].upper()}"
-            payment_deadline = timezone.now() + timedelta(hours=1)
-
-            order = SalesOrder.objects.create(
-                order_number=order_number,
-                user_email=user_email,
-                flash_sale_event=event,
-                payment_method=payment_method,
-                payment_deadline=payment_deadline,
-                status='pending',
-                total_amount=event.product.price
-            )
 
-            # 建立訂單明細
-            SalesOrderItem.objects.create(
-                sales_order=order,
-                product=event.product,
-                quantity=1,
-                unit_price=event.product.price,
-                subtotal=event.product.price
-            )
+@api_view(['POST'])
+def join_waiting_room(request, event_id):
+    """
+    排隊取得入場資格
+    POST /api/flash-sale/{event_id}/queue/
+    Body: {
+        "user_email": "user@example.com",
+        "queue_token": "..."  # 第一次排隊時不用帶，之後帶上次回應的 queue_token
+    }
+    """
+    user_email = request.data.get('user_email')
+    if not user_email:
+        return Response(
+            {'error': '缺少必要參數'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-            return Response({
-                'success': True,
-                'order_number': order.order_number,
-                'payment_deadline': payment_deadline,
-                'payment_method': payment_method,
-                'total_amount': str(order.total_amount),
-                'message': '訂單建立成功，請在1小時內完成付款'
-            }, status=status.HTTP_201_CREATED)
+    waiting_room = get_waiting_room()
+    if waiting_room is None:
+        return Response({
+            'admitted': True,
+            'message': '目前不需要排隊，請直接下單'
+        })
 
+    try:
+        meta = get_event_meta(event_id)
     except FlashSaleEvent.DoesNotExist:
         return Response(
             {'error': '活動不存在'},
             status=status.HTTP_404_NOT_FOUND
         )
+
+    now = timezone.now()
+    if meta.status != 'active' or now > meta.end_time:
+        return Response(
+            {'error': '活動未開放'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    # 已知售罄後不再發號碼與入場資格
+    if get_sold_out_cache().is_sold_out(event_id) or get_stock_gate().remaining(event_id) == 0:
+        return Response(
+            {'error': '商品已售罄'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    queue_token = request.data.get('queue_token')
+    position = read_queue_token(queue_token, event_id, user_email) if queue_token else None
+    if position is None:
+        position = waiting_room.join(event_id)
+        queue_token = issue_queue_token(event_id, user_email, position)
+
+    # 活動開始前可以排隊，但不放行
+    started = meta.start_time <= now
+    admitted = waiting_room.admitted(event_id) if started else 0
+
+    if position <= admitted:
+        return Response({
+            'admitted': True,
+            'admission_token': issue_admission_token(event_id, user_email),
+            'expires_in': get_setting('WAITING_ROOM_ADMISSION_TTL'),
+            'message': '輪到您了，請在時間內完成下單'
+        })
+
+    ahead = position - admitted - 1
+    if started:
+        retry_after = max(1, math.ceil((ahead + 1) / waiting_room.rate(event_id)))
+    else:
+        retry_after = max(1, math.ceil((meta.start_time - now).total_seconds()))
+    response = Response({
+        'admitted': False,
+        'position': position,
+        'ahead': ahead,
+        'queue_token': queue_token,
+        'retry_after': retry_after,
+        'message': f'⏳ 排隊中，前面還有 {ahead} 人' if started else '⏳ 活動尚未開始，已為您保留排隊號碼'
+    })
+    # 以預估等待時間提示下次查詢，避免用戶端過度輪詢
+    response['Retry-After'] = str(min(retry_after, 5))
+    return response
+
+
+def _enqueue_order(stock_gate, user_email, event_id, payment_method):
+    """非同步收單：寫入排隊單後立即回應 202"""
+    # 非共享的令牌無法由處理排隊單的 worker 歸還，只在共享閘門時先扣令牌
+    holds_stock_token = False
+    if stock_gate.shared:
+        try:
+            if not stock_gate.acquire(event_id):
+                return Response(
+                    {'error': '商品已售罄'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        except FlashSaleEvent.DoesNotExist:
+            return Response(
+                {'error': '活動不存在'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except StockGateUnavailable:
+            # 閘門無法連線：不扣令牌，由處理排隊單時的資料庫交易判斷庫存
+            pass
+        else:
+            holds_stock_token = True
+
+    try:
+        ticket = OrderTicket.objects.create(
+            user_email=user_email,
+            event_id=event_id,
+            payment_method=payment_method,
+            holds_stock_token=holds_stock_token,
+        )
     except Exception as e:
+        if holds_stock_token:
+            stock_gate.release(event_id)
         return Response(
             {'error': f'系統錯誤: {str(e)}'},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+    return Response({
+        'success': True,
+        'ticket_id': ticket.ticket_id,
+        'status': ticket.status,
+        'message': '已收到您的訂單，排隊處理中，請稍後查詢結果'
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def order_ticket_status(request, ticket_id):
+    """
+    查詢非同步下單結果
+    GET /api/flash-sale/ticket/{ticket_id}/
+    """
+    try:
+        ticket = OrderTicket.objects.select_related('order').get(ticket_id=ticket_id)
+    except OrderTicket.DoesNotExist:
+        return Response(
+            {'error': '排隊單不存在'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    response_data = {
+        'ticket_id': ticket.ticket_id,
+        'status': ticket.status,
+        'status_display': ticket.get_status_display(),
+        'created_at': ticket.created_at,
+        'processed_at': ticket.processed_at,
+    }
+
+    if ticket.status == 'queued':
+        # 以隊伍最前面的排隊單 ID 推算大約的順位，不對整個隊伍 COUNT
+        response_data['position'] = queued_ticket_position(ticket.id)
+        response_data['message'] = f'⏳ 排隊中，前面大約還有 {response_data["position"] - 1} 筆'
+    elif ticket.status == 'succeeded':
+        response_data.update({
+            'order_number': ticket.order.order_number,
+            'payment_deadline': ticket.order.payment_deadline,
+            'payment_method': ticket.order.payment_method,
+            'total_amount': str(ticket.order.total_amount),
+            'message': ticket.message,
+        })
+    else:
+        response_data['error'] = ticket.message
+
+    return Response(response_data)
+
 
 @api_view(['POST'])
 def simulate_payment(request):
@@ -161,6 +369,8 @@ def simulate_payment(request):
             )
 
         if order.is_expired():
+            # 順便釋放逾期訂單的庫存，不必等批次釋放
+            expire_if_overdue(order)
             return Response(
                 {'error': '訂單已逾期'},
                 status=status.HTTP_400_BAD_REQUEST
@@ -185,10 +395,12 @@ def simulate_payment(request):
 
 
 @api_view(['GET', 'POST'])
+@idempotent('payment_callback')
 def payment_callback(request):
     """
     接收金流付款成功通知
     GET/POST /api/payment/callback/
+    Headers: Idempotency-Key（可選，重送時回傳第一次的結果）
     Params: order=FS202411210001ABCD&status=success
     """
     order_number = request.GET.get('order') or request.data.get('order_number')
@@ -216,31 +428,12 @@ def payment_callback(request):
                 order.status = 'paid'
                 order.paid_at = paid_time
 
-                # 計算出貨順位（已付款訂單中的排序）
-                shipping_priority = SalesOrder.objects.filter(
-                    flash_sale_event=order.flash_sale_event,
-                    status='paid',
-                    paid_at__lt=paid_time
-                ).count() + 1
+                # 預留轉為售出，並依付款順序發出出貨順位（活動的遞增序號）
+                shipping_priority = confirm_sale(order)
 
                 order.shipping_priority = shipping_priority
                 order.save()
 
-                # 更新庫存（從預留變成實際銷售）
-                inventory = Inventory.objects.select_for_update().get(
-                    product=order.flash_sale_event.product
-                )
-                inventory.quantity_reserved -= 1
-                inventory.quantity_on_hand -= 1
-                inventory.quantity_available = inventory.quantity_on_hand - inventory.quantity_reserved
-                inventory.save()
-
-                # 更新活動統計（原子更新，避免遺失更新）
-                FlashSaleEvent.objects.filter(pk=order.flash_sale_event_id).update(
-                    reserved_quantity=F('reserved_quantity') - 1,
-                    sold_quantity=F('sold_quantity') + 1,
-                )
-
                 return Response({
                     'success': True,
                     'message': '付款成功！',
@@ -253,17 +446,7 @@ def payment_callback(request):
                 order.status = 'cancelled'
                 order.save()
 
-                inventory = Inventory.objects.select_for_update().get(
-                    product=order.flash_sale_event.product
-                )
-                inventory.quantity_reserved -= 1
-                inventory.quantity_available = inventory.quantity_on_hand - inventory.quantity_reserved
-                inventory.save()
-
-                # 釋放活動預留數量（原子更新）
-                FlashSaleEvent.objects.filter(pk=order.flash_sale_event_id).update(
-                    reserved_quantity=F('reserved_quantity') - 1
-                )
+                release_reservation(order)
 
                 return Response({
                     'success': False,
@@ -277,60 +460,128 @@ def payment_callback(request):
         )
 
 
+@api_view(['POST'])
+@idempotent('payment_callback_batch')
+def payment_callback_batch(request):
+    """
+    接收金流批次付款通知
+    POST /api/payment/callback/batch/
+    Body: {
+        "notifications": [
+            {"order_number": "FS202411210001ABCD", "status": "success"},
+            ...
+        ]
+    }
+    """
+    notifications = request.data.get('notifications')
+
+    if not isinstance(notifications, list) or not notifications:
+        return Response(
+            {'error': '缺少付款通知'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    max_batch = get_setting('PAYMENT_BATCH_MAX')
+    if len(notifications) > max_batch:
+        return Response(
+            {'error': f'每批最多 {max_batch} 筆付款通知'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not all(isinstance(item, dict) and item.get('order_number') for item in notifications):
+        return Response(
+            {'error': '缺少訂單編號'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    results = settle_payments([
+        (str(item['order_number']), item.get('status') == 'success') for item in notifications
+    ])
+
+    return Response({
+        'success': True,
+        'paid': sum(1 for result in results if result['success']),
+        'results': results,
+    })
+
+
 @api_view(['GET'])
 def check_order_status(request, order_number):
     """
     查詢訂單狀態與出貨順位
     GET /api/order/{order_number}/status/
+    回應標頭 X-Cache: HIT / MISS
     """
-    try:
-        order = SalesOrder.objects.select_related(
-            'flash_sale_event',
-            'flash_sale_event__product'
-        ).get(order_number=order_number)
-
-        response_data = {
-            'order_number': order.order_number,
-            'user_email': order.user_email,
-            'status': order.status,
-            'status_display': order.get_status_display(),
-            'created_at': order.created_at,
-            'payment_deadline': order.payment_deadline,
-            'paid_at': order.paid_at,
-            'shipping_priority': order.shipping_priority,
-            'total_amount': str(order.total_amount),
-            'payment_method': order.get_payment_method_display() if order.payment_method else None,
-        }
-
-        # 如果訂單已付款，顯示出貨順位
-        if order.status == 'paid' and order.shipping_priority:
-            response_data['message'] = f'🎉 搶購成功！您的出貨順位是第 {order.shipping_priority} 位'
-        elif order.status == 'pending':
-            if order.is_expired():
-                response_data['message'] = '⏰ 訂單已逾期'
-            else:
-                remaining_time = order.payment_deadline - timezone.now()
-                minutes_left = int(remaining_time.total_seconds() / 60)
-                response_data['message'] = f'⏳ 請在 {minutes_left} 分鐘內完成付款'
-        elif order.status == 'expired':
-            response_data['message'] = '⏰ 訂單已逾期'
-        elif order.status == 'cancelled':
-            response_data['message'] = '❌ 訂單已取消'
-
-        return Response(response_data)
+    cache = get_order_status_cache()
+    response_data = cache.get(order_number) if cache is not None else None
+    # 快取中仍是待付款但已過付款期限時，回資料庫讀取並釋放
+    if response_data is not None and not (
+        response_data['status'] == 'pending'
+        and response_data['payment_deadline']
+        and timezone.now() > response_data['payment_deadline']
+    ):
+        return _order_status_response(response_data, 'HIT')
 
+    try:
+        # 單品訂單的商品一起讀取，舊訂單的明細由 line_items 另外查詢
+        order = SalesOrder.objects.select_related('product').get(order_number=order_number)
     except SalesOrder.DoesNotExist:
         return Response(
             {'error': '訂單不存在'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    # 已逾期但還沒被批次釋放的訂單，在這裡直接釋放（以主資料庫的訂單狀態為準）
+    if order.is_expired():
+        with use_primary():
+            order = SalesOrder.objects.select_related('product').get(pk=order.pk)
+            expire_if_overdue(order)
+
+    response_data = order_status_payload(order)
+    if cache is not None:
+        # 副本可能落後於清除快取的時間點，讀自副本的內容只保存到副本延遲的上限
+        cache.add(
+            response_data,
+            get_setting('DATABASE_REPLICA_STICKY_SECONDS') if reading_from_replica() else None,
+        )
+    return _order_status_response(response_data, 'MISS')
+
+
+@api_view(['GET'])
+def order_status_cache_stats(request):
+    """
+    訂單狀態快取的命中統計（回應這個請求的 worker 自己的計數，各 worker 分開計算）
+    GET /api/order/status-cache/stats/
+    """
+    cache = get_order_status_cache()
+    if cache is None:
+        return Response({'enabled': False})
+    return Response({'enabled': True, 'pid': os.getpid(), **cache.stats()})
+
+
+def _order_status_response(payload, cache_status):
+    """加上依目前時間產生的訊息（不修改快取中的資料）"""
+    response_data = dict(payload)
+    message = order_status_message(payload)
+    if message is not None:
+        response_data['message'] = message
+    response = Response(response_data)
+    response['X-Cache'] = cache_status
+    return response
+
+
+# 訂單列表不建立 model 實例，以對照表取得顯示名稱
+ORDER_STATUS_DISPLAY = dict(SalesOrder.STATUS_CHOICES)
+PAYMENT_METHOD_DISPLAY = dict(SalesOrder.PAYMENT_METHOD_CHOICES)
+
 
 @api_view(['GET'])
 def user_orders(request):
     """
-    查詢用戶的所有訂單
+    查詢用戶的訂單（由新到舊分頁）
     GET /api/user/orders/?email=user@example.com
+    Query: limit（可選，每頁筆數）、cursor（可選，上一頁回應的 next_cursor）、
+           include_total（可選，為 1 時回傳訂單總數）
     """
     user_email = request.GET.get('email')
 
@@ -340,24 +591,69 @@ def user_orders(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    orders = SalesOrder.objects.filter(user_email=user_email).order_by('-created_at')
+    try:
+        limit = int(request.GET.get('limit', get_setting('USER_ORDERS_PAGE_SIZE')))
+    except ValueError:
+        return Response(
+            {'error': 'limit 必須是整數'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    limit = min(max(limit, 1), get_setting('USER_ORDERS_MAX_PAGE_SIZE'))
 
-    orders_data = [{
-        'order_number': order.order_number,
-        'status': order.status,
-        'status_display': order.get_status_display(),
-        'created_at': order.created_at,
-        'paid_at': order.paid_at,
-        'shipping_priority': order.shipping_priority,
-        'total_amount': str(order.total_amount),
-        'payment_method': order.get_payment_method_display() if order.payment_method else None,
-    } for order in orders]
+    orders = SalesOrder.objects.filter(user_email=user_email)
+    response_data = {'user_email': user_email}
+    if request.GET.get('include_total') in ('1', 'true'):
+        response_data['total_orders'] = orders.count()
 
-    return Response({
-        'user_email': user_email,
-        'total_orders': len(orders_data),
-        'orders': orders_data
-    })
+    cursor = request.GET.get('cursor')
+    if cursor:
+        position = _decode_orders_cursor(cursor)
+        if position is None:
+            return Response(
+                {'error': '無效的 cursor'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        # keyset 分頁：從上一頁最後一筆之後接著讀，不論第幾頁都只掃描一頁的索引
+        created_at, order_id = position
+        orders = orders.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=order_id)
+        )
+
+    # 只取回應需要的欄位，不建立 model 實例；多取一筆判斷是否還有下一頁
+    rows = list(orders.order_by('-created_at', '-id').values(
+        'id', 'order_number', 'status', 'created_at', 'paid_at',
+        'shipping_priority', 'total_amount', 'payment_method',
+    )[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response_data['orders'] = [{
+        'order_number': row['order_number'],
+        'status': row['status'],
+        'status_display': ORDER_STATUS_DISPLAY.get(row['status'], row['status']),
+        'created_at': row['created_at'],
+        'paid_at': row['paid_at'],
+        'shipping_priority': row['shipping_priority'],
+        'total_amount': str(row['total_amount']),
+        'payment_method': PAYMENT_METHOD_DISPLAY.get(row['payment_method']) if row['payment_method'] else None,
+    } for row in rows]
+    response_data['next_cursor'] = (
+        _encode_orders_cursor(rows[-1]['created_at'], rows[-1]['id']) if has_more else None
+    )
+    return Response(response_data)
+
+
+def _encode_orders_cursor(created_at, order_id):
+    return urlsafe_base64_encode(f'{created_at.isoformat()}|{order_id}'.encode())
+
+
+def _decode_orders_cursor(cursor):
+    """解出 (created_at, id)，格式不正確時回傳 None"""
+    try:
+        created_at, order_id = urlsafe_base64_decode(cursor).decode().split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
 
 
 @api_view(['GET'])
@@ -365,29 +661,80 @@ def flash_sale_status(request, event_id):
     """
     查詢搶購活動狀態
     GET /api/flash-sale/{event_id}/status/
+    Headers: If-None-Match（可選，內容未變時回應 304）
     """
     try:
-        event = FlashSaleEvent.objects.select_related('product').get(id=event_id)
-
-        return Response({
-            'event_id': event.id,
-            'product_name': event.product.name,
-            'product_sku': event.product.sku,
-            'total_quantity': event.total_quantity,
-            'reserved_quantity': event.reserved_quantity,
-            'sold_quantity': event.sold_quantity,
-            'remaining': event.total_quantity - event.reserved_quantity - event.sold_quantity,
-            'status': event.status,
-            'status_display': event.get_status_display(),
-            'start_time': event.start_time,
-            'end_time': event.end_time,
-            'is_active': event.is_active(),
-            'has_stock': event.has_stock(),
-        })
-
+        # 回應在程序內保留 STATUS_CACHE_TTL 秒，輪詢不會每次都讀活動記錄
+        cached = get_status_cache().get(event_id)
     except FlashSaleEvent.DoesNotExist:
         return Response(
             {'error': '活動不存在'},
             status=status.HTTP_404_NOT_FOUND
         )
 
+    if cached.etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(cached.body, content_type='application/json')
+    response['ETag'] = cached.etag
+    # 用戶端與 CDN 每次都要以 ETag 確認，內容未變時只回應 304
+    patch_cache_control(response, public=True, max_age=0, must_revalidate=True)
+    return response
+
+
+# 即時推送沒有更新時送出註解行的間隔秒數，避免連線被代理伺服器判定閒置而中斷
+STREAM_HEARTBEAT_SECONDS = 15
+
+
+async def flash_sale_stream(request, event_id):
+    """
+    即時推送搶購活動狀態（Server-Sent Events，需以 ASGI 啟動）
+    GET /api/flash-sale/{event_id}/stream/
+
+    連線後立即送出目前狀態，之後只在內容變化時送出，格式與 status API 相同：
+        event: status
+        id: <ETag>
+        data: <JSON>
+    連線在 STREAM_MAX_SECONDS 秒後關閉，瀏覽器的 EventSource 會自動重新連線；用戶端離線時立即結束
+    WSGI（包含 runserver）會把串流整個收集完才送出，回應 501
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse(
+            {'error': '即時推送需要以 ASGI 啟動，請改用 status API 輪詢'},
+            status=501,
+            json_dumps_params={'ensure_ascii': False},
+        )
+
+    try:
+        current = await sync_to_async(get_status_cache().get)(event_id)
+    except FlashSaleEvent.DoesNotExist:
+        return JsonResponse({'error': '活動不存在'}, status=404)
+
+    disconnected = client_disconnected(request)
+
+    async def events():
+        queue = await subscribe(event_id)
+        deadline = time.monotonic() + get_setting('STREAM_MAX_SECONDS')
+        last_etag = None
+        entry = current
+        try:
+            while True:
+                if entry is None:
+                    yield ': ping\n\n'
+                elif entry.etag != last_etag:
+                    last_etag = entry.etag
+                    yield f'event: status\nid: {entry.etag}\ndata: {entry.body.decode()}\n\n'
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                entry = await next_update(queue, disconnected, min(STREAM_HEARTBEAT_SECONDS, remaining))
+        except ClientDisconnected:
+            return
+        finally:
+            unsubscribe(event_id, queue)
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # 讓 nginx 不緩衝推送內容
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,212 @@
+"""
+排隊室（活動開始時的入場控制）
+
+開賣瞬間所有用戶同時下單，成本大多花在資料庫的鎖等待。
+開啟排隊室後，用戶先到 /api/flash-sale/<id>/queue/ 取得排隊號碼，
+排隊室依「放行速率」逐步推進已放行的號碼，輪到的用戶拿到簽章過的短效入場資格，
+下單 API 只接受帶有有效入場資格的請求。
+
+- 放行速率依下單交易的實際耗時調整：平均耗時超過 WAITING_ROOM_TARGET_LATENCY_MS
+  就降速（乘以 0.75），否則每秒加上 WAITING_ROOM_MIN_RATE，介於最小與最大速率之間
+- 活動開始前可以排隊，但不會放行
+- 已知售罄後不再發出排隊號碼與入場資格
+- 排隊號碼與入場資格都以 SECRET_KEY 簽章，綁定活動與 email
+"""
+import threading
+import time
+
+from django.core import signing
+from django.utils.module_loading import import_string
+
+from .conf import get_setting
+from .resp import get_client
+
+
+# 推進放行號碼與調整速率的最短間隔（秒）
+TICK_SECONDS = 0.1
+ADJUST_SECONDS = 1.0
+# 下單耗時的指數移動平均權重
+LATENCY_ALPHA = 0.2
+
+_QUEUE_SALT = 'shop.waiting_room.queue'
+_ADMISSION_SALT = 'shop.waiting_room.admission'
+
+
+class AdmissionDenied(Exception):
+    """入場資格無效"""
+
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
+
+
+def issue_queue_token(event_id, user_email, position):
+    return signing.dumps({'e': event_id, 'u': user_email, 'p': position}, salt=_QUEUE_SALT)
+
+
+def read_queue_token(token, event_id, user_email):
+    """取出排隊號碼，簽章不符或不是這個活動與用戶時回傳 None"""
+    try:
+        data = signing.loads(token, salt=_QUEUE_SALT)
+    except signing.BadSignature:
+        return None
+    if data.get('e') != event_id or data.get('u') != user_email:
+        return None
+    return data['p']
+
+
+def issue_admission_token(event_id, user_email):
+    return signing.dumps({'e': event_id, 'u': user_email}, salt=_ADMISSION_SALT)
+
+
+def verify_admission_token(token, event_id, user_email):
+    """檢查入場資格，無效時拋出 AdmissionDenied"""
+    if not token:
+        raise AdmissionDenied('請先排隊取得入場資格')
+    try:
+        data = signing.loads(
+            token, salt=_ADMISSION_SALT, max_age=get_setting('WAITING_ROOM_ADMISSION_TTL')
+        )
+    except signing.SignatureExpired:
+        raise AdmissionDenied('入場資格已過期，請重新排隊')
+    except signing.BadSignature:
+        raise AdmissionDenied('入場資格不正確')
+    if data.get('e') != event_id or data.get('u') != user_email:
+        raise AdmissionDenied('入場資格不正確')
+
+
+class BaseWaitingRoom:
+    """排隊號碼、放行進度與速率控制"""
+
+    def __init__(self):
+        self.min_rate = get_setting('WAITING_ROOM_MIN_RATE')
+        self.max_rate = get_setting('WAITING_ROOM_MAX_RATE')
+        self.initial_rate = get_setting('WAITING_ROOM_INITIAL_RATE')
+        self.target_latency = get_setting('WAITING_ROOM_TARGET_LATENCY_MS') / 1000
+        # event_id -> [目前速率, 平均耗時, 上次調整時間]
+        self._control = {}
+        self._control_lock = threading.Lock()
+
+    def join(self, event_id):
+        """取得新的排隊號碼（從 1 開始）"""
+        raise NotImplementedError
+
+    def admitted(self, event_id):
+        """推進並回傳目前已放行到第幾號"""
+        raise NotImplementedError
+
+    def rate(self, event_id):
+        """目前每秒放行人數"""
+        return self._control_for(event_id)[0]
+
+    def record_latency(self, event_id, seconds):
+        """記錄一次下單交易的耗時"""
+        with self._control_lock:
+            control = self._control_for(event_id)
+            control[1] = seconds if control[1] is None else (
+                LATENCY_ALPHA * seconds + (1 - LATENCY_ALPHA) * control[1]
+            )
+
+    def _control_for(self, event_id):
+        control = self._control.get(event_id)
+        if control is None:
+            control = self._control.setdefault(
+                event_id, [self.initial_rate, None, time.monotonic()]
+            )
+        return control
+
+    def _adjusted_rate(self, event_id):
+        """依平均耗時調整速率（每 ADJUST_SECONDS 秒最多一次）並回傳"""
+        now = time.monotonic()
+        with self._control_lock:
+            control = self._control_for(event_id)
+            if now - control[2] >= ADJUST_SECONDS and control[1] is not None:
+                if control[1] > self.target_latency:
+                    control[0] = max(self.min_rate, control[0] * 0.75)
+                else:
+                    control[0] = min(self.max_rate, control[0] + self.min_rate)
+                control[2] = now
+            return control[0]
+
+
+class LocalWaitingRoom(BaseWaitingRoom):
+    """程序內的排隊室，每個 worker 各自排隊（適合單一程序）"""
+
+    def __init__(self):
+        super().__init__()
+        # event_id -> [已發號碼, 已放行號碼, 上次推進時間]
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    def _queue(self, event_id):
+        queue = self._queues.get(event_id)
+        if queue is None:
+            queue = self._queues.setdefault(event_id, [0, 0.0, time.monotonic()])
+        return queue
+
+    def join(self, event_id):
+        with self._lock:
+            queue = self._queue(event_id)
+            queue[0] += 1
+            return queue[0]
+
+    def admitted(self, event_id):
+        rate = self._adjusted_rate(event_id)
+        now = time.monotonic()
+        with self._lock:
+            queue = self._queue(event_id)
+            elapsed = now - queue[2]
+            if elapsed >= TICK_SECONDS:
+                # 最多累積 ADJUST_SECONDS 秒的額度，且不超過已發號碼，
+                # 避免閒置一段時間後湧入的請求一次全部放行
+                queue[1] = min(queue[1] + rate * min(elapsed, ADJUST_SECONDS), queue[0])
+                queue[2] = now
+            return int(queue[1])
+
+
+class RedisWaitingRoom(BaseWaitingRoom):
+    """以 Redis 協定共享的排隊室，所有 worker 共用同一條隊伍"""
+
+    def __init__(self, url=None):
+        super().__init__()
+        self.client = get_client(url)
+
+    def _key(self, event_id, name):
+        return self.client.key('event', event_id, 'waiting_room', name)
+
+    def join(self, event_id):
+        return self.client.execute('INCR', self._key(event_id, 'issued'))
+
+    def admitted(self, event_id):
+        rate = self._adjusted_rate(event_id)
+        # 每個 TICK 只有搶到 tick key 的 worker 推進放行號碼
+        if self.client.execute(
+            'SET', self._key(event_id, 'tick'), 1, 'NX', 'PX', int(TICK_SECONDS * 1000)
+        ):
+            now = time.time()
+            issued = int(self.client.execute('GET', self._key(event_id, 'issued')) or 0)
+            stored = self.client.execute('GET', self._key(event_id, 'admitted'))
+            admitted, last = map(float, stored.split(':')) if stored else (0.0, now)
+            admitted = min(admitted + rate * min(max(now - last, 0), ADJUST_SECONDS), issued)
+            self.client.execute('SET', self._key(event_id, 'admitted'), f'{admitted}:{now}')
+        else:
+            stored = self.client.execute('GET', self._key(event_id, 'admitted'))
+            admitted = float(stored.split(':')[0]) if stored else 0.0
+        return int(admitted)
+
+
+_room = None
+_room_lock = threading.Lock()
+
+
+def get_waiting_room():
+    """取得設定中的排隊室，未開啟時回傳 None"""
+    global _room
+    if _room is None:
+        backend = get_setting('WAITING_ROOM_BACKEND')
+        if not backend:
+            return None
+        with _room_lock:
+            if _room is None:
+                _room = import_string(backend)()
+    return _room